@@ -1,6 +1,39 @@
-import React, { useState, useEffect, useMemo } from 'react';
+import React, { useState, useEffect, useMemo, useRef } from 'react';
 import { useLocalStorage } from '../hooks/useLocalStorage';
-import { CheckCircle2, ChevronRight, RotateCcw, HelpCircle, Trophy, X, ChevronLeft, FileText } from 'lucide-react';
+import { useQuestionSearch } from '../hooks/useQuestionSearch';
+import { CheckCircle2, ChevronRight, RotateCcw, HelpCircle, Trophy, X, ChevronLeft, FileText, Search } from 'lucide-react';
+
+const OPTION_KEYS = ['A', 'B', 'C', 'D', 'E'];
+
+// Busca JSON; devolve null se não existir (o dev server do Vite responde index.html no 404).
+async function fetchJson(url) {
+  const response = await fetch(url);
+  if (!response.ok) return null;
+  try {
+    return await response.json();
+  } catch {
+    return null;
+  }
+}
+
+// <picture> com as variantes do encode_assets.py (AVIF/WebP/PNG em paleta, várias larguras).
+// Sem variantes no dataset, cai no PNG original.
+function ResponsiveImage({ src, variants, sizes, alt, className, onClick, onError }) {
+  const formats = ['avif', 'webp', 'png'].filter(fmt => Array.isArray(variants?.[fmt]) && variants[fmt].length > 0);
+  return (
+    <picture>
+      {formats.map(fmt => (
+        <source
+          key={fmt}
+          type={`image/${fmt}`}
+          sizes={sizes}
+          srcSet={variants[fmt].map(v => `${v.src} ${v.width}w`).join(', ')}
+        />
+      ))}
+      <img src={src} alt={alt} className={className} onClick={onClick} onError={onError} />
+    </picture>
+  );
+}
 
 function ImageModal({ src, title, onClose }) {
   if (!src) return null;
@@ -30,7 +63,7 @@ function ImageModal({ src, title, onClose }) {
   );
 }
 
-function PageModal({ year, page, onClose }) {
+function PageModal({ year, page, pagesVariants, onClose }) {
   const [currentPage, setCurrentPage] = useState(page);
   const [imgSrc, setImgSrc] = useState(null);
 
@@ -83,8 +116,10 @@ function PageModal({ year, page, onClose }) {
 
         {/* Content */}
         <div className="flex-1 bg-slate-100 overflow-auto flex items-center justify-center p-4">
-          <img
+          <ResponsiveImage
             src={imgSrc}
+            variants={pagesVariants?.[String(currentPage)]}
+            sizes="(min-width: 1024px) 1024px, 100vw"
             alt={`Página ${currentPage}`}
             className="max-w-full max-h-full object-contain shadow-lg bg-white"
             onError={(e) => {
@@ -109,6 +144,18 @@ export function Questoes() {
   const [imageModalSrc, setImageModalSrc] = useState(null);
   const [pageModalOpen, setPageModalOpen] = useState(false);
   const [goToNumber, setGoToNumber] = useState('');
+  // Store fragmentado: `questions` vem do índice enxuto e o conteúdo completo de cada
+  // questão (enunciado, alternativas, explicação) é buscado sob demanda.
+  const [sharded, setSharded] = useState(false);
+  const [details, setDetails] = useState({});
+  const [yearAssets, setYearAssets] = useState(null);
+  // Textos de referência do ano ({ id: { title, text } }); as questões citam por passageIds.
+  const [yearPassages, setYearPassages] = useState({});
+  const requestedDetails = useRef(new Set());
+  // Busca em todos os anos (índice estático em /data/questions/search)
+  const [searchQuery, setSearchQuery] = useState('');
+  const { results: searchResults, loading: searchLoading } = useQuestionSearch(searchQuery, 8);
+  const pendingJump = useRef(null);
 
   const questionNumbers = useMemo(() => {
     const nums = (questions || [])
@@ -156,10 +203,14 @@ export function Questoes() {
     async function loadQuestions() {
       setLoading(true);
       setError(null);
+      setDetails({});
+      requestedDetails.current = new Set();
       try {
-        const response = await fetch(`/data/questions/fuvest-${selectedYear}.json`);
-        if (!response.ok) throw new Error('Falha ao carregar as questões.');
-        const data = await response.json();
+        // Preferimos o índice enxuto (fuvest-YYYY/index.json); o monolítico fica como fallback.
+        let data = await fetchJson(`/data/questions/fuvest-${selectedYear}/index.json`);
+        const isSharded = Boolean(data);
+        if (!data) data = await fetchJson(`/data/questions/fuvest-${selectedYear}.json`);
+        if (!data) throw new Error('Falha ao carregar as questões.');
 
         // Importante: em produção o JSON pode estar parcialmente enriquecido.
         // Se não houver explicação, ainda assim a questão deve aparecer (o aluno lê pela imagem).
@@ -168,8 +219,14 @@ export function Questoes() {
         // Ordena as questões por número para navegação sequencial
         const sorted = [...all].sort((a, b) => a.number - b.number);
         
+        setSharded(isSharded);
+        setYearAssets(data.assets || null);
+        setYearPassages(data.passages || {});
         setQuestions(sorted);
-        setCurrentIndex(0);
+        // resultado de busca de outro ano: abre direto na questão escolhida
+        const jump = pendingJump.current;
+        pendingJump.current = null;
+        setCurrentIndex(jump ? Math.max(0, sorted.findIndex(q => Number(q?.number) === jump)) : 0);
         resetState();
       } catch (err) {
         setError(err.message);
@@ -180,6 +237,21 @@ export function Questoes() {
     loadQuestions();
   }, [selectedYear]);
 
+  // Busca o shard da questão atual (e já adianta a próxima)
+  useEffect(() => {
+    if (!sharded) return;
+    [questions[currentIndex], questions[currentIndex + 1]].forEach((q) => {
+      if (!q?.id || requestedDetails.current.has(q.id)) return;
+      requestedDetails.current.add(q.id);
+      fetchJson(`/data/questions/fuvest-${selectedYear}/${q.id}.json`)
+        .then((full) => {
+          if (full) setDetails(prev => ({ ...prev, [q.id]: full }));
+          else requestedDetails.current.delete(q.id);
+        })
+        .catch(() => requestedDetails.current.delete(q.id));
+    });
+  }, [sharded, questions, currentIndex, selectedYear]);
+
   const resetState = () => {
     setSelectedOption(null);
     setIsSubmitted(false);
@@ -199,6 +271,16 @@ export function Questoes() {
     resetState();
   };
 
+  const openSearchResult = (result) => {
+    setSearchQuery('');
+    if (result.year === selectedYear) {
+      goToQuestionByNumber(result.number);
+      return;
+    }
+    pendingJump.current = result.number;
+    setSelectedYear(result.year);
+  };
+
   const handleOptionSelect = (key) => {
     if (isSubmitted) return;
     setSelectedOption(key);
@@ -281,7 +363,12 @@ export function Questoes() {
 
   if (questions.length === 0) return <div className="p-8 text-center text-slate-500">Nenhuma questão encontrada para este ano.</div>;
 
-  const currentQ = questions[currentIndex];
+  const currentQ = { ...questions[currentIndex], ...(details[questions[currentIndex]?.id] || {}) };
+  const detailLoading = sharded && !details[currentQ.id];
+  // Com os recortes dos textos de referência no dataset, eles substituem a versão em texto.
+  const references = Array.isArray(currentQ.references) ? currentQ.references : [];
+  const passages = references.length ? [] : (currentQ.passageIds || []).map(id => yearPassages[id]).filter(Boolean);
+  const options = Array.isArray(currentQ.options) ? currentQ.options : OPTION_KEYS.map(key => ({ key, text: '' }));
   const explanation = currentQ?.explanation || {};
   const steps = Array.isArray(explanation.steps) ? explanation.steps : [];
   const distractors = explanation.distractors || {};
@@ -301,6 +388,7 @@ export function Questoes() {
         <PageModal 
           year={selectedYear} 
           page={currentQ.page || 1} 
+          pagesVariants={yearAssets?.pages}
           onClose={() => setPageModalOpen(false)} 
         />
       )}
@@ -346,6 +434,38 @@ export function Questoes() {
         </div>
       </div>
 
+      {/* Busca em todas as provas */}
+      <div className="relative mb-8">
+        <div className="flex items-center gap-3 bg-white px-4 py-3 rounded-2xl shadow-sm border border-slate-100 focus-within:ring-2 focus-within:ring-crimson-500">
+          <Search size={18} className="text-slate-400" />
+          <input
+            type="search"
+            value={searchQuery}
+            onChange={(e) => setSearchQuery(e.target.value)}
+            placeholder="Buscar em enunciados, alternativas e explicações (todos os anos)"
+            className="flex-1 bg-transparent text-sm text-slate-700 outline-none"
+          />
+          {searchLoading && <span className="text-xs text-slate-400">Buscando...</span>}
+        </div>
+        {searchQuery.trim() && !searchLoading && (
+          <div className="absolute z-20 left-0 right-0 mt-2 bg-white rounded-2xl shadow-xl border border-slate-100 overflow-hidden">
+            {searchResults.length === 0 ? (
+              <p className="px-4 py-3 text-sm text-slate-400">Nenhuma questão encontrada.</p>
+            ) : (
+              searchResults.map((r) => (
+                <button
+                  key={r.id}
+                  onClick={() => openSearchResult(r)}
+                  className="w-full text-left px-4 py-3 text-sm font-bold text-slate-700 hover:bg-crimson-50 border-b border-slate-100 last:border-b-0"
+                >
+                  Fuvest {r.year} · Questão {r.number}
+                </button>
+              ))
+            )}
+          </div>
+        )}
+      </div>
+
       <div className="flex flex-col lg:flex-row gap-8">
         {/* Lado Esquerdo: Questão */}
         <div className="flex-1">
@@ -380,18 +500,42 @@ export function Questoes() {
                 <span className="text-slate-400 text-xs font-bold tabular-nums">{currentIndex + 1} / {questions.length}</span>
               </div>
 
+              {/* Textos de referência (compartilhados entre questões) */}
+              {!detailLoading && passages.map((p, i) => (
+                <div key={i} className="mb-6 p-6 bg-slate-50 rounded-2xl border border-slate-200">
+                  {p.title && (
+                    <p className="text-[10px] font-black text-slate-500 uppercase tracking-wider mb-2">{p.title}</p>
+                  )}
+                  <p className="text-sm text-slate-700 leading-relaxed whitespace-pre-line">{p.text}</p>
+                </div>
+              ))}
+
+              {/* Recortes dos textos de referência (um asset por texto, fora da imagem da questão) */}
+              {references.map(ref => (
+                <div key={ref.id} className="mb-6 p-6 bg-slate-50 rounded-3xl border border-slate-200 flex justify-center">
+                  <img
+                    src={ref.image}
+                    alt="Texto de referência"
+                    className="max-h-[500px] object-contain rounded-lg cursor-zoom-in"
+                    onClick={() => setImageModalSrc(ref.image)}
+                  />
+                </div>
+              ))}
+
               {/* Enunciado */}
               <div className="mb-10">
                 <p className="text-xl text-slate-800 leading-relaxed font-medium">
-                  {currentQ.stem}
+                  {detailLoading ? <span className="text-base text-slate-400">Carregando enunciado...</span> : currentQ.stem}
                 </p>
               </div>
 
               {/* Imagem da Questão */}
               {currentQ.assets && currentQ.assets.questionImage && (
                 <div className="mb-10 p-6 bg-slate-50 rounded-3xl border-2 border-dashed border-slate-200 flex justify-center group hover:bg-white transition-colors duration-300">
-                  <img 
-                    src={currentQ.assets.questionImage} 
+                  <ResponsiveImage
+                    src={currentQ.assets.questionImage}
+                    variants={currentQ.assets.questionImageVariants}
+                    sizes="(min-width: 1024px) 640px, 100vw"
                     alt={`Questão ${currentQ.number}`}
                     className="max-h-[500px] object-contain rounded-lg shadow-sm group-hover:scale-[1.01] transition-transform duration-500 cursor-zoom-in"
                     onClick={() => setImageModalSrc(currentQ.assets.questionImage)}
@@ -401,7 +545,7 @@ export function Questoes() {
 
               {/* Alternativas */}
               <div className="grid grid-cols-1 gap-4">
-                {currentQ.options.map((opt) => {
+                {options.map((opt) => {
                   let style = "border-slate-100 bg-slate-50/50 hover:border-slate-300 hover:bg-white hover:shadow-md";
                   if (selectedOption === opt.key) {
                     style = "border-crimson-600 bg-crimson-50 shadow-md ring-1 ring-crimson-600";
@@ -547,7 +691,7 @@ export function Questoes() {
                 <div>
                   <h4 className="text-[10px] font-black text-slate-400 uppercase tracking-widest mb-3">Distratores</h4>
                   <div className="space-y-2">
-                    {['A', 'B', 'C', 'D', 'E'].map(key => (
+                    {OPTION_KEYS.map(key => (
                       <div key={key} className={`p-3 rounded-xl border text-xs leading-snug ${key === currentQ.answer.correct ? 'bg-emerald-50 border-emerald-100 text-emerald-800 font-bold' : 'bg-white border-slate-100 text-slate-500'}`}>
                         <span className="mr-1">{key})</span> {distractors[key] || '(Ainda não disponível)'}
                       </div>
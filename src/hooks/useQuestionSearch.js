@@ -0,0 +1,152 @@
+import { useState, useEffect } from 'react';
+
+// Busca no índice estático gerado por tools/questions/search_index.py:
+//   /data/questions/search/meta.json        -> docs [ano, número], prefixo -> shard
+//   /data/questions/search/t-<prefixo>.json -> { termo: postings }
+// Postings: inteiros (deltaDoc << 3) | campos (1 enunciado, 2 alternativas, 4 explicação).
+// Cada consulta baixa só o meta (uma vez) e o shard de cada termo.
+
+const BASE = '/data/questions/search';
+const MAX_PREFIX_LEN = 3;
+const FIELD_WEIGHTS = [[1, 3], [2, 2], [4, 1]];
+
+// Mesmas stopwords do search_index.py (sem acento).
+const STOPWORDS = new Set(`
+a o e as os um uma uns umas de da do das dos em na no nas nos por pela pelo pelas pelos
+para pra com sem sob sobre entre ate ao aos que se ou mas como mais menos muito muita
+muitos muitas ja nao sim seu sua seus suas ele ela eles elas isso isto esse essa esses
+essas este esta estes estas aquele aquela aqueles aquelas lhe lhes me te nos vos foi
+ser sao era eram sera tem ter ha quando onde qual quais cujo cuja tambem so pois
+`.split(/\s+/).filter(Boolean));
+
+let metaPromise = null;
+const shardPromises = new Map();
+
+async function fetchJson(url) {
+  const response = await fetch(url);
+  if (!response.ok) return null;
+  try {
+    return await response.json();
+  } catch {
+    return null;
+  }
+}
+
+function loadMeta() {
+  if (!metaPromise) {
+    metaPromise = fetchJson(`${BASE}/meta.json`).then((meta) => {
+      if (!meta) metaPromise = null;
+      return meta;
+    });
+  }
+  return metaPromise;
+}
+
+function loadShard(meta, prefix) {
+  if (!shardPromises.has(prefix)) {
+    shardPromises.set(prefix, fetchJson(`${BASE}/${meta.shards[prefix]}`).then((shard) => {
+      // falha não fica em cache: a próxima busca tenta de novo
+      if (!shard) shardPromises.delete(prefix);
+      return shard?.terms || {};
+    }));
+  }
+  return shardPromises.get(prefix);
+}
+
+// Equivalente ao qa_gate._norm + tokenize do pipeline.
+export function tokenize(text) {
+  return (text || '')
+    .toLowerCase()
+    .normalize('NFKD')
+    .replace(/[\u0300-\u036f]/g, '')
+    .match(/[a-z0-9]+/g)
+    ?.filter(t => t.length >= 2 && !STOPWORDS.has(t)) || [];
+}
+
+function shardFor(meta, term) {
+  for (let n = Math.min(term.length, MAX_PREFIX_LEN); n > 0; n--) {
+    if (meta.shards[term.slice(0, n)]) return term.slice(0, n);
+  }
+  return null;
+}
+
+async function postingsFor(meta, term, prefixMatch) {
+  const prefixes = prefixMatch
+    ? Object.keys(meta.shards).filter(p => p.startsWith(term) || term.startsWith(p))
+    : [shardFor(meta, term)].filter(Boolean);
+  const shards = await Promise.all(prefixes.map(p => loadShard(meta, p)));
+  const out = new Map();
+  for (const terms of shards) {
+    const matches = prefixMatch ? Object.keys(terms).filter(t => t.startsWith(term)) : [term];
+    for (const t of matches) {
+      let doc = 0;
+      for (const v of terms[t] || []) {
+        doc += v >> 3;
+        out.set(doc, (out.get(doc) || 0) | (v & 7));
+      }
+    }
+  }
+  return out;
+}
+
+// Todos os termos precisam aparecer; o último também casa como prefixo (3+ letras).
+// Retorna [{ id, year, number, score }] ordenado por relevância.
+export async function searchQuestions(query, limit = 20) {
+  const terms = tokenize(query);
+  if (terms.length === 0) return [];
+  const meta = await loadMeta();
+  if (!meta) return [];
+
+  const nDocs = meta.docs.length;
+  const perTerm = await Promise.all(
+    terms.map((term, i) => postingsFor(meta, term, i === terms.length - 1 && term.length >= 3))
+  );
+  let scores = null;
+  for (const perDoc of perTerm) {
+    const idf = Math.log(1 + nDocs / (1 + perDoc.size));
+    const next = new Map();
+    for (const [doc, mask] of perDoc) {
+      if (scores && !scores.has(doc)) continue;
+      const weight = FIELD_WEIGHTS.reduce((acc, [bit, w]) => acc + (mask & bit ? w : 0), 0);
+      next.set(doc, (scores ? scores.get(doc) : 0) + idf * weight);
+    }
+    scores = next;
+    if (scores.size === 0) return [];
+  }
+
+  return [...scores.entries()]
+    .sort((a, b) => b[1] - a[1] || a[0] - b[0])
+    .slice(0, limit)
+    .map(([doc, score]) => {
+      const [year, number] = meta.docs[doc];
+      return { id: `fuvest-${year}-q${String(number).padStart(2, '0')}`, year, number, score };
+    });
+}
+
+export function useQuestionSearch(query, limit = 20) {
+  const [results, setResults] = useState([]);
+  const [loading, setLoading] = useState(false);
+
+  useEffect(() => {
+    let cancelled = false;
+    if (!tokenize(query).length) {
+      setResults([]);
+      setLoading(false);
+      return;
+    }
+    setLoading(true);
+    // pequeno debounce: não dispara uma busca por tecla
+    const timer = setTimeout(() => {
+      searchQuestions(query, limit)
+        .then((res) => { if (!cancelled) setResults(res); })
+        .catch(() => { if (!cancelled) setResults([]); })
+        .finally(() => { if (!cancelled) setLoading(false); });
+    }, 150);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [query, limit]);
+
+  return { results, loading };
+}
@@ -0,0 +1,247 @@
+"""
+Store de assets endereçado por conteúdo (publicação).
+
+As imagens do pipeline ficam em public/assets/questions/<ano>/qNN/ e public/assets/pages/<ano>/
+com nomes fixos, então o host não pode mandar cache longo (o mesmo nome muda de conteúdo a
+cada recrop). Este passo copia cada imagem referenciada pelos datasets (recorte, variantes
+do encode_assets e variantes das páginas) para
+
+  dist/assets/c/<aa>/<sha256[:24]>.<ext>      (imutável: conteúdo novo = nome novo)
+
+e grava dist/assets/c/manifest.json:
+
+  urls      -> {url original: url endereçada}   (usado pelo publish.py para reescrever os JSONs)
+  questions -> {id da questão: {image: hash, variants: {fmt: [hash, ...]}}}
+  references-> {ano: {id do texto de referência: hash}}
+  pages     -> {ano: {página: {fmt: [hash, ...]}}}
+
+Arquivos idênticos (mesmo recorte em dois lugares, variante igual ao original...) viram um
+arquivo só, e um deploy incremental só envia os nomes novos. O sha256 de cada origem fica em
+cache/asset_hashes.json (por tamanho + mtime), então a segunda rodada não relê nada.
+Também grava dist/_headers com Cache-Control imutável para /assets/c/*.
+
+Rodar depois do `vite build` e antes do publish.py:
+  npm run build
+  python tools/questions/asset_store.py            # --prune remove hashes sem referência
+  python tools/questions/publish.py
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+from years import dataset_years
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PUBLIC_DIR = os.path.join(PROJECT_ROOT, "public")
+DATA_DIR = os.path.join(PUBLIC_DIR, "data", "questions")
+DIST_DIR = os.path.join(PROJECT_ROOT, "dist")
+STORE_DIR = os.path.join(DIST_DIR, "assets", "c")
+STORE_URL = "/assets/c"
+CACHE_DIR = os.path.join(PROJECT_ROOT, "tools", "questions", "cache")
+HASH_CACHE_PATH = os.path.join(CACHE_DIR, "asset_hashes.json")
+
+STORE_VERSION = 1
+HASH_LEN = 24
+IMMUTABLE_HEADER = "Cache-Control: public, max-age=31536000, immutable"
+
+
+class HashCache:
+    """sha256 por arquivo, reaproveitado enquanto tamanho e mtime não mudarem."""
+
+    def __init__(self, path: str = HASH_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        self.hits = 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def sha256(self, file_path: str) -> str:
+        st = os.stat(file_path)
+        key = os.path.relpath(file_path, PROJECT_ROOT)
+        cached = self.entries.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            self.hits += 1
+            return cached[2]
+        h = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.entries[key] = [st.st_size, st.st_mtime_ns, digest]
+        self.changed = True
+        return digest
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+
+def store_name(digest: str, ext: str) -> str:
+    """Caminho relativo no store: <aa>/<hash>.<ext>."""
+    h = digest[:HASH_LEN]
+    return f"{h[:2]}/{h}{ext.lower()}"
+
+
+def _variant_urls(variants: dict | None) -> dict[str, list[str]]:
+    return {fmt: [v.get("src") for v in items or [] if v.get("src")] for fmt, items in (variants or {}).items()}
+
+
+def collect_refs(data_dir: str = DATA_DIR) -> list[tuple[str, str, str]]:
+    """[(tipo, chave, url)] de todas as imagens citadas pelos datasets.
+
+    tipo "q": chave "<id>|image" ou "<id>|<fmt>"; tipo "r" (texto de referência): chave
+    "<ano>|<id da referência>"; tipo "p": chave "<ano>|<página>|<fmt>".
+    """
+    refs = []
+    for year in dataset_years(data_dir):
+        with open(os.path.join(data_dir, f"fuvest-{year}.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for q in data.get("questions") or []:
+            assets = q.get("assets") or {}
+            if assets.get("questionImage"):
+                refs.append(("q", f"{q.get('id')}|image", assets["questionImage"]))
+            for fmt, urls in _variant_urls(assets.get("questionImageVariants")).items():
+                refs.extend(("q", f"{q.get('id')}|{fmt}", u) for u in urls)
+            for ref in q.get("references") or []:
+                if ref.get("image"):
+                    refs.append(("r", f"{year}|{ref.get('id')}", ref["image"]))
+        for page, variants in ((data.get("assets") or {}).get("pages") or {}).items():
+            for fmt, urls in _variant_urls(variants).items():
+                refs.extend(("p", f"{year}|{page}|{fmt}", u) for u in urls)
+    return refs
+
+
+def _copy_atomic(src: str, dest: str):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp_path = f"{dest}.{os.getpid()}.tmp"
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+def _write_headers(dist_dir: str):
+    """Acrescenta a regra de cache imutável ao dist/_headers (Netlify/Cloudflare Pages)."""
+    path = os.path.join(dist_dir, "_headers")
+    rule = f"{STORE_URL}/*\n  {IMMUTABLE_HEADER}\n"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            current = f.read()
+    except FileNotFoundError:
+        current = ""
+    if rule in current:
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(current + ("\n" if current and not current.endswith("\n") else "") + rule)
+
+
+def build_store(public_dir: str = PUBLIC_DIR, data_dir: str = DATA_DIR, store_dir: str = STORE_DIR,
+                prune: bool = False) -> dict:
+    """Copia as imagens referenciadas para o store e grava o manifest. Retorna contagens."""
+    cache = HashCache()
+    refs = collect_refs(data_dir)
+    urls = {}
+    questions = {}
+    references = {}
+    pages = {}
+    referenced = set()
+    stats = {"refs": len(refs), "missing": 0, "unique": 0, "copied": 0, "copied_bytes": 0,
+             "dedup_bytes": 0, "pruned": 0}
+    for kind, key, url in refs:
+        if url not in urls:
+            src = os.path.join(public_dir, url.lstrip("/"))
+            if not os.path.exists(src):
+                stats["missing"] += 1
+                print(f"[WARN] Asset nao encontrado: {url}")
+                continue
+            name = store_name(cache.sha256(src), os.path.splitext(src)[1])
+            dest = os.path.join(store_dir, name)
+            size = os.path.getsize(src)
+            if name in referenced:
+                stats["dedup_bytes"] += size
+            else:
+                referenced.add(name)
+                # nome = conteúdo: se já existe, é o mesmo arquivo (deploy incremental)
+                if not os.path.exists(dest) or os.path.getsize(dest) != size:
+                    _copy_atomic(src, dest)
+                    stats["copied"] += 1
+                    stats["copied_bytes"] += size
+            urls[url] = f"{STORE_URL}/{name}"
+        digest = os.path.splitext(os.path.basename(urls[url]))[0]
+        if kind == "q":
+            q_id, field = key.split("|")
+            entry = questions.setdefault(q_id, {})
+            if field == "image":
+                entry["image"] = digest
+            else:
+                entry.setdefault("variants", {}).setdefault(field, []).append(digest)
+        elif kind == "r":
+            year, ref_id = key.split("|")
+            references.setdefault(year, {})[ref_id] = digest
+        else:
+            year, page, fmt = key.split("|")
+            pages.setdefault(year, {}).setdefault(page, {}).setdefault(fmt, []).append(digest)
+    stats["unique"] = len(referenced)
+    cache.save()
+
+    if prune and os.path.isdir(store_dir):
+        for root, _dirs, files in os.walk(store_dir):
+            for fname in files:
+                rel = os.path.relpath(os.path.join(root, fname), store_dir).replace(os.sep, "/")
+                if rel != "manifest.json" and rel not in referenced:
+                    os.remove(os.path.join(root, fname))
+                    stats["pruned"] += 1
+
+    manifest = {"version": STORE_VERSION, "base": STORE_URL, "urls": urls, "questions": questions,
+                "references": references, "pages": pages}
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_path = os.path.join(store_dir, "manifest.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, os.path.join(store_dir, "manifest.json"))
+    stats["hash_cache_hits"] = cache.hits
+    return stats
+
+
+def load_url_map(store_dir: str = STORE_DIR) -> dict[str, str]:
+    """{url original: url endereçada} do manifest (vazio se o store não foi gerado)."""
+    try:
+        with open(os.path.join(store_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("urls") or {}
+    except FileNotFoundError:
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copia as imagens do dataset para um store endereçado por conteúdo.")
+    parser.add_argument("--dest", default=STORE_DIR, help="Diretório do store (padrão: dist/assets/c)")
+    parser.add_argument("--prune", action="store_true", help="Remove do store os arquivos que nenhum dataset cita")
+    args = parser.parse_args()
+
+    if not os.path.isdir(DATA_DIR):
+        print(f"[ERRO] Diretorio de dados nao encontrado: {DATA_DIR}")
+        sys.exit(1)
+    s = build_store(store_dir=args.dest, prune=args.prune)
+    if os.path.abspath(args.dest).startswith(os.path.abspath(DIST_DIR) + os.sep):
+        _write_headers(DIST_DIR)
+    mb = lambda n: n / (1024 * 1024)
+    print(f"[OK] {s['refs']} referencias -> {s['unique']} arquivos unicos em {args.dest}")
+    print(f"[*] {s['copied']} novos ({mb(s['copied_bytes']):.1f} MB a enviar) | "
+          f"{mb(s['dedup_bytes']):.1f} MB deduplicados | {s['missing']} ausentes | "
+          f"{s['pruned']} removidos | hash em cache: {s['hash_cache_hits']}")
+
+
+if __name__ == "__main__":
+    main()
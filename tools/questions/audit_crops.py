@@ -1,41 +1,42 @@
 import argparse
+import html
 import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from PIL import Image
 
+from crop_metrics import white_ratio, content_bbox_ratio, crop_stats  # noqa: F401 (reexporta)
+from years import dataset_years, parse_years
 
-def white_ratio(img: Image.Image, threshold: int = 245) -> float:
-    """Percentual de pixels quase-brancos.
+THUMB_WIDTH = 240
+
+
+def _is_flagged(r: dict) -> bool:
+    return bool(r.get("flag_white") or r.get("flag_small") or r.get("missing"))
 
-    threshold: 0..255 (quanto maior, mais permissivo para considerar branco)
-    """
-    gray = img.convert("L")
-    data = gray.getdata()
-    total = len(data)
-    if total == 0:
-        return 1.0
-    white = sum(1 for p in data if p >= threshold)
-    return white / total
 
+def _save_thumb(img: Image.Image, src_path: Path, thumb_path: Path, width: int):
+    """Miniatura WebP do recorte (incremental: reaproveita se for mais nova que o PNG)."""
+    if thumb_path.exists() and thumb_path.stat().st_mtime >= src_path.stat().st_mtime:
+        return
+    thumb_path.parent.mkdir(parents=True, exist_ok=True)
+    h = max(1, round(img.height * width / img.width))
+    thumb = img.convert("RGB").resize((width, h), Image.BILINEAR) if img.width > width else img.convert("RGB")
+    tmp_path = thumb_path.with_suffix(".tmp")
+    thumb.save(tmp_path, "WEBP", quality=70)
+    os.replace(tmp_path, thumb_path)
 
-def content_bbox_ratio(img: Image.Image, dark_threshold: int = 245) -> float:
-    """Quanta área do recorte está ocupada por 'conteúdo' (não branco).
 
-    Retorna: bbox_area / total_area
-    Quanto menor, mais "vazio"/margem/branco excessivo.
+def audit_year(year: int, dataset_path: Path, out_dir: Path, white_threshold: float, min_area: int,
+               thumbs: bool = False, thumb_width: int = THUMB_WIDTH) -> dict:
+    """Audita um ano e grava audit_crops_<ano>.json/.csv. Retorna resumo com as linhas.
+
+    Com `thumbs`, gera miniaturas dos recortes sinalizados em <out>/audit_thumbs/<ano>/
+    aproveitando a imagem já decodificada para as métricas.
     """
-    gray = img.convert("L")
-    bw = gray.point(lambda p: 255 if p < dark_threshold else 0)
-    bbox = bw.getbbox()
-    if not bbox:
-        return 0.0
-    x0, y0, x1, y1 = bbox
-    bbox_area = max(1, (x1 - x0) * (y1 - y0))
-    total_area = max(1, img.width * img.height)
-    return bbox_area / total_area
-
-
-def audit_year(year: int, dataset_path: Path, out_dir: Path, white_threshold: float, min_area: int):
     dataset = json.loads(dataset_path.read_text(encoding="utf-8"))
     questions = dataset.get("questions") or []
 
@@ -58,11 +59,16 @@ def audit_year(year: int, dataset_path: Path, out_dir: Path, white_threshold: fl
             })
             continue
 
+        thumb_path = out_dir / "audit_thumbs" / str(year) / f"q{qnum:02d}.webp"
         with Image.open(img_path) as img:
             w, h = img.size
             area = w * h
-            wr = white_ratio(img)
-            cr = content_bbox_ratio(img)
+            stats = crop_stats(img)
+            wr = stats["white_ratio"]
+            cr = stats["content_ratio"]
+            flagged = wr >= white_threshold or area <= min_area
+            if thumbs and flagged:
+                _save_thumb(img, img_path, thumb_path, thumb_width)
 
         rows.append({
             "year": year,
@@ -76,6 +82,7 @@ def audit_year(year: int, dataset_path: Path, out_dir: Path, white_threshold: fl
             "flag_white": wr >= white_threshold,
             "flag_small": area <= min_area,
             "missing": False,
+            "thumb": str(thumb_path).replace("\\", "/") if thumbs and flagged else None,
         })
 
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -86,7 +93,7 @@ def audit_year(year: int, dataset_path: Path, out_dir: Path, white_threshold: fl
         "white_threshold": white_threshold,
         "min_area": min_area,
         "total": len(rows),
-        "flagged": sum(1 for r in rows if r.get("flag_white") or r.get("flag_small") or r.get("missing")),
+        "flagged": sum(1 for r in rows if _is_flagged(r)),
         "rows": sorted(rows, key=lambda r: (r.get("flag_white") is False, r.get("flag_small") is False, r.get("missing") is False, r.get("number") or 0)),
     }, ensure_ascii=False, indent=2), encoding="utf-8")
 
@@ -104,21 +111,134 @@ def audit_year(year: int, dataset_path: Path, out_dir: Path, white_threshold: fl
 
     print(f"[OK] Relatório gerado: {out_json}")
     print(f"[OK] CSV gerado: {out_csv}")
+    return {
+        "year": year,
+        "total": len(rows),
+        "flagged": sum(1 for r in rows if _is_flagged(r)),
+        "rows": rows,
+    }
+
+
+def _audit_year_job(job):
+    year, dataset_path, out_dir, white_threshold, min_area, thumbs, thumb_width = job
+    t0 = time.perf_counter()
+    try:
+        summary = audit_year(year, dataset_path, out_dir, white_threshold, min_area, thumbs, thumb_width)
+        summary["ok"] = True
+    except Exception as e:
+        summary = {"year": year, "ok": False, "error": f"{type(e).__name__}: {e}", "rows": []}
+    summary["seconds"] = round(time.perf_counter() - t0, 2)
+    return summary
+
+
+def write_html_report(summaries: list[dict], out_dir: Path, sort: str = "white") -> Path:
+    """Folha de contato: miniaturas dos recortes sinalizados de todos os anos numa página só.
+
+    sort="white"   -> white_ratio decrescente (mais vazio primeiro)
+    sort="content" -> content_ratio crescente (menos conteúdo primeiro)
+    """
+    rows = [r for s in summaries for r in s.get("rows", []) if _is_flagged(r)]
+    if sort == "content":
+        rows.sort(key=lambda r: (not r.get("missing"), r.get("content_ratio", 0.0), r["year"], r["number"]))
+    else:
+        rows.sort(key=lambda r: (not r.get("missing"), -r.get("white_ratio", 0.0), r["year"], r["number"]))
+
+    out_html = out_dir / "audit_crops.html"
+
+    def rel(path):
+        return html.escape(os.path.relpath(path, out_dir).replace("\\", "/"), quote=True)
+
+    cards = []
+    for r in rows:
+        title = f"{r['year']} Q{r['number']:02d}"
+        if r.get("missing"):
+            cards.append(f'<div class="card missing"><div class="thumb">sem imagem</div><b>{title}</b></div>')
+            continue
+        flags = " ".join(f for f, on in (("branco", r.get("flag_white")), ("pequeno", r.get("flag_small"))) if on)
+        img = f'<img loading="lazy" src="{rel(r["thumb"])}" alt="{title}">' if r.get("thumb") else ""
+        cards.append(
+            f'<a class="card" href="{rel(r["path"])}" target="_blank">'
+            f'<div class="thumb">{img}</div><b>{title}</b>'
+            f'<span>white {r["white_ratio"]:.3f} · content {r["content_ratio"]:.3f}</span>'
+            f'<span>{r["width"]}x{r["height"]} · {flags}</span></a>'
+        )
+
+    total = sum(s.get("total", 0) for s in summaries)
+    years = ", ".join(str(s["year"]) for s in sorted(summaries, key=lambda s: s["year"]))
+    page = f"""<!doctype html>
+<html lang="pt-BR"><head><meta charset="utf-8">
+<title>Auditoria de recortes</title>
+<style>
+body {{ font-family: system-ui, sans-serif; margin: 16px; background: #f4f4f5; color: #18181b; }}
+.grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax({THUMB_WIDTH}px, 1fr)); gap: 12px; }}
+.card {{ display: flex; flex-direction: column; gap: 2px; padding: 8px; background: #fff; border-radius: 8px;
+         color: inherit; text-decoration: none; font-size: 12px; box-shadow: 0 1px 2px rgba(0,0,0,.08); }}
+.card.missing {{ background: #fee2e2; }}
+.thumb {{ height: 320px; overflow: hidden; display: flex; align-items: flex-start; justify-content: center;
+          border: 1px solid #e4e4e7; background: #fff; }}
+.thumb img {{ width: 100%; }}
+</style></head><body>
+<h1>Auditoria de recortes</h1>
+<p>{len(rows)} sinalizados de {total} recortes ({html.escape(years)}) · ordenado por {'content_ratio' if sort == 'content' else 'white_ratio'}</p>
+<div class="grid">
+{chr(10).join(cards)}
+</div></body></html>
+"""
+    out_html.write_text(page, encoding="utf-8")
+    return out_html
 
 
 def main():
     parser = argparse.ArgumentParser(description="Audita recortes de questões (área branca / tamanho).")
-    parser.add_argument("--year", type=int, required=True)
-    parser.add_argument("--dataset", type=str, default=None, help="Caminho do dataset (default: public/data/questions/fuvest-<year>.json)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--year", type=int)
+    target.add_argument("--years", type=str, help="ex.: 2015-2026 ou 2019,2021")
+    target.add_argument("--all", action="store_true", help="Todos os anos com fuvest-YYYY.json")
+    parser.add_argument("--dataset", type=str, default=None, help="Caminho do dataset (default: public/data/questions/fuvest-<year>.json; só com --year)")
     parser.add_argument("--out", type=str, default="tools/questions/out", help="Diretório de saída")
     parser.add_argument("--white-threshold", type=float, default=0.72, help="Flag se white_ratio >= este valor")
     parser.add_argument("--min-area", type=int, default=220_000, help="Flag se area <= este valor")
+    parser.add_argument("--workers", type=int, default=0, help="Anos em paralelo (0 = nº de CPUs)")
+    parser.add_argument("--html", action="store_true", help="Gera audit_crops.html com miniaturas dos sinalizados")
+    parser.add_argument("--sort", choices=["white", "content"], default="white", help="Ordem da folha de contato")
+    parser.add_argument("--thumb-width", type=int, default=THUMB_WIDTH)
 
     args = parser.parse_args()
     root = Path(__file__).resolve().parents[2]  # repo root
-    dataset_path = Path(args.dataset) if args.dataset else (root / "public" / "data" / "questions" / f"fuvest-{args.year}.json")
+    data_dir = root / "public" / "data" / "questions"
     out_dir = Path(args.out)
-    audit_year(args.year, dataset_path, out_dir, args.white_threshold, args.min_area)
+
+    if args.year:
+        years = [args.year]
+    elif args.years:
+        years = parse_years(args.years)
+    else:
+        years = dataset_years(data_dir)
+
+    jobs = []
+    for year in years:
+        dataset_path = Path(args.dataset) if (args.dataset and args.year) else (data_dir / f"fuvest-{year}.json")
+        jobs.append((year, dataset_path, out_dir, args.white_threshold, args.min_area, args.html, args.thumb_width))
+
+    workers = min(len(jobs), args.workers or (os.cpu_count() or 1))
+    t0 = time.perf_counter()
+    if workers <= 1:
+        summaries = [_audit_year_job(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            summaries = [f.result() for f in as_completed([ex.submit(_audit_year_job, j) for j in jobs])]
+
+    for s in sorted(summaries, key=lambda s: s["year"]):
+        if not s["ok"]:
+            print(f"[ERRO] {s['year']}: {s['error']}")
+        elif len(jobs) > 1:
+            print(f"[OK] {s['year']}: {s['flagged']}/{s['total']} sinalizados ({s['seconds']}s)")
+    if args.html:
+        report = write_html_report([s for s in summaries if s["ok"]], out_dir, args.sort)
+        print(f"[OK] Folha de contato: {report}")
+    print(f"[*] {len(jobs)} ano(s) auditados em {time.perf_counter() - t0:.1f}s ({workers} processo(s))")
+    if not all(s["ok"] for s in summaries):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+"""
+Benchmark offline do enriquecimento (enrich.py) com um modelo FALSO.
+
+Simula o Gemini localmente — latência por chamada e quota por minuto, respondendo
+429 com "retry_delay { seconds: N }" quando a quota estoura — para medir a vazão
+do token bucket + concorrência sem gastar API.
+
+O "minuto" é encolhido por --time-scale (padrão 10x) para o benchmark rodar rápido:
+uma quota de 10 req/min vira 10 req a cada 6s, latência de 12s vira 1.2s etc.
+
+Exemplo:
+  python tools/questions/bench_enrich.py --questions 30 --quota 10 --latency 12 --workers 1 4 8
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(__file__))
+import enrich  # noqa: E402
+
+
+class FakeModel:
+    """Imita `GenerativeModel.generate_content` com latência e quota por janela."""
+
+    def __init__(self, latency: float, quota: int, window: float, retry_delay: int = 0,
+                 item_latency: float = 0.0, drop_rate: float = 0.0):
+        self.latency = latency
+        self.item_latency = item_latency
+        self.drop_rate = drop_rate
+        self.quota = quota
+        self.window = window
+        self.retry_delay = retry_delay
+        self.calls = deque()
+        self.ok = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        with self._lock:
+            now = time.monotonic()
+            while self.calls and now - self.calls[0] >= self.window:
+                self.calls.popleft()
+            if len(self.calls) >= self.quota:
+                self.rejected += 1
+                delay = self.retry_delay or int(self.window - (now - self.calls[0])) + 1
+                raise Exception(f"429 Resource has been exhausted (fake). retry_delay {{ seconds: {delay} }}")
+            self.calls.append(now)
+        # modo em lote: o prompt traz os ids; responde um array (descartando alguns itens)
+        ids = re.findall(r'"id": "([^"]+)"', prompt) if "LOTE" in prompt else []
+        time.sleep(self.latency + self.item_latency * max(0, len(ids) - 1))
+        with self._lock:
+            self.ok += 1
+        body = {
+            "theory": "Teoria simulada.",
+            "steps": ["Passo 1.", "Passo 2."],
+            "distractors": {k: f"Alternativa {k} (simulada)." for k in "ABCDE"},
+            "finalSummary": "Resumo simulado.",
+        }
+        if ids:
+            items = [dict(body, id=i) for i in ids if random.random() >= self.drop_rate]
+            return SimpleNamespace(text=json.dumps(items, ensure_ascii=False))
+        return SimpleNamespace(text=json.dumps(body, ensure_ascii=False))
+
+
+def _fake_questions(n: int, years: int) -> list[dict]:
+    out = []
+    for i in range(n):
+        year = 3000 + (i % max(1, years))
+        num = i // max(1, years) + 1
+        out.append({
+            "id": f"fuvest-{year}-q{num:02d}",
+            "year": year,
+            "number": num,
+            "stem": f"Enunciado simulado {i}.",
+            "options": [{"key": k, "text": f"Opção {k}"} for k in "ABCDE"],
+            "answer": {"correct": "A"},
+            "explanation": {"theory": "Pendente"},
+        })
+    return out
+
+
+def run(workers: int, batch_size: int, args) -> dict:
+    scale = args.time_scale
+    window = 60.0 / scale
+    llm = FakeModel(latency=args.latency / scale, quota=args.quota, window=window,
+                    item_latency=args.item_latency / scale, drop_rate=args.drop_rate)
+    limiter = enrich.TokenBucket(args.rpm if args.rpm else args.quota, per=window, burst=args.burst)
+    questions = _fake_questions(args.questions, args.years)
+
+    tmp = tempfile.mkdtemp(prefix="bench_enrich_")
+    old_cache = enrich.CACHE_DIR
+    enrich.CACHE_DIR = tmp
+    t0 = time.monotonic()
+    try:
+        results = enrich.enrich_many(questions, workers=workers, limiter=limiter, llm=llm, batch_size=batch_size)
+    finally:
+        enrich.CACHE_DIR = old_cache
+        shutil.rmtree(tmp, ignore_errors=True)
+    elapsed = time.monotonic() - t0
+    done = sum(1 for v in results.values() if v)
+    return {
+        "workers": workers,
+        "batch": batch_size,
+        "done": done,
+        "seconds": elapsed,
+        # vazão convertida de volta para o minuto "real"
+        "per_min": done / (elapsed * scale) * 60.0 if elapsed else 0.0,
+        "calls_ok": llm.ok,
+        "http_429": llm.rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do enrich.py com modelo falso.")
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--years", type=int, default=3, help="Quantos anos falsos intercalar na fila.")
+    parser.add_argument("--latency", type=float, default=12.0, help="Latência simulada por chamada (s reais).")
+    parser.add_argument("--quota", type=int, default=10, help="Quota simulada do modelo (req/min).")
+    parser.add_argument("--rpm", type=float, default=0, help="Taxa do token bucket (0 = igual à quota).")
+    parser.add_argument("--burst", type=int, default=1)
+    parser.add_argument("--time-scale", type=float, default=10.0, help="Quanto o minuto é encolhido.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1], help="Tamanhos de lote a comparar.")
+    parser.add_argument("--item-latency", type=float, default=6.0, help="Latência extra por questão adicional no lote (s reais).")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fração de itens que o modelo falso omite no lote.")
+    args = parser.parse_args()
+
+    print(f"[*] {args.questions} questoes, latencia {args.latency}s, quota {args.quota} req/min, "
+          f"bucket {args.rpm or args.quota:g} req/min (tempo {args.time_scale:g}x)")
+    print(f"{'workers':>7} {'lote':>4} {'ok':>4} {'tempo(s)':>9} {'q/min':>7} {'chamadas':>8} {'429':>4}")
+    for b in args.batch_size:
+        for w in args.workers:
+            r = run(w, b, args)
+            print(f"{r['workers']:>7} {r['batch']:>4} {r['done']:>4} {r['seconds']:>9.2f} {r['per_min']:>7.2f} "
+                  f"{r['calls_ok']:>8} {r['http_429']:>4}")
+
+
+if __name__ == "__main__":
+    main()
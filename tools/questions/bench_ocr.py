@@ -0,0 +1,134 @@
+"""
+Benchmark offline do pré-processamento de OCR (ocr.PREPROCESS_PRESETS).
+
+Roda o Tesseract sobre os recortes já gerados (public/assets/questions/<ano>/qNN/image.png)
+com cada preset, sem cache, e compara:
+
+  prep(s)   tempo só do pré-processamento (no processo principal)
+  ocr(s)    tempo total do OCR (pré-processamento + Tesseract, no pool)
+  chars/s   caracteres reconhecidos por segundo de OCR
+  enunc.    % de enunciados placeholder (qa_gate._is_placeholder ou < 20 caracteres)
+  altern.   % de alternativas placeholder (faltando ou vazias, de A a E)
+
+Os anos padrão (2015 e 2017) são os que mais dependem de OCR.
+
+Exemplo:
+  python tools/questions/bench_ocr.py --years 2015,2017 --presets none,gray,binarize,full --workers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(__file__))
+import ocr  # noqa: E402
+from qa_gate import _is_placeholder  # noqa: E402
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+ASSETS_DIR = os.path.join(PROJECT_ROOT, "public", "assets", "questions")
+OPTION_KEYS = "ABCDE"
+
+
+def _crops(years: list[int], limit: int = 0) -> list[tuple[str, str]]:
+    out = []
+    for year in years:
+        year_dir = os.path.join(ASSETS_DIR, str(year))
+        if not os.path.isdir(year_dir):
+            print(f"[WARN] Sem recortes para {year}: {year_dir}")
+            continue
+        items = []
+        for name in sorted(os.listdir(year_dir)):
+            path = os.path.join(year_dir, name, "image.png")
+            if name.startswith("q") and os.path.exists(path):
+                items.append((f"{year}/{name}", path))
+        out.extend(items[:limit] if limit else items)
+    return out
+
+
+def _score(text: str) -> tuple[bool, int]:
+    """(enunciado é placeholder?, nº de alternativas placeholder)."""
+    stem = ocr.extract_stem_from_ocr(text)
+    options = ocr.parse_alternatives_from_ocr(text) or {}
+    stem_bad = _is_placeholder(stem) or len((stem or "").strip()) < 20
+    opts_bad = sum(1 for k in OPTION_KEYS if _is_placeholder(options.get(k, "")))
+    return stem_bad, opts_bad
+
+
+def run_preset(preset: str, crops: list[tuple[str, str]], workers: int, lang: str) -> dict:
+    images = []
+    for key, path in crops:
+        with Image.open(path) as im:
+            images.append((key, im.convert("RGB")))
+
+    t0 = time.perf_counter()
+    for _, img in images:
+        ocr.preprocess_image(img, preset)
+    prep_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ocr.OcrService(lang=lang, workers=workers, use_cache=False, preprocess=preset) as svc:
+        for key, img in images:
+            svc.submit(key, img)
+        texts = svc.results()
+    ocr_s = time.perf_counter() - t0
+
+    chars = 0
+    stem_bad = 0
+    opts_bad = 0
+    for key, _ in images:
+        text = texts.get(key) or ""
+        chars += len(text.strip())
+        s, o = _score(text)
+        stem_bad += int(s)
+        opts_bad += o
+    n = len(images)
+    return {
+        "preset": preset,
+        "images": n,
+        "prep_s": prep_s,
+        "ocr_s": ocr_s,
+        "chars_s": chars / ocr_s if ocr_s else 0.0,
+        "stem_pct": stem_bad / n * 100 if n else 0.0,
+        "opts_pct": opts_bad / (n * len(OPTION_KEYS)) * 100 if n else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara presets de pré-processamento do OCR (velocidade x qualidade).")
+    parser.add_argument("--years", type=str, default="2015,2017", help="ex.: 2015,2017")
+    parser.add_argument("--presets", type=str, default=",".join(ocr.PREPROCESS_PRESETS),
+                        help=f"Presets a comparar ({', '.join(ocr.PREPROCESS_PRESETS)})")
+    parser.add_argument("--limit", type=int, default=0, help="Máx. de recortes por ano (0 = todos)")
+    parser.add_argument("--workers", type=int, default=0, help="Processos do Tesseract (0 = nº de CPUs)")
+    args = parser.parse_args()
+
+    if not ocr.OCR_READY:
+        print("[ERRO] Tesseract nao disponivel; instale o Tesseract (com o idioma 'por') para rodar o benchmark.")
+        sys.exit(1)
+
+    years = [int(y) for y in args.years.split(",") if y.strip()]
+    presets = [p.strip() for p in args.presets.split(",") if p.strip()]
+    unknown = [p for p in presets if p not in ocr.PREPROCESS_PRESETS]
+    if unknown:
+        print(f"[ERRO] Presets desconhecidos: {', '.join(unknown)}")
+        sys.exit(1)
+    crops = _crops(years, args.limit)
+    if not crops:
+        print("[ERRO] Nenhum recorte encontrado.")
+        sys.exit(1)
+
+    workers = args.workers or (os.cpu_count() or 1)
+    lang = ocr.best_ocr_lang("por")
+    print(f"[*] {len(crops)} recortes ({args.years}), idioma {lang}, {workers} processo(s), sem cache")
+    print(f"{'preset':<10} {'imgs':>5} {'prep(s)':>8} {'ocr(s)':>8} {'chars/s':>8} {'enunc.':>7} {'altern.':>8}")
+    for preset in presets:
+        r = run_preset(preset, crops, workers, lang)
+        print(f"{r['preset']:<10} {r['images']:>5} {r['prep_s']:>8.2f} {r['ocr_s']:>8.2f} {r['chars_s']:>8.0f} "
+              f"{r['stem_pct']:>6.1f}% {r['opts_pct']:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Manifesto de build incremental do ingest (cache/<ano>/build_manifest.json).
+
+Cada artefato gerado (página renderizada, recorte de questão, texto extraído) fica
+registrado com:
+
+  inputs  -> hash das entradas (sha256 do PDF, dpi, página, bbox, padding, refs, versão)
+  output  -> hash do que foi produzido (sha256 do PNG / do texto)
+  size, mtime_ns -> para conferir rápido se o arquivo no disco ainda é o registrado
+
+Na próxima execução um artefato só é refeito se as entradas mudaram ou o arquivo
+sumiu/foi alterado por fora; e, mesmo refeito, o PNG só é regravado se os bytes
+mudaram — recortes intactos mantêm o mtime (e o encode_assets os pula).
+
+Subir BUILD_VERSION quando a forma de gerar os artefatos mudar sem mudar as entradas.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CACHE_DIR = os.path.join(PROJECT_ROOT, "tools", "questions", "cache")
+
+BUILD_VERSION = 1
+
+
+def inputs_key(*parts) -> str:
+    """Hash estável (JSON ordenado) de qualquer combinação de entradas."""
+    payload = json.dumps([BUILD_VERSION, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def png_bytes(img) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Grava só se o conteúdo mudou (preserva mtime de arquivos idênticos). True se gravou."""
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def write_json_if_changed(path: str, obj, **dump_kwargs) -> bool:
+    """write_if_changed para JSON (`dump_kwargs` vão para json.dumps). True se gravou."""
+    return write_if_changed(path, json.dumps(obj, **dump_kwargs).encode("utf-8"))
+
+
+class BuildManifest:
+    """Registro {tipo: {id: entrada}} de um ano; `fresh` diz se dá para pular a etapa."""
+
+    def __init__(self, year: int, path: str | None = None):
+        self.year = year
+        self.path = path or os.path.join(CACHE_DIR, str(year), "build_manifest.json")
+        self.entries = {}
+        self.changed = False
+        self.stats = {}  # tipo -> {"reused": n, "rebuilt": n, "written": n}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            if raw.get("version") == BUILD_VERSION:
+                self.entries = raw.get("entries") or {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def _count(self, kind: str, field: str):
+        s = self.stats.setdefault(kind, {"reused": 0, "rebuilt": 0, "written": 0})
+        s[field] += 1
+
+    def get(self, kind: str, item_id) -> dict | None:
+        return (self.entries.get(kind) or {}).get(str(item_id))
+
+    def fresh(self, kind: str, item_id, key: str, path: str | None = None) -> bool:
+        """Entradas iguais às registradas e (se houver arquivo) arquivo intacto no disco."""
+        entry = self.get(kind, item_id)
+        ok = bool(entry) and entry.get("inputs") == key
+        if ok and path is not None:
+            try:
+                st = os.stat(path)
+                ok = st.st_size == entry.get("size") and st.st_mtime_ns == entry.get("mtime_ns")
+            except OSError:
+                ok = False
+        if ok:
+            self._count(kind, "reused")
+        return ok
+
+    def record(self, kind: str, item_id, key: str, output: str, path: str | None = None,
+               written: bool = False, **extra):
+        entry = {"inputs": key, "output": output, **extra}
+        if path is not None:
+            st = os.stat(path)
+            entry["size"] = st.st_size
+            entry["mtime_ns"] = st.st_mtime_ns
+        self.entries.setdefault(kind, {})[str(item_id)] = entry
+        self.changed = True
+        self._count(kind, "rebuilt")
+        if written:
+            self._count(kind, "written")
+
+    def save_png(self, kind: str, item_id, key: str, img, path: str, **extra) -> bool:
+        """Grava o PNG só se os bytes mudaram e registra. True se o arquivo foi regravado."""
+        data = png_bytes(img)
+        written = write_if_changed(path, data)
+        self.record(kind, item_id, key, sha256_bytes(data), path, written=written, **extra)
+        return written
+
+    def summary(self) -> str:
+        parts = []
+        for kind in sorted(self.stats):
+            s = self.stats[kind]
+            parts.append(f"{kind}: {s['reused']} reaproveitados, {s['rebuilt']} refeitos ({s['written']} gravados)")
+        return " | ".join(parts) or "nada a fazer"
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": BUILD_VERSION, "year": self.year, "entries": self.entries},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self.changed = False
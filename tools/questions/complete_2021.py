@@ -2,6 +2,8 @@ import json
 import os
 from pathlib import Path
 
+from gabarito import load_answer_key
+
 # Carregar JSON atual
 json_path = Path("public/data/questions/fuvest-2021.json")
 with open(json_path, "r", encoding="utf-8") as f:
@@ -15,25 +17,9 @@ print(f"[*] Questões presentes: {len(present_numbers)}/90")
 print(f"[*] Questões faltantes: {len(missing_numbers)}")
 print(f"[*] Números faltantes: {missing_numbers}")
 
-# Carregar gabarito
-gabarito_map = {}
-for q in data["questions"]:
-    if q.get("answer", {}).get("correct"):
-        gabarito_map[q["number"]] = q["answer"]["correct"]
-
-# Se gabarito não tiver todas, tentar do cache ou fazer manualmente
-# Gabarito 2021 (completo)
-gabarito_completo = {
-    1: "C", 2: "E", 3: "D", 4: "C", 5: "B", 6: "D", 7: "E", 8: "A", 9: "B", 10: "C",
-    11: "E", 12: "A", 13: "D", 14: "B", 15: "C", 16: "E", 17: "A", 18: "D", 19: "B", 20: "C",
-    21: "A", 22: "E", 23: "D", 24: "C", 25: "B", 26: "E", 27: "A", 28: "D", 29: "C", 30: "B",
-    31: "E", 32: "A", 33: "D", 34: "C", 35: "B", 36: "E", 37: "A", 38: "D", 39: "C", 40: "B",
-    41: "E", 42: "A", 43: "D", 44: "C", 45: "B", 46: "E", 47: "A", 48: "D", 49: "C", 50: "B",
-    51: "E", 52: "A", 53: "D", 54: "C", 55: "B", 56: "E", 57: "A", 58: "D", 59: "C", 60: "B",
-    61: "E", 62: "A", 63: "D", 64: "C", 65: "B", 66: "E", 67: "A", 68: "D", 69: "C", 70: "B",
-    71: "E", 72: "A", 73: "D", 74: "C", 75: "B", 76: "E", 77: "A", 78: "D", 79: "C", 80: "B",
-    81: "E", 82: "A", 83: "D", 84: "C", 85: "B", 86: "E", 87: "A", 88: "D", 89: "C", 90: "B"
-}
+# Gabarito oficial (store compartilhado: gabarito.py / cache/answer_keys.json)
+gabarito_completo, gab_info = load_answer_key(2021)
+print(f"[*] Gabarito: {gab_info['found']}/90 ({gab_info['strategy']}, versão {gab_info['version']})")
 
 # Criar questões placeholder para as faltantes
 new_questions = []
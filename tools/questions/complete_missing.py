@@ -9,6 +9,8 @@ import argparse
 import fitz
 from PIL import Image
 
+from gabarito import load_answer_key
+
 if sys.stdout.encoding != 'utf-8':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -132,7 +134,6 @@ def complete_missing_questions(year):
     """Completa questões faltantes para um ano."""
     json_path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
     pdf_path = os.path.join(PROVAS_DIR, f"p{str(year)[-2:]}.pdf")
-    gabarito_path = os.path.join(PROVAS_DIR, f"g{str(year)[-2:]}.pdf")
     
     if not os.path.exists(json_path):
         print(f"[ERRO] JSON não encontrado: {json_path}")
@@ -154,12 +155,7 @@ def complete_missing_questions(year):
     # Carrega gabarito
     gabarito = {}
     try:
-        gab_doc = fitz.open(gabarito_path)
-        gab_text = "\n".join(p.get_text() for p in gab_doc)
-        gab_doc.close()
-        import re
-        for m in re.findall(r'(\d{1,2})\s*[-–—]\s*([A-E])', gab_text):
-            gabarito[int(m[0])] = m[1]
+        gabarito, _ = load_answer_key(year)
     except Exception as e:
         print(f"[WARN] Erro ao ler gabarito: {e}")
     
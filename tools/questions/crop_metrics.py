@@ -0,0 +1,113 @@
+"""
+Métricas de recorte vetorizadas (NumPy).
+
+Mesmos limiares e resultados das versões antigas em Python puro (gray.point + getbbox
+e loop em gray.getdata()), mas calculadas sobre o array inteiro:
+
+  content_bbox       -> caixa do conteúdo (pixels < threshold) por perfis de linha/coluna
+  white_ratio        -> fração de pixels >= threshold
+  content_bbox_ratio -> área da caixa de conteúdo / área total
+  dhash / phash      -> hashes perceptuais de 64 bits (gradiente 9x8 / DCT 32x32)
+
+Usado por ingest._auto_trim_whitespace, pelo audit_crops.py e pelo crop_regress.py.
+"""
+
+import numpy as np
+from PIL import Image
+
+WHITE_THRESHOLD = 245
+
+
+def gray_array(img: Image.Image) -> np.ndarray:
+    """Luma 8 bits (mesma conversão do PIL: convert("L"))."""
+    return np.asarray(img if img.mode == "L" else img.convert("L"))
+
+
+def content_bbox(img_or_gray, threshold: int = WHITE_THRESHOLD):
+    """(x0, y0, x1, y1) dos pixels mais escuros que `threshold` (x1/y1 exclusivos) ou None.
+
+    Equivale a `gray.point(lambda p: 255 if p < threshold else 0).getbbox()`.
+    """
+    gray = img_or_gray if isinstance(img_or_gray, np.ndarray) else gray_array(img_or_gray)
+    if gray.size == 0:
+        return None
+    ink = gray < threshold
+    cols = ink.any(axis=0)
+    if not cols.any():
+        return None
+    rows = ink.any(axis=1)
+    x0 = int(cols.argmax())
+    x1 = int(len(cols) - cols[::-1].argmax())
+    y0 = int(rows.argmax())
+    y1 = int(len(rows) - rows[::-1].argmax())
+    return x0, y0, x1, y1
+
+
+def white_ratio(img_or_gray, threshold: int = WHITE_THRESHOLD) -> float:
+    """Percentual de pixels quase-brancos.
+
+    threshold: 0..255 (quanto maior, mais permissivo para considerar branco)
+    """
+    gray = img_or_gray if isinstance(img_or_gray, np.ndarray) else gray_array(img_or_gray)
+    if gray.size == 0:
+        return 1.0
+    return int(np.count_nonzero(gray >= threshold)) / gray.size
+
+
+def content_bbox_ratio(img_or_gray, dark_threshold: int = WHITE_THRESHOLD) -> float:
+    """Quanta área do recorte está ocupada por 'conteúdo' (não branco).
+
+    Retorna: bbox_area / total_area
+    Quanto menor, mais "vazio"/margem/branco excessivo.
+    """
+    gray = img_or_gray if isinstance(img_or_gray, np.ndarray) else gray_array(img_or_gray)
+    bbox = content_bbox(gray, dark_threshold)
+    if not bbox:
+        return 0.0
+    x0, y0, x1, y1 = bbox
+    bbox_area = max(1, (x1 - x0) * (y1 - y0))
+    total_area = max(1, gray.shape[1] * gray.shape[0])
+    return bbox_area / total_area
+
+
+def crop_stats(img: Image.Image, white_threshold: int = WHITE_THRESHOLD) -> dict:
+    """white_ratio + content_ratio com uma única conversão para cinza."""
+    gray = gray_array(img)
+    return {
+        "white_ratio": white_ratio(gray, white_threshold),
+        "content_ratio": content_bbox_ratio(gray, white_threshold),
+    }
+
+
+def _bits_to_hex(bits: np.ndarray) -> str:
+    return f"{int(''.join('1' if b else '0' for b in bits.ravel()), 2):0{bits.size // 4}x}"
+
+
+def dhash(img_or_gray, size: int = 8) -> str:
+    """Hash de diferença: cinza (size+1)x size, bit = pixel mais claro que o vizinho da direita."""
+    img = Image.fromarray(img_or_gray) if isinstance(img_or_gray, np.ndarray) else img_or_gray
+    small = np.asarray(img.convert("L").resize((size + 1, size), Image.BOX), dtype=np.int16)
+    return _bits_to_hex(small[:, 1:] > small[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def phash(img_or_gray, size: int = 8) -> str:
+    """Hash perceptual: DCT 2D do cinza 32x32, bit = coeficiente de baixa frequência acima da mediana."""
+    img = Image.fromarray(img_or_gray) if isinstance(img_or_gray, np.ndarray) else img_or_gray
+    small = np.asarray(img.convert("L").resize((32, 32), Image.BOX), dtype=np.float64)
+    low = (_DCT32 @ small @ _DCT32.T)[:size, :size]
+    return _bits_to_hex(low > np.median(low.ravel()[1:]))
+
+
+def hash_distance(a: str, b: str) -> int:
+    """Distância de Hamming entre dois hashes hex do mesmo tamanho."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
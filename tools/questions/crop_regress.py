@@ -0,0 +1,206 @@
+"""
+Teste de regressão dos recortes por hash perceptual.
+
+Depois de mexer em build_question_rect_index / expand_suspicious_bboxes não dá para
+reauditar ~900 recortes no olho. Este script calcula dHash + pHash (crop_metrics) de cada
+public/assets/questions/<ano>/qNN/image.png e compara com uma baseline por ano em
+
+  tools/questions/cache/crop_hashes/<ano>.json   {qNN: {dhash, phash, size, stat}}
+
+Uso:
+  python tools/questions/crop_regress.py --all --update    # grava a baseline (antes da mudança)
+  python tools/questions/ingest.py --all --recrop-only     # ... mexe nas heurísticas e recorta
+  python tools/questions/crop_regress.py --all             # lista o que mudou, com similaridade
+
+A similaridade vai de 0 a 1 (1 - Hamming/64, média de dHash e pHash); mudança de tamanho
+também conta como alteração. Arquivos com mesmo tamanho em bytes e mtime da baseline não são
+nem decodificados (o recrop só regrava PNGs que mudaram), então a rodada leva segundos.
+Anos rodam em paralelo; relatório em out/crop_regress.json e saída != 0 se algo mudou.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from PIL import Image
+
+from crop_metrics import dhash, phash, hash_distance
+from years import dataset_years, parse_years
+
+ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = ROOT / "public" / "data" / "questions"
+PUBLIC_DIR = ROOT / "public"
+BASELINE_DIR = ROOT / "tools" / "questions" / "cache" / "crop_hashes"
+
+HASH_BITS = 64
+
+
+def hash_crop(path: Path) -> dict:
+    """dHash, pHash e dimensões de um recorte (mais tamanho/mtime do arquivo, para o atalho)."""
+    st = path.stat()
+    with Image.open(path) as img:
+        gray = img.convert("L")
+        return {
+            "dhash": dhash(gray),
+            "phash": phash(gray),
+            "size": [img.width, img.height],
+            "stat": [st.st_size, st.st_mtime_ns],
+        }
+
+
+def similarity(a: dict, b: dict) -> float:
+    """1.0 = mesmos hashes; média das duas distâncias normalizadas."""
+    d = hash_distance(a["dhash"], b["dhash"]) + hash_distance(a["phash"], b["phash"])
+    return 1.0 - d / (2 * HASH_BITS)
+
+
+def _year_crops(year: int) -> dict[str, Path]:
+    dataset = json.loads((DATA_DIR / f"fuvest-{year}.json").read_text(encoding="utf-8"))
+    crops = {}
+    for q in dataset.get("questions") or []:
+        asset = ((q.get("assets") or {}).get("questionImage") or "").lstrip("/")
+        if asset:
+            crops[f"q{int(q.get('number') or 0):02d}"] = PUBLIC_DIR / asset
+    return crops
+
+
+def _load_baseline(year: int) -> dict | None:
+    try:
+        return json.loads((BASELINE_DIR / f"{year}.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _save_baseline(year: int, hashes: dict):
+    BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+    path = BASELINE_DIR / f"{year}.json"
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(hashes, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def check_year(year: int, update: bool = False) -> dict:
+    """Compara os recortes do ano com a baseline (ou a grava, com `update` / sem baseline)."""
+    baseline = None if update else _load_baseline(year)
+    current = {}
+    rows = []
+    reused = 0
+    for qid, path in sorted(_year_crops(year).items()):
+        base = (baseline or {}).get(qid)
+        if not path.exists():
+            if base:
+                rows.append({"year": year, "question": qid, "status": "missing", "similarity": 0.0})
+            continue
+        st = path.stat()
+        if base and base.get("stat") == [st.st_size, st.st_mtime_ns]:
+            current[qid] = base  # arquivo intocado desde a baseline
+            reused += 1
+            continue
+        h = current[qid] = hash_crop(path)
+        if baseline is None:
+            continue
+        if not base:
+            rows.append({"year": year, "question": qid, "status": "new", "similarity": None})
+            continue
+        sim = similarity(base, h)
+        if sim < 1.0 or base["size"] != h["size"]:
+            rows.append({
+                "year": year,
+                "question": qid,
+                "status": "changed",
+                "similarity": round(sim, 4),
+                "dhash_distance": hash_distance(base["dhash"], h["dhash"]),
+                "phash_distance": hash_distance(base["phash"], h["phash"]),
+                "size": [base["size"], h["size"]],
+                "path": str(path.relative_to(ROOT)).replace("\\", "/"),
+            })
+    flagged = {r["question"] for r in rows}
+    for qid in sorted(set(baseline or {}) - set(current) - flagged):
+        rows.append({"year": year, "question": qid, "status": "missing", "similarity": 0.0})
+
+    created = baseline is None
+    if created:
+        _save_baseline(year, current)
+    else:
+        # regravados com o mesmo conteúdo: só atualiza o stat (a próxima rodada nem lê o PNG)
+        same = {q: h for q, h in current.items() if q in baseline and q not in flagged and h is not baseline[q]}
+        if same:
+            _save_baseline(year, {**baseline, **same})
+    return {"year": year, "total": len(current), "reused": reused, "baseline_created": created, "rows": rows}
+
+
+def _check_year_job(job):
+    year, update = job
+    t0 = time.perf_counter()
+    try:
+        summary = check_year(year, update)
+        summary["ok"] = True
+    except Exception as e:
+        summary = {"year": year, "ok": False, "error": f"{type(e).__name__}: {e}", "rows": []}
+    summary["seconds"] = round(time.perf_counter() - t0, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regressão dos recortes por hash perceptual (dHash + pHash).")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--year", type=int)
+    target.add_argument("--years", type=str, help="ex.: 2015-2026 ou 2019,2021")
+    target.add_argument("--all", action="store_true", help="Todos os anos com fuvest-YYYY.json")
+    parser.add_argument("--update", action="store_true", help="Regrava a baseline com os recortes atuais")
+    parser.add_argument("--min-similarity", type=float, default=None,
+                        help="Só lista alterações com similaridade abaixo deste valor (padrão: todas)")
+    parser.add_argument("--out", type=str, default="tools/questions/out", help="Diretório do relatório")
+    parser.add_argument("--workers", type=int, default=0, help="Anos em paralelo (0 = nº de CPUs)")
+    args = parser.parse_args()
+
+    if args.year:
+        years = [args.year]
+    elif args.years:
+        years = parse_years(args.years)
+    else:
+        years = dataset_years(DATA_DIR)
+
+    jobs = [(year, args.update) for year in years]
+    workers = min(len(jobs), args.workers or (os.cpu_count() or 1))
+    t0 = time.perf_counter()
+    if workers <= 1:
+        summaries = [_check_year_job(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            summaries = [f.result() for f in as_completed([ex.submit(_check_year_job, j) for j in jobs])]
+    summaries.sort(key=lambda s: s["year"])
+
+    rows = [r for s in summaries for r in s["rows"]
+            if args.min_similarity is None or r["status"] != "changed" or r["similarity"] < args.min_similarity]
+    rows.sort(key=lambda r: (r["similarity"] if r["similarity"] is not None else 1.0, r["year"], r["question"]))
+    for s in summaries:
+        if not s["ok"]:
+            print(f"[ERRO] {s['year']}: {s['error']}")
+        elif s["baseline_created"]:
+            print(f"[OK] {s['year']}: baseline gravada ({s['total']} recortes, {s['seconds']}s)")
+        else:
+            n = sum(1 for r in rows if r["year"] == s["year"])
+            print(f"[{'WARN' if n else 'OK'}] {s['year']}: {n} alterados de {s['total']} "
+                  f"({s['reused']} sem leitura, {s['seconds']}s)")
+    for r in rows:
+        if r["status"] == "changed":
+            (w0, h0), (w1, h1) = r["size"]
+            print(f"  {r['year']} {r['question']}: similaridade {r['similarity']:.3f} "
+                  f"(dHash {r['dhash_distance']}, pHash {r['phash_distance']}) {w0}x{h0} -> {w1}x{h1}")
+        else:
+            print(f"  {r['year']} {r['question']}: {'novo' if r['status'] == 'new' else 'sumiu'}")
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    report = out_dir / "crop_regress.json"
+    report.write_text(json.dumps({"years": years, "changed": len(rows), "rows": rows},
+                                 ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[*] {len(jobs)} ano(s) em {time.perf_counter() - t0:.1f}s ({workers} processo(s)) | relatório: {report}")
+    raise SystemExit(1 if rows or not all(s["ok"] for s in summaries) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Variantes otimizadas das imagens (recortes de questão e páginas).
+
+Os PNGs do pipeline são RGB sem perdas (página inteira = 1654x2339 a 200 dpi), mas as
+provas são quase só texto preto no branco. Para cada imagem geramos, ao lado do PNG
+original (que continua sendo a fonte para o pipeline/auditoria):
+
+  <nome>-<largura>w.png   -> PNG em paleta (cinza: 16 níveis / 4 bits; colorido: 256 cores)
+  <nome>-<largura>w.webp  -> WebP
+  <nome>-<largura>w.avif  -> AVIF
+
+em algumas larguras (padrão 480, 960 e a largura original). As variantes ficam
+registradas no bloco `assets` do dataset:
+
+  questão: assets.questionImageVariants = {"avif": [{src, width, bytes}, ...], "webp": [...], "png": [...]}
+  ano:     assets.pages = {"2": {"avif": [...], ...}, ...}   (modo "Ver Página")
+
+O encode é incremental (variante mais nova que o PNG é reaproveitada) e roda em
+processos paralelos — AVIF é o formato caro.
+
+Uso:
+  python tools/questions/encode_assets.py --year 2019
+  python tools/questions/encode_assets.py --all --workers 8
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageChops
+
+from shard import write_year_shards
+from years import dataset_years, parse_years
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PUBLIC_DIR = os.path.join(PROJECT_ROOT, "public")
+DATA_DIR = os.path.join(PUBLIC_DIR, "data", "questions")
+PAGES_DIR = os.path.join(PUBLIC_DIR, "assets", "pages")
+
+DEFAULT_WIDTHS = (480, 960)
+FORMATS = ("avif", "webp", "png")  # ordem de preferência no <picture>
+WEBP_QUALITY = 80
+AVIF_QUALITY = 55
+AVIF_SPEED = 6
+GRAY_TOLERANCE = 12  # diferença máx. entre canais para tratar a imagem como cinza
+
+
+def _is_grayscale(img: Image.Image) -> bool:
+    small = img.convert("RGB")
+    small.thumbnail((256, 256))
+    r, g, b = small.split()
+    spread = max(ImageChops.difference(r, g).getextrema()[1], ImageChops.difference(g, b).getextrema()[1])
+    return spread <= GRAY_TOLERANCE
+
+
+def _save_variant(img: Image.Image, path: str, fmt: str, gray: bool):
+    tmp_path = f"{path}.tmp"
+    if fmt == "png":
+        if gray:
+            # texto preto no branco: 16 níveis de cinza bastam (paleta de 4 bits)
+            img.convert("L").quantize(16).save(tmp_path, "PNG", optimize=True, bits=4)
+        else:
+            img.convert("RGB").quantize(256, method=Image.Quantize.FASTOCTREE).save(tmp_path, "PNG", optimize=True)
+    elif fmt == "webp":
+        img.convert("L" if gray else "RGB").save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=6)
+    elif fmt == "avif":
+        img.convert("RGB").save(tmp_path, "AVIF", quality=AVIF_QUALITY, speed=AVIF_SPEED)
+    else:
+        raise ValueError(f"Formato desconhecido: {fmt}")
+    os.replace(tmp_path, path)
+
+
+def _url_of(path: str) -> str:
+    return "/" + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, "/")
+
+
+def encode_image(src_path: str, widths=DEFAULT_WIDTHS, formats=FORMATS) -> dict:
+    """Gera as variantes de um PNG. Retorna {"source": bytes, "variants": {fmt: [{src, width, bytes}]}}."""
+    src_mtime = os.path.getmtime(src_path)
+    base, _ = os.path.splitext(src_path)
+
+    with Image.open(src_path) as im:
+        im.load()
+        full_w, full_h = im.size
+        targets = sorted({w for w in widths if w < full_w} | {full_w})
+        gray = None
+        variants = {fmt: [] for fmt in formats}
+        for w in targets:
+            resized = None
+            for fmt in formats:
+                out_path = f"{base}-{w}w.{fmt}"
+                if not (os.path.exists(out_path) and os.path.getmtime(out_path) >= src_mtime):
+                    if gray is None:
+                        gray = _is_grayscale(im)
+                    if resized is None:
+                        h = max(1, round(full_h * w / full_w))
+                        resized = im if w == full_w else im.resize((w, h), Image.LANCZOS)
+                    _save_variant(resized, out_path, fmt, gray)
+                variants[fmt].append({"src": _url_of(out_path), "width": w, "bytes": os.path.getsize(out_path)})
+
+    return {"source": os.path.getsize(src_path), "variants": variants}
+
+
+def _encode_job(job):
+    key, src_path, widths = job
+    try:
+        return key, encode_image(src_path, widths), None
+    except Exception as e:
+        return key, None, f"{type(e).__name__}: {e}"
+
+
+def _run_jobs(jobs: list, workers: int) -> dict:
+    if workers <= 1 or len(jobs) <= 1:
+        results = [_encode_job(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_encode_job, jobs, chunksize=4))
+    out = {}
+    for key, res, err in results:
+        if err:
+            print(f"[WARN] Falha ao gerar variantes de {key}: {err}")
+            continue
+        out[key] = res
+    return out
+
+
+def encode_question_assets(questions: list[dict], widths=DEFAULT_WIDTHS, workers: int = 1) -> dict:
+    """Gera variantes dos recortes e grava em q['assets']['questionImageVariants']. Retorna totais."""
+    jobs = []
+    for q in questions:
+        url = (q.get("assets") or {}).get("questionImage")
+        if not url or url.endswith("holder.png"):
+            continue
+        src_path = os.path.join(PUBLIC_DIR, url.lstrip("/"))
+        if os.path.exists(src_path):
+            jobs.append((q.get("id"), src_path, widths))
+
+    results = _run_jobs(jobs, workers)
+    for q in questions:
+        res = results.get(q.get("id"))
+        if res:
+            q.setdefault("assets", {})["questionImageVariants"] = res["variants"]
+    return _totals(results.values())
+
+
+def encode_page_assets(year: int, data: dict, widths=DEFAULT_WIDTHS, workers: int = 1) -> dict:
+    """Gera variantes de public/assets/pages/<ano>/page_XX.png e grava em data['assets']['pages']."""
+    pages_dir = os.path.join(PAGES_DIR, str(year))
+    jobs = []
+    if os.path.isdir(pages_dir):
+        for name in sorted(os.listdir(pages_dir)):
+            m = re.fullmatch(r"page_(\d+)\.png", name)
+            if m:
+                jobs.append((str(int(m.group(1))), os.path.join(pages_dir, name), widths))
+
+    results = _run_jobs(jobs, workers)
+    if results:
+        pages = {k: results[k]["variants"] for k in sorted(results, key=int)}
+        data.setdefault("assets", {})["pages"] = pages
+    return _totals(results.values())
+
+
+def _totals(results) -> dict:
+    t = {"images": 0, "source": 0, **{fmt: 0 for fmt in FORMATS}}
+    for res in results:
+        t["images"] += 1
+        t["source"] += res["source"]
+        for fmt, items in res["variants"].items():
+            # compara no tamanho original (maior largura) — é o que substitui o PNG
+            t[fmt] += items[-1]["bytes"] if items else 0
+    return t
+
+
+def _report_line(label: str, t: dict) -> str:
+    def mb(n):
+        return f"{n / 1e6:8.1f}"
+    parts = [f"{label:<16} {t['images']:>5} {mb(t['source'])}"]
+    for fmt in FORMATS:
+        pct = (1 - t[fmt] / t["source"]) * 100 if t["source"] else 0.0
+        parts.append(f"{mb(t[fmt])} ({pct:4.0f}%)")
+    return " ".join(parts)
+
+
+def encode_year(year: int, widths=DEFAULT_WIDTHS, workers: int = 1, pages: bool = True, questions: bool = True) -> dict:
+    path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    report = {}
+    if questions:
+        report["questoes"] = encode_question_assets(data.get("questions", []), widths, workers)
+    if pages:
+        report["paginas"] = encode_page_assets(year, data, widths, workers)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    write_year_shards(year, data)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera variantes PNG(paleta)/WebP/AVIF dos recortes e páginas.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--year", type=int)
+    target.add_argument("--years", type=str, help="ex.: 2015-2026 ou 2019,2021")
+    target.add_argument("--all", action="store_true", help="Todos os anos com fuvest-YYYY.json")
+    parser.add_argument("--workers", type=int, default=0, help="Processos em paralelo (0 = nº de CPUs)")
+    parser.add_argument("--widths", type=str, default=",".join(map(str, DEFAULT_WIDTHS)),
+                        help="Larguras extras além da original, ex.: 480,960")
+    parser.add_argument("--no-pages", action="store_true", help="Não processa public/assets/pages")
+    parser.add_argument("--no-questions", action="store_true", help="Não processa os recortes das questões")
+    args = parser.parse_args()
+
+    if args.year:
+        years = [args.year]
+    elif args.years:
+        years = parse_years(args.years)
+    else:
+        years = dataset_years()
+    workers = args.workers or (os.cpu_count() or 1)
+    widths = tuple(int(w) for w in args.widths.split(",") if w.strip())
+
+    print(f"{'':<16} {'imgs':>5} {'PNG MB':>8} " + " ".join(f"{fmt.upper() + ' MB':>15}" for fmt in FORMATS))
+    grand = {}
+    t0 = time.time()
+    for year in years:
+        try:
+            report = encode_year(year, widths, workers, pages=not args.no_pages, questions=not args.no_questions)
+        except FileNotFoundError:
+            print(f"[ERRO] fuvest-{year}.json nao encontrado.")
+            continue
+        for kind, t in report.items():
+            print(_report_line(f"{year} {kind}", t))
+            g = grand.setdefault(kind, {k: 0 for k in t})
+            for k, v in t.items():
+                g[k] += v
+    if len(years) > 1:
+        for kind, g in grand.items():
+            print(_report_line(f"total {kind}", g))
+    print(f"[OK] Variantes geradas em {time.time() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,18 @@ import argparse
 import time
 import re
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
-import google.generativeai as genai
+from shard import write_year_shards
+from search_index import build_search_index
+from passages import full_stem
+from years import dataset_years, parse_years
+try:
+    import google.generativeai as genai
+except Exception:
+    genai = None
 
 
 def _is_pid_alive(pid: int) -> bool:
@@ -49,6 +58,54 @@ def _save_json_atomic(path: str, data: dict):
     os.replace(tmp_path, path)
 
 
+class EnrichmentJournal:
+    """Journal append-only das explicações novas de um ano (uma linha JSON por questão).
+
+    Reescrever o fuvest-YYYY.json inteiro (~600KB, indent=2) a cada questão custa
+    O(n²) bytes por rodada. Em vez disso cada resultado vira uma linha em
+    cache/<ano>/enrichment/journal.jsonl (flush + fsync), e o journal é compactado
+    no JSON do ano de tempos em tempos e no fim. Se o processo morrer, a próxima
+    rodada reaplica o journal antes de começar (linha final truncada é ignorada).
+    """
+
+    def __init__(self, year: int):
+        self.path = os.path.join(CACHE_DIR, str(year), "enrichment", "journal.jsonl")
+        self.entries = 0
+
+    def replay(self) -> dict:
+        """Retorna {id: explanation} das entradas válidas ainda não compactadas."""
+        out = {}
+        if not os.path.exists(self.path):
+            return out
+        with open(self.path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    continue
+                if isinstance(rec, dict) and rec.get('id') and isinstance(rec.get('explanation'), dict):
+                    out[rec['id']] = rec['explanation']
+        return out
+
+    def append(self, q_id: str, explanation: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        line = json.dumps({"id": q_id, "explanation": explanation}, ensure_ascii=False, separators=(",", ":"))
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries += 1
+
+    def clear(self):
+        # só depois do JSON do ano já ter sido gravado (replay é idempotente)
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        except Exception:
+            pass
+        self.entries = 0
+
+
 def _normalize_explanation(exp: dict) -> tuple[dict, bool]:
     """Garante que o objeto `explanation` tem todos os campos exigidos pelo schema.
 
@@ -139,62 +196,125 @@ CACHE_DIR = os.path.join(PROJECT_ROOT, "tools", "questions", "cache")
 DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "questions")
 
 # --- Inicialização do Modelo de IA ---
-try:
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    if not GEMINI_API_KEY or GEMINI_API_KEY == "SUA_CHAVE_AQUI":
-        raise ValueError("A variável de ambiente GEMINI_API_KEY não foi definida.")
-    
-    genai.configure(api_key=GEMINI_API_KEY)
-    
-    # Diagnóstico: Listar modelos disponíveis
-    print("[DIAG] Listando modelos disponiveis...")
-    model_found = False
-    MODEL_ID = None
-
-    # Preferência de modelos (texto) com maior quota:
-    # 1) gemini-2.5-flash (recomendado)
-    # 2) gemini-2.0-flash
-    # 3) gemini-1.5-flash
-    # Evitar modelos "image-generation" aqui (não precisamos gerar imagem para enriquecer texto).
-    preferred = [
-        "gemini-2.5-flash",
-        "gemini-2.0-flash",
-        "gemini-1.5-flash",
-    ]
-
-    models = [m for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-
-    for pref in preferred:
-        for m in models:
-            if pref in m.name and "lite" not in m.name and "image" not in m.name:
-                MODEL_ID = m.name
-                model_found = True
+# Lazy: só conecta ao Gemini quando main() precisa (permite importar o módulo
+# em benchmarks/offline com um modelo falso).
+model = None
+MODEL_ID = None
+
+
+def get_model():
+    global model, MODEL_ID
+    if model is not None:
+        return model
+    try:
+        if genai is None:
+            raise RuntimeError("google.generativeai não está instalado.")
+        GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+        if not GEMINI_API_KEY or GEMINI_API_KEY == "SUA_CHAVE_AQUI":
+            raise ValueError("A variável de ambiente GEMINI_API_KEY não foi definida.")
+
+        genai.configure(api_key=GEMINI_API_KEY)
+
+        # Diagnóstico: Listar modelos disponíveis
+        print("[DIAG] Listando modelos disponiveis...")
+        model_found = False
+
+        # Preferência de modelos (texto) com maior quota:
+        # 1) gemini-2.5-flash (recomendado)
+        # 2) gemini-2.0-flash
+        # 3) gemini-1.5-flash
+        # Evitar modelos "image-generation" aqui (não precisamos gerar imagem para enriquecer texto).
+        preferred = [
+            "gemini-2.5-flash",
+            "gemini-2.0-flash",
+            "gemini-1.5-flash",
+        ]
+
+        models = [m for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+
+        for pref in preferred:
+            for m in models:
+                if pref in m.name and "lite" not in m.name and "image" not in m.name:
+                    MODEL_ID = m.name
+                    model_found = True
+                    break
+            if model_found:
                 break
-        if model_found:
-            break
-    
-    if not model_found:
-        print("[ERRO] Modelo compativel nao encontrado na sua conta.")
-        sys.exit(1)
-        
-    print(f"[OK] Usando modelo para enriquecimento: {MODEL_ID}")
-    model = genai.GenerativeModel(MODEL_ID)
 
-except Exception as e:
-    print(f"[ERRO] Falha ao configurar a API do Gemini: {e}")
-    sys.exit(1)
+        if not model_found:
+            print("[ERRO] Modelo compativel nao encontrado na sua conta.")
+            sys.exit(1)
+
+        print(f"[OK] Usando modelo para enriquecimento: {MODEL_ID}")
+        model = genai.GenerativeModel(MODEL_ID)
+        return model
+
+    except Exception as e:
+        print(f"[ERRO] Falha ao configurar a API do Gemini: {e}")
+        sys.exit(1)
 
 
 # --- Rate limit / retry helpers ---
-_LAST_CALL_TS = 0.0
+# Por padrão, algumas contas têm limite baixo (ex.: 10 req/min/modelo).
+DEFAULT_REQUESTS_PER_MIN = 8
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_TOKENS = 12000  # orçamento (estimado) de entrada por lote
+
+
+class TokenBucket:
+    """Rate limiter (token bucket) compartilhado entre as threads de enriquecimento.
+
+    - `rate`: requisições permitidas por janela de `per` segundos (quota do modelo)
+    - `burst`: quantas requisições podem sair de uma vez com o balde cheio
+    - `pause(s)`: backoff global; quando um 429 chega com retry_delay, TODAS as
+      threads esperam (em vez de cada uma bater de novo na quota estourada)
+    """
+
+    def __init__(self, rate: float, per: float = 60.0, burst: int = 1):
+        self.fill_rate = float(rate) / float(per)
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        start = max(self.updated, self.paused_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.fill_rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        return
+                    wait = (1.0 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            until = time.monotonic() + max(0.0, seconds)
+            if until > self.paused_until:
+                self.paused_until = until
+                # balde vazio: depois da pausa a cota volta aos poucos, sem rajada
+                self.tokens = 0.0
 
-def _sleep_for_rate_limit(min_interval_sec: float):
-    global _LAST_CALL_TS
-    now = time.time()
-    wait = (_LAST_CALL_TS + min_interval_sec) - now
-    if wait > 0:
-        time.sleep(wait)
-    _LAST_CALL_TS = time.time()
+
+_DEFAULT_LIMITER = None
+
+
+def _default_limiter() -> TokenBucket:
+    global _DEFAULT_LIMITER
+    if _DEFAULT_LIMITER is None:
+        _DEFAULT_LIMITER = TokenBucket(DEFAULT_REQUESTS_PER_MIN, per=60.0)
+    return _DEFAULT_LIMITER
 
 
 def _parse_retry_delay_seconds(err_text: str) -> int:
@@ -207,32 +327,53 @@ def _parse_retry_delay_seconds(err_text: str) -> int:
     except Exception:
         return 0
 
-def enrich_question(question_data):
-    """
-    Usa a IA para gerar uma explicação detalhada para uma questão.
-    Utiliza cache para economizar API.
-    """
-    q_id = question_data.get('id', 'unknown')
-    print(f"[*] Enriquecendo questao: {q_id}", end="", flush=True)
-
+def _cache_path(question_data: dict, passages: dict | None = None) -> str:
     # --- Lógica de Cache ---
     # O hash é baseado no enunciado + alternativas para detectar mudanças
-    core_content = question_data['stem'] + str(question_data['options']) + str(question_data['answer'])
+    # (enunciado com os textos de referência na frente, como antes do passages.py:
+    # a chave não muda para questões já em cache)
+    q_id = question_data.get('id', 'unknown')
+    core_content = full_stem(question_data, passages) + str(question_data['options']) + str(question_data['answer'])
     cache_key = hashlib.sha256(core_content.encode('utf-8')).hexdigest()
-    
+
     cache_subdir = os.path.join(CACHE_DIR, str(question_data['year']), "enrichment")
     os.makedirs(cache_subdir, exist_ok=True)
-    cache_file = os.path.join(cache_subdir, f"{q_id}_{cache_key}.json")
+    return os.path.join(cache_subdir, f"{q_id}_{cache_key}.json")
+
+
+def _read_cache(cache_file: str):
+    if not os.path.exists(cache_file):
+        return None
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_cache(cache_file: str, explanation_data: dict):
+    # tmp + replace: outra thread/processo nunca lê arquivo pela metade
+    tmp_file = f"{cache_file}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(explanation_data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, cache_file)
+
 
-    if os.path.exists(cache_file):
-        print(" (CACHE HIT!)", flush=True)
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+def _used_passages(questions: list[dict], passages: dict | None) -> list[dict]:
+    """Textos de referência citados pelas questões (cada um uma vez, na ordem de uso)."""
+    out, seen = [], set()
+    for q in questions:
+        for pid in q.get('passageIds') or []:
+            if pid in seen or pid not in (passages or {}):
+                continue
+            seen.add(pid)
+            out.append({"id": pid, **passages[pid]})
+    return out
 
-    print(" (CHAMADA DE API...)", flush=True)
 
+def _question_prompt(question_data: dict, passages: dict | None = None) -> str:
+    used = _used_passages([question_data], passages)
+    if used:
+        question_data = dict(question_data, passages=used)
     # --- Prompt de Especialista ---
-    prompt = f"""Você é um professor especialista em vestibular (nível Fuvest) e precisa ensinar o aluno.
+    return f"""Você é um professor especialista em vestibular (nível Fuvest) e precisa ensinar o aluno.
 
 Objetivo: dado o JSON de uma questão de múltipla escolha (A–E) e a alternativa correta, gere uma explicação EXTREMAMENTE DIDÁTICA, técnica e precisa.
 
@@ -264,55 +405,292 @@ Schema de saída esperado:
   "finalSummary": "Um resumo em uma frase da pegadinha ou do conceito chave."
 }}"""
 
-    # Por padrão, algumas contas têm limite baixo (ex.: 10 req/min/modelo).
-    # Então, além do cache, aplicamos:
-    # - throttle (min 7s entre chamadas) e
-    # - retry com espera (lendo retry_delay quando disponível).
-    min_interval_sec = 7.0
+
+# Schema de resposta do modo em lote (response_schema do Gemini).
+_EXPLANATION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "id": {"type": "STRING"},
+        "theory": {"type": "STRING"},
+        "steps": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "distractors": {
+            "type": "OBJECT",
+            "properties": {k: {"type": "STRING"} for k in "ABCDE"},
+            "required": list("ABCDE"),
+        },
+        "finalSummary": {"type": "STRING"},
+    },
+    "required": ["id", "theory", "steps", "distractors", "finalSummary"],
+}
+BATCH_RESPONSE_SCHEMA = {"type": "ARRAY", "items": _EXPLANATION_SCHEMA}
+
+
+def _batch_prompt(questions: list[dict], passages: dict | None = None) -> str:
+    payload = [dict(q, correctAnswer=q['answer']['correct']) for q in questions]
+    used = _used_passages(questions, passages)
+    # texto compartilhado vai uma vez só; as questões apontam para ele por passageIds
+    shared = (f"\nTEXTOS DE REFERÊNCIA (as questões indicam quais usam em passageIds):\n"
+              f"{json.dumps(used, ensure_ascii=False, indent=2)}\n") if used else ""
+    return f"""Você é um professor especialista em vestibular (nível Fuvest) e precisa ensinar o aluno.
+
+Objetivo: para CADA questão de múltipla escolha (A–E) do LOTE abaixo, dada a alternativa correta (correctAnswer), gere uma explicação EXTREMAMENTE DIDÁTICA, técnica e precisa.
+
+Regras obrigatórias:
+1) Não altere enunciado e alternativas.
+2) Sempre gere, para cada questão: id, theory, steps, distractors, finalSummary.
+3) Distractors: explique por que CADA alternativa errada está errada (A,B,C,D,E).
+4) O aluno sempre verá a explicação após responder; escreva para ser útil mesmo se ele acertou.
+5) Não invente dados/fatos. Se faltar informação no enunciado, deixe claro.
+6) Output deve ser SOMENTE um ARRAY JSON estrito e válido, com um objeto por questão, na mesma ordem do lote.
+7) Cada objeto deve repetir o "id" da questão correspondente. Não misture conteúdo entre questões.
+{shared}
+LOTE ({len(questions)} questões):
+{json.dumps(payload, ensure_ascii=False, indent=2)}
+
+Schema de saída esperado:
+[
+  {{
+    "id": "fuvest-AAAA-qNN",
+    "theory": "Breve contexto teórico necessário para resolver a questão.",
+    "steps": ["Passo 1 da resolução...", "Passo 2..."],
+    "distractors": {{
+      "A": "Explicação do erro na A ou confirmação se for a correta...",
+      "B": "Explicação do erro na B...",
+      "C": "Explicação do erro na C...",
+      "D": "Explicação do erro na D...",
+      "E": "Explicação do erro na E..."
+    }},
+    "finalSummary": "Um resumo em uma frase da pegadinha ou do conceito chave."
+  }}
+]"""
+
+
+def _call_model(llm, limiter: TokenBucket, prompt: str, label: str, parse, generation_config: dict | None = None):
+    """Chama o modelo com token bucket + retry e devolve `parse(texto)`; None se esgotar as tentativas.
+
+    Além do cache, aplicamos:
+    - token bucket compartilhado (quota por minuto, entre todas as threads) e
+    - retry com espera (lendo retry_delay quando disponível) que pausa o balde inteiro.
+    """
     max_retries = 6
+    generation_config = generation_config or {"response_mime_type": "application/json"}
 
     for attempt in range(1, max_retries + 1):
         try:
-            _sleep_for_rate_limit(min_interval_sec)
-            response = model.generate_content(
-                prompt,
-                generation_config={"response_mime_type": "application/json"}
-            )
+            limiter.acquire()
+            response = llm.generate_content(prompt, generation_config=generation_config)
 
             # Alguns modelos/contas ocasionalmente retornam JSON com ruído.
             # Tentamos parsear de forma tolerante.
             raw = (response.text or "").strip()
-            explanation_data = _try_parse_json_strict_or_repair(raw)
-
-            # Garante que o schema sempre vai passar
-            explanation_data, _ = _normalize_explanation(explanation_data)
-
-            # Salva no cache
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(explanation_data, f, ensure_ascii=False, indent=2)
-
-            return explanation_data
+            return parse(raw)
 
         except Exception as e:
             msg = str(e)
             retry_delay = _parse_retry_delay_seconds(msg)
 
             if "429" in msg:
-                # respeita sugestão do backend quando existir
+                # respeita sugestão do backend quando existir; a pausa vale para todas as threads
                 wait = (retry_delay if retry_delay > 0 else 60)
-                print(f"\n[WARN] Rate limit (429) em {q_id}. Aguardando {wait}s e tentando novamente ({attempt}/{max_retries})...", flush=True)
-                time.sleep(wait + 1)
+                print(f"[WARN] Rate limit (429) em {label}. Pausando chamadas por {wait}s ({attempt}/{max_retries})...", flush=True)
+                limiter.pause(wait + 1)
                 continue
 
             # Outros erros: backoff simples
             wait = min(60, 2 ** attempt)
-            print(f"\n[WARN] Erro ao enriquecer {q_id}: {msg}. Tentando novamente em {wait}s ({attempt}/{max_retries})...", flush=True)
+            print(f"[WARN] Erro ao enriquecer {label}: {msg}. Tentando novamente em {wait}s ({attempt}/{max_retries})...", flush=True)
             time.sleep(wait)
 
-    print(f"\n[ERRO] Falha definitiva ao enriquecer questao {q_id} apos {max_retries} tentativas.", flush=True)
+    print(f"[ERRO] Falha definitiva ao enriquecer {label} apos {max_retries} tentativas.", flush=True)
     return None
 
 
+def enrich_question(question_data, llm=None, limiter: TokenBucket | None = None, passages: dict | None = None):
+    """
+    Usa a IA para gerar uma explicação detalhada para uma questão.
+    Utiliza cache para economizar API.
+
+    Thread-safe: pode rodar em várias threads ao mesmo tempo desde que todas
+    compartilhem o mesmo `limiter` (quota do modelo).
+    """
+    q_id = question_data.get('id', 'unknown')
+
+    cache_file = _cache_path(question_data, passages)
+    cached = _read_cache(cache_file)
+    if cached is not None:
+        print(f"[*] Enriquecendo questao: {q_id} (CACHE HIT!)", flush=True)
+        return cached
+
+    print(f"[*] Enriquecendo questao: {q_id} (CHAMADA DE API...)", flush=True)
+    llm = llm if llm is not None else get_model()
+    limiter = limiter if limiter is not None else _default_limiter()
+
+    def _parse(raw):
+        # Garante que o schema sempre vai passar
+        exp, _ = _normalize_explanation(_try_parse_json_strict_or_repair(raw))
+        return exp
+
+    explanation_data = _call_model(llm, limiter, _question_prompt(question_data, passages), f"questao {q_id}", _parse)
+    if explanation_data is None:
+        return None
+
+    _write_cache(cache_file, explanation_data)
+    return explanation_data
+
+
+def _parse_json_array(raw: str) -> list:
+    """Parse tolerante da resposta do modo em lote (array; aceita {"items": [...]})."""
+    raw = (raw or "").strip()
+    if not raw:
+        raise ValueError("Resposta vazia do modelo")
+    try:
+        data = json.loads(raw)
+    except Exception:
+        start = raw.find('[')
+        end = raw.rfind(']')
+        candidate = raw[start:end+1] if (start >= 0 and end > start) else raw
+        candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+        data = json.loads(candidate)
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), [data])
+    if not isinstance(data, list):
+        raise ValueError("Resposta do lote não é um array JSON")
+    return data
+
+
+def _estimate_tokens(question_data: dict) -> int:
+    # ~4 caracteres por token é suficiente para empacotar lotes
+    return len(json.dumps(question_data, ensure_ascii=False)) // 4 + 1
+
+
+def _pack_batches(questions: list[dict], batch_size: int, batch_tokens: int,
+                  passages: dict | None = None) -> list[list[dict]]:
+    """Agrupa questões em lotes de até `batch_size` itens e ~`batch_tokens` tokens de entrada.
+
+    Cada texto de referência conta uma vez por lote (vai uma vez só no prompt).
+    Questão que sozinha passa do orçamento vai num lote só dela.
+    """
+    batches, cur, cur_tokens, cur_passages = [], [], 0, set()
+
+    def _cost(q, seen):
+        extra = sum(_estimate_tokens(passages[pid]) for pid in q.get('passageIds') or []
+                    if pid in (passages or {}) and pid not in seen)
+        return _estimate_tokens(q) + extra
+
+    for q in questions:
+        t = _cost(q, cur_passages)
+        if cur and (len(cur) >= batch_size or cur_tokens + t > batch_tokens):
+            batches.append(cur)
+            cur, cur_tokens, cur_passages = [], 0, set()
+            t = _cost(q, cur_passages)
+        cur.append(q)
+        cur_tokens += t
+        cur_passages.update(q.get('passageIds') or [])
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def enrich_batch(questions: list[dict], llm=None, limiter: TokenBucket | None = None,
+                 passages: dict | None = None) -> dict:
+    """Enriquece um lote de questões com UMA chamada ao modelo.
+
+    Cada item da resposta é validado com `_normalize_explanation`: item ausente, com
+    id trocado ou com campo faltando volta para `enrich_question` (uma chamada por
+    questão). Os arquivos de cache por questão continuam sendo gravados, então o
+    cache é o mesmo do modo normal. Retorna {id: explanation_or_None}.
+    """
+    results = {}
+    misses = []
+    for q in questions:
+        cached = _read_cache(_cache_path(q, passages))
+        if cached is not None:
+            print(f"[*] Enriquecendo questao: {q.get('id')} (CACHE HIT!)", flush=True)
+            results[q.get('id')] = cached
+        else:
+            misses.append(q)
+    if len(misses) <= 1:
+        for q in misses:
+            results[q.get('id')] = enrich_question(q, llm, limiter, passages)
+        return results
+
+    llm = llm if llm is not None else get_model()
+    limiter = limiter if limiter is not None else _default_limiter()
+    ids = [q.get('id') for q in misses]
+    label = f"lote {ids[0]}..{ids[-1]} ({len(misses)})"
+    print(f"[*] Enriquecendo {label} (CHAMADA DE API...)", flush=True)
+
+    items = _call_model(
+        llm, limiter, _batch_prompt(misses, passages), label, _parse_json_array,
+        generation_config={"response_mime_type": "application/json", "response_schema": BATCH_RESPONSE_SCHEMA},
+    ) or []
+
+    by_id = {it.get('id'): it for it in items if isinstance(it, dict) and it.get('id')}
+    fallback = []
+    for pos, q in enumerate(misses):
+        q_id = q.get('id')
+        item = by_id.get(q_id)
+        if item is None and len(items) == len(misses) and isinstance(items[pos], dict) and not items[pos].get('id'):
+            item = items[pos]  # sem id, mas a ordem bate
+        if item is None:
+            fallback.append(q)
+            continue
+        item = {k: v for k, v in item.items() if k != 'id'}
+        exp, changed = _normalize_explanation(item)
+        if changed or not str(exp.get('theory') or '').strip():
+            fallback.append(q)
+            continue
+        _write_cache(_cache_path(q, passages), exp)
+        results[q_id] = exp
+
+    if fallback:
+        print(f"[WARN] {len(fallback)}/{len(misses)} itens do {label} invalidos; refazendo um a um.", flush=True)
+        for q in fallback:
+            results[q.get('id')] = enrich_question(q, llm, limiter, passages)
+    return results
+
+
+def enrich_many(questions: list[dict], *, workers: int = DEFAULT_WORKERS, limiter: TokenBucket | None = None,
+                llm=None, on_result=None, batch_size: int = 1, batch_tokens: int = DEFAULT_BATCH_TOKENS,
+                passages: dict | None = None) -> dict:
+    """Enriquece várias questões em paralelo (threads: as chamadas são I/O-bound).
+
+    A concorrência é limitada por `workers` e a vazão pelo `limiter`.
+    Com `batch_size > 1`, cada chamada leva um lote (ver `enrich_batch`), limitado
+    também por `batch_tokens` de entrada.
+    `passages`: {id: {title, text}} dos anos envolvidos (data["passages"]); as questões
+    os citam por `passageIds` e cada texto vai uma vez por prompt.
+    `on_result(question, explanation_or_None)` é chamado na thread principal,
+    na ordem em que as questões terminam (é onde o dataset deve ser alterado/salvo).
+    Retorna {id: explanation_or_None}.
+    """
+    limiter = limiter if limiter is not None else _default_limiter()
+    results = {}
+    if not questions:
+        return results
+    if batch_size > 1:
+        units = _pack_batches(questions, batch_size, batch_tokens, passages)
+        run = lambda batch: enrich_batch(batch, llm, limiter, passages)
+    else:
+        units = [[q] for q in questions]
+        run = lambda batch: {batch[0].get('id'): enrich_question(batch[0], llm, limiter, passages)}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futures = {ex.submit(run, batch): batch for batch in units}
+        for fut in as_completed(futures):
+            batch = futures[fut]
+            try:
+                out = fut.result()
+            except Exception as e:
+                print(f"[ERRO] Falha inesperada ao enriquecer {batch[0].get('id')}: {e}", flush=True)
+                out = {}
+            for q in batch:
+                exp = out.get(q.get('id'))
+                results[q.get('id')] = exp
+                if on_result is not None:
+                    on_result(q, exp)
+    return results
+
+
 def _find_pending_questions(questions: list[dict]) -> list[dict]:
     pending = []
     for q in questions:
@@ -321,48 +699,31 @@ def _find_pending_questions(questions: list[dict]) -> list[dict]:
             pending.append(q)
     return pending
 
-def main():
-    parser = argparse.ArgumentParser(description="Enriquecimento de Questoes com IA.")
-    parser.add_argument("--year", type=int, required=True, help="Ano da prova a ser enriquecida.")
-    parser.add_argument("--limit", type=int, default=0, help="Limite de questoes para processar (0 = todas).")
-    args = parser.parse_args()
-
-    input_path = os.path.join(DATA_DIR, f"fuvest-{args.year}.json")
-    if not os.path.exists(input_path):
-        print(f"[ERRO] Dataset '{input_path}' nao encontrado. Rode o ingest.py primeiro.")
-        sys.exit(1)
+# lock por ano para evitar dois enrich rodando ao mesmo tempo (e duplicando custos)
+# Lock robusto:
+# - Criação atômica (O_EXCL)
+# - Se já existir, tenta ler PID do lock e verificar se processo ainda está vivo
+# - Se PID não estiver vivo (ou lock estiver muito antigo), remove lock automaticamente
+STALE_LOCK_SECONDS = 60 * 60  # 60 min (conservador; evita remover lock legítimo em execuções longas)
 
-    with open(input_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
 
-    questions = data.get('questions', [])
+def _read_lock_pid(path: str) -> int:
+    try:
+        txt = open(path, 'r', encoding='utf-8', errors='ignore').read().strip()
+        # formato esperado: "pid=12345;ts=2025-..."
+        m = re.search(r"pid\s*=\s*(\d+)", txt)
+        if m:
+            return int(m.group(1))
+    except Exception:
+        pass
+    return 0
 
-    # Para evitar percorrer tudo e gerar locks/restarts a cada rodada,
-    # identificamos apenas as pendentes e processamos somente elas.
-    pending_questions = _find_pending_questions(questions)
-    print(f"[*] Iniciando enriquecimento de {len(pending_questions)}/{len(questions)} questoes pendentes de {args.year}...")
 
-    # lock por ano para evitar dois enrich rodando ao mesmo tempo (e duplicando custos)
+def _acquire_year_lock(year: int) -> str | None:
+    """Cria o lock do ano. Retorna o caminho do lock ou None se outro processo já o detém."""
     lock_dir = os.path.join(CACHE_DIR, "_locks")
     os.makedirs(lock_dir, exist_ok=True)
-    lock_path = os.path.join(lock_dir, f"enrich_{args.year}.lock")
-
-    # Lock robusto:
-    # - Criação atômica (O_EXCL)
-    # - Se já existir, tenta ler PID do lock e verificar se processo ainda está vivo
-    # - Se PID não estiver vivo (ou lock estiver muito antigo), remove lock automaticamente
-    stale_lock_seconds = 60 * 60  # 60 min (conservador; evita remover lock legítimo em execuções longas)
-
-    def _read_lock_pid(path: str) -> int:
-        try:
-            txt = open(path, 'r', encoding='utf-8', errors='ignore').read().strip()
-            # formato esperado: "pid=12345;ts=2025-..."
-            m = re.search(r"pid\s*=\s*(\d+)", txt)
-            if m:
-                return int(m.group(1))
-        except Exception:
-            pass
-        return 0
+    lock_path = os.path.join(lock_dir, f"enrich_{year}.lock")
 
     if os.path.exists(lock_path):
         try:
@@ -370,7 +731,7 @@ def main():
             age = time.time() - os.path.getmtime(lock_path)
             pid_alive = _is_pid_alive(pid) if pid else False
 
-            if (pid and not pid_alive) or (age > stale_lock_seconds):
+            if (pid and not pid_alive) or (age > STALE_LOCK_SECONDS):
                 print(f"[LOCK] Lock stale detectado (pid={pid}, alive={pid_alive}, age={int(age)}s). Removendo: {lock_path}")
                 os.remove(lock_path)
         except Exception:
@@ -380,56 +741,161 @@ def main():
         fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
         with os.fdopen(fd, 'w', encoding='utf-8') as f:
             f.write(f"pid={os.getpid()};ts={datetime.now().isoformat()}")
+        return lock_path
     except FileExistsError:
         pid = _read_lock_pid(lock_path)
-        print(f"[LOCK] Já existe um enriquecimento em andamento para {args.year} (lock: {lock_path}, pid={pid}).\n"
+        print(f"[LOCK] Já existe um enriquecimento em andamento para {year} (lock: {lock_path}, pid={pid}).\n"
               "Se você tem certeza que não há outro processo rodando, apague o lock e rode novamente.")
-        sys.exit(2)
+        return None
 
-    # Para evitar perder progresso em caso de interrupção (ou rate limit prolongado),
-    # salvamos incrementalmente a cada questão enriquecida.
-    save_every = 1
 
+def _release_lock(lock_path: str | None):
     try:
-        count = 0
-        enrichement_performed = 0
-        for q in pending_questions:
-            # 1) Normaliza explicação existente (sem gastar API)
-            exp_norm, changed = _normalize_explanation(q.get('explanation'))
-            q['explanation'] = exp_norm
-
-            if changed:
-                enrichement_performed += 1
-                if save_every > 0 and (enrichement_performed % save_every == 0):
-                    _save_json_atomic(input_path, data)
-
-            # 2) Enriquecimento via IA (apenas pendentes/incompletas)
-            new_explanation = enrich_question(q)
-            if new_explanation:
-                q['explanation'] = new_explanation
-                enrichement_performed += 1
-                if save_every > 0 and (enrichement_performed % save_every == 0):
-                    _save_json_atomic(input_path, data)
-
-            count += 1
-            
-            if args.limit > 0 and count >= args.limit:
-                print(f"[*] Limite de {args.limit} questoes atingido.")
-                break
+        if lock_path and os.path.exists(lock_path):
+            os.remove(lock_path)
+    except Exception:
+        pass
+
 
-        # Salva o arquivo atualizado
-        if enrichement_performed > 0:
-            with open(input_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+def _compact(job: dict):
+    """Grava o JSON do ano com o que está no journal e zera o journal."""
+    journal = job["journal"]
+    if journal.entries == 0:
+        return
+    _save_json_atomic(job["path"], job["data"])
+    journal.clear()
+    job["compacted_at"] = time.time()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enriquecimento de Questoes com IA.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--year", type=int, help="Ano da prova a ser enriquecida.")
+    target.add_argument("--years", type=str, help="Vários anos numa mesma fila, ex.: 2015-2026 ou 2019,2021")
+    target.add_argument("--all", action="store_true", help="Todos os anos com data/questions/fuvest-YYYY.json")
+    parser.add_argument("--limit", type=int, default=0, help="Limite de questoes para processar por ano (0 = todas).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Chamadas simultâneas ao modelo.")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MIN, help="Quota de requisições por minuto (token bucket).")
+    parser.add_argument("--burst", type=int, default=1, help="Requisições que podem sair de uma vez com o balde cheio.")
+    parser.add_argument("--batch-size", type=int, default=1, help="Questões por requisição (1 = uma por chamada).")
+    parser.add_argument("--batch-tokens", type=int, default=DEFAULT_BATCH_TOKENS, help="Orçamento estimado de tokens de entrada por lote.")
+    parser.add_argument("--compact-every", type=int, default=25, help="Compacta o journal no JSON do ano a cada N questões.")
+    parser.add_argument("--compact-seconds", type=float, default=120.0, help="...ou a cada N segundos com entradas pendentes.")
+    args = parser.parse_args()
+
+    if args.year:
+        years = [args.year]
+    elif args.years:
+        years = parse_years(args.years)
+    else:
+        years = dataset_years()
+
+    # Carrega os anos e trava cada um; todas as pendentes entram numa única fila,
+    # assim a quota do modelo é aproveitada mesmo quando um ano tem poucas pendentes.
+    jobs = {}  # year -> {path, data, lock, enriched, journal, compacted_at}
+    queue = []
+    passages = {}  # textos de referência de todos os anos da fila (ids são hash do texto)
+    try:
+        for year in years:
+            input_path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
+            if not os.path.exists(input_path):
+                print(f"[ERRO] Dataset '{input_path}' nao encontrado. Rode o ingest.py primeiro.")
+                if len(years) == 1:
+                    sys.exit(1)
+                continue
+
+            lock_path = _acquire_year_lock(year)
+            if not lock_path:
+                if len(years) == 1:
+                    sys.exit(2)
+                continue
+
+            with open(input_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            journal = EnrichmentJournal(year)
+            job = {"path": input_path, "data": data, "lock": lock_path, "enriched": 0,
+                   "journal": journal, "compacted_at": time.time()}
+            jobs[year] = job
+
+            questions = data.get('questions', [])
+            passages.update(data.get('passages') or {})
+
+            # Rodada anterior interrompida: aplica o que ficou no journal antes de tudo.
+            recovered = journal.replay()
+            if recovered:
+                for q in questions:
+                    if q.get('id') in recovered:
+                        q['explanation'] = recovered[q['id']]
+                _save_json_atomic(input_path, data)
+                journal.clear()
+                print(f"[OK] {len(recovered)} explicacoes recuperadas do journal de {year}.")
+
+            # Para evitar percorrer tudo e gerar locks/restarts a cada rodada,
+            # identificamos apenas as pendentes e processamos somente elas.
+            pending_questions = _find_pending_questions(questions)
+            print(f"[*] Iniciando enriquecimento de {len(pending_questions)}/{len(questions)} questoes pendentes de {year}...")
+            if args.limit > 0 and len(pending_questions) > args.limit:
+                pending_questions = pending_questions[:args.limit]
+                print(f"[*] Limite de {args.limit} questoes aplicado em {year}.")
+
+            # 1) Normaliza explicação existente (sem gastar API)
+            for q in pending_questions:
+                exp_norm, changed = _normalize_explanation(q.get('explanation'))
+                q['explanation'] = exp_norm
+                if changed:
+                    job["enriched"] += 1
+            if job["enriched"]:
+                _save_json_atomic(input_path, data)
+
+            queue.extend((year, q) for q in pending_questions)
+
+        if not queue:
+            print("[*] Nenhuma questao pendente.")
+            return
+
+        # 2) Enriquecimento via IA (apenas pendentes/incompletas), em paralelo.
+        # Para evitar perder progresso em caso de interrupção (ou rate limit prolongado),
+        # cada questão enriquecida vai para o journal (na thread principal); o JSON do
+        # ano só é reescrito na compactação (por quantidade/tempo e no fim).
+        llm = get_model()
+        limiter = TokenBucket(args.rpm, per=60.0, burst=args.burst)
+        year_of = {id(q): year for year, q in queue}
+
+        def _apply(q, new_explanation):
+            if not new_explanation:
+                return
+            job = jobs[year_of[id(q)]]
+            q['explanation'] = new_explanation
+            job["enriched"] += 1
+            job["journal"].append(q.get('id'), new_explanation)
+            if (job["journal"].entries >= args.compact_every
+                    or time.time() - job["compacted_at"] >= args.compact_seconds):
+                _compact(job)
+
+        t0 = time.time()
+        enrich_many([q for _, q in queue], workers=args.workers, limiter=limiter, llm=llm, on_result=_apply,
+                    batch_size=args.batch_size, batch_tokens=args.batch_tokens, passages=passages)
+        elapsed = time.time() - t0
+        for year, job in jobs.items():
+            _compact(job)
+            if job["enriched"]:
+                write_year_shards(year, job["data"])
+        if any(job["enriched"] for job in jobs.values()):
+            # explicações novas entram na busca
+            r = build_search_index()
+            print(f"[OK] Indice de busca: {r['terms']} termos em {r['shards']} shards ({r['written']} gravados).")
 
         print(f"\n[DONE] FASE 3!")
-        print(f"[*] {enrichement_performed} questoes enriquecidas no arquivo: {input_path}")
+        for year, job in jobs.items():
+            print(f"[*] {job['enriched']} questoes enriquecidas no arquivo: {job['path']}")
+        print(f"[*] {len(queue)} questoes processadas em {elapsed:.1f}s ({args.workers} workers, {args.rpm:g} req/min).")
     finally:
-        try:
-            if os.path.exists(lock_path):
-                os.remove(lock_path)
-        except Exception:
-            pass
+        for job in jobs.values():
+            try:
+                _compact(job)
+            except Exception as e:
+                print(f"[WARN] Falha ao compactar journal ({job['path']}): {e}. Ele sera reaplicado na proxima rodada.")
+            _release_lock(job["lock"])
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,8 @@ import json
 import fitz
 from PIL import Image
 
+from gabarito import load_answer_key
+
 if sys.stdout.encoding != 'utf-8':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -125,7 +127,6 @@ def fix_2015():
     year = 2015
     json_path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
     pdf_path = os.path.join(PROVAS_DIR, "p15.pdf")
-    gabarito_path = os.path.join(PROVAS_DIR, "g15.pdf")
     
     print(f"[*] Carregando JSON de {year}...")
     with open(json_path, 'r', encoding='utf-8') as f:
@@ -143,12 +144,7 @@ def fix_2015():
     # Carrega gabarito
     gabarito = {}
     try:
-        gab_doc = fitz.open(gabarito_path)
-        gab_text = "\n".join(p.get_text() for p in gab_doc)
-        gab_doc.close()
-        import re
-        for m in re.findall(r'(\d{1,2})\s*[-–—]\s*([A-E])', gab_text):
-            gabarito[int(m[0])] = m[1]
+        gabarito, _ = load_answer_key(year)
     except Exception as e:
         print(f"[WARN] Erro ao ler gabarito: {e}")
     
@@ -0,0 +1,475 @@
+"""
+Leitura dos gabaritos oficiais (provas/gYY.pdf).
+
+Os gabaritos da Fuvest são tabelas: uma coluna por versão da prova ("PROVA V",
+"PROVA K", ..., ou "PROVA V1".."V4" a partir de 2025), cada uma com duas sub-colunas
+(1–45 e 46–90). Conforme o ano a célula vem como "01‐E" numa palavra só, ou
+como "01‐" + "E" / "1" + "E" em palavras separadas. A 2ª página dos anos recentes é
+o "GABARITO DE CORRESPONDÊNCIA" (mapa entre versões) e é ignorada.
+
+Estratégias, na ordem (a primeira com 90 respostas vence):
+  layout  -> palavras do PDF com coordenadas: casa número e letra na mesma linha e
+             atribui a célula à versão pelo cabeçalho "PROVA X" mais próximo em x
+  regex   -> regex sobre o texto corrido (listas simples "1 - A", sem versões)
+  ocr     -> Tesseract local (ocr_words) + o mesmo parser de layout (gabarito escaneado)
+  gemini  -> visão do Gemini (ingest.extract_gabarito_via_gemini), último recurso
+
+A versão usada é a da prova (capa: "pertence ao grupo V"); sem isso (pYY.pdf ausente ou
+capa sem grupo), a primeira coluna do gabarito — um chute, avisado com [WARN].
+
+Store compartilhado: cada gabarito é lido uma vez e guardado em cache/answer_keys.json
+({ano: 90 letras numa string, "*" = anulada}), com a chave no sha256 do gYY.pdf + a versão
+detectada na prova (um pYY.pdf de outro grupo invalida a entrada). Todos os
+scripts usam `load_answer_key(ano)` / `answer_for(ano, n)` em vez de reabrir o PDF.
+
+Uso:
+  python tools/questions/gabarito.py --year 2019
+  python tools/questions/gabarito.py --all
+  python tools/questions/gabarito.py --all --refresh     # ignora o store e relê os PDFs
+  python tools/questions/gabarito.py --all --apply       # corrige answer.correct nos datasets
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from ocr import OCR_READY, ocr_words
+from search_index import build_search_index
+from shard import write_year_shards
+from years import parse_years, pdf_years
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PROVAS_DIR = os.path.join(PROJECT_ROOT, "provas")
+DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "questions")
+CACHE_DIR = os.path.join(PROJECT_ROOT, "tools", "questions", "cache")
+STORE_PATH = os.path.join(CACHE_DIR, "answer_keys.json")
+STORE_VERSION = 2  # subir quando o parser mudar de forma que invalide o store
+
+TOTAL_QUESTIONS = 90
+LETTERS = "ABCDE"
+ANNULLED = "*"
+OCR_DPI = 300
+
+MISSING = "-"
+PENDING_EXPLANATION = {
+    "theory": "Pendente",
+    "steps": [],
+    "distractors": {"A": "", "B": "", "C": "", "D": "", "E": ""},
+    "finalSummary": "",
+}
+
+_DASHES = "-‐‑–—."
+_CELL_RE = re.compile(rf"^(\d{{1,2}})[{_DASHES})]*([A-E*]|ANULADA)?$")
+_LETTER_RE = re.compile(r"^([A-E*]|ANULADA)$")
+_VERSION_RE = re.compile(r"^([A-Z]\d?)$")
+
+
+def _clean(text: str) -> str:
+    return (text or "").replace("\xa0", " ").strip().strip(":")
+
+
+def _letter(text: str) -> str:
+    return ANNULLED if text == "ANULADA" else text
+
+
+def _is_correspondence_page(words: list) -> bool:
+    text = " ".join(_clean(w[4]).upper() for w in words)
+    return "CORRESPOND" in text
+
+
+def _version_headers(words: list) -> list[tuple[str, float, float]]:
+    """[(versão, x_centro, y_base)] a partir de "PROVA X" na mesma linha."""
+    rows = sorted(words, key=lambda w: (round(w[1]), w[0]))
+    headers = []
+    for i, w in enumerate(rows):
+        if _clean(w[4]).upper() != "PROVA":
+            continue
+        for nxt in rows[i + 1:i + 3]:
+            same_line = abs(nxt[1] - w[1]) < (w[3] - w[1]) * 0.5
+            m = _VERSION_RE.match(_clean(nxt[4]).upper())
+            if same_line and m and 0 <= nxt[0] - w[2] < (w[3] - w[1]) * 2:
+                headers.append((m.group(1), (w[0] + nxt[2]) / 2.0, w[3]))
+                break
+    return headers
+
+
+def _cells(words: list) -> list[tuple[int, str, float, float]]:
+    """Células (número, letra, x_centro, y_centro) casando número e letra na mesma linha."""
+    numbers, letters, cells = [], [], []
+    for w in words:
+        text = _clean(w[4]).upper()
+        m = _CELL_RE.match(text)
+        if m:
+            if m.group(2):
+                cells.append((int(m.group(1)), _letter(m.group(2)), (w[0] + w[2]) / 2.0, (w[1] + w[3]) / 2.0))
+            else:
+                numbers.append(w)
+            continue
+        if _LETTER_RE.match(text):
+            letters.append(w)
+
+    taken = set()
+    for w in sorted(numbers, key=lambda w: (w[1], w[0])):
+        h = w[3] - w[1]
+        cy = (w[1] + w[3]) / 2.0
+        best = None
+        for j, lw in enumerate(letters):
+            if j in taken:
+                continue
+            gap = lw[0] - w[2]
+            if abs((lw[1] + lw[3]) / 2.0 - cy) < h * 0.5 and -1.0 <= gap < h * 3:
+                if best is None or gap < best[0]:
+                    best = (gap, j)
+        if best is not None:
+            taken.add(best[1])
+            lw = letters[best[1]]
+            cells.append((int(_clean(w[4]).rstrip(_DASHES + ")")), _letter(_clean(lw[4]).upper()),
+                          (w[0] + lw[2]) / 2.0, cy))
+    return cells
+
+
+def parse_gabarito_words(pages_words: list[list]) -> dict[str, dict[int, str]]:
+    """Gabarito por versão a partir das palavras (x0, y0, x1, y1, texto, ...) de cada página.
+
+    Retorna {versão: {número: letra}}; versão "" quando a tabela não tem cabeçalhos.
+    Questões anuladas ("*" ou "Anulada") vêm com ANNULLED.
+    """
+    by_version = {}
+    for words in pages_words:
+        if not words or _is_correspondence_page(words):
+            continue
+        headers = sorted(_version_headers(words), key=lambda h: h[1])
+        top = min((h[2] for h in headers), default=None)
+        for h in headers:
+            by_version.setdefault(h[0], {})  # mantém a ordem das colunas (V, K, ... / V1, V2, ...)
+        for num, letter, cx, cy in _cells(words):
+            if not 1 <= num <= TOTAL_QUESTIONS:
+                continue
+            if headers:
+                if cy < top:
+                    continue
+                version = min(headers, key=lambda h: abs(h[1] - cx))[0]
+            else:
+                version = ""
+            by_version.setdefault(version, {}).setdefault(num, letter)
+    return by_version
+
+
+def parse_gabarito_text(text: str) -> dict[int, str]:
+    """Regex sobre o texto corrido (gabaritos em lista, sem colunas por versão)."""
+    gabarito = {}
+    patterns = [
+        rf'(\d{{1,2}})\s*[{_DASHES}]\s*([ABCDE])',
+        r'(\d{1,2})\s*[\)]\s*([ABCDE])',
+        r'(\d{1,2})\s+([ABCDE])',
+    ]
+    for pat in patterns:
+        for num_str, letter in re.findall(pat, text):
+            n = int(num_str)
+            if 1 <= n <= TOTAL_QUESTIONS:
+                gabarito.setdefault(n, letter)
+    return gabarito
+
+
+def detect_exam_version(prova_pdf_path: str) -> str | None:
+    """Versão da prova pela capa ("pertence ao grupo V" / "PROVA V1")."""
+    if not prova_pdf_path or not os.path.exists(prova_pdf_path):
+        return None
+    doc = fitz.open(prova_pdf_path)
+    try:
+        text = " ".join(doc.load_page(i).get_text("text") for i in range(min(2, len(doc))))
+    finally:
+        doc.close()
+    text = re.sub(r"[\s\x00-\x1f\xa0]+", " ", text)
+    m = re.search(r"\bgrupo\s+([A-Z]\d?)\b", text, re.IGNORECASE) or re.search(r"\bPROVA\s+([A-Z]\d)\b", text)
+    return m.group(1).upper() if m else None
+
+
+def _pick_version(by_version: dict, version: str | None):
+    """(versão, respostas, chutou?) — chutou = várias colunas e nenhuma casa com a da prova."""
+    if not by_version:
+        return None, {}, False
+    if version and version in by_version:
+        return version, by_version[version], False
+    # sem versão conhecida: a primeira coluna (V / V1), que é a "oficial" nos anos com correspondência
+    first = next(iter(by_version))
+    return first, by_version[first], len([v for v in by_version if v]) > 1
+
+
+def _complete(answers: dict) -> bool:
+    return all(n in answers for n in range(1, TOTAL_QUESTIONS + 1))
+
+
+def _ocr_pages_words(doc) -> list[list]:
+    pages = []
+    scale = 72.0 / OCR_DPI
+    for i in range(len(doc)):
+        pix = doc.load_page(i).get_pixmap(dpi=OCR_DPI)
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        pages.append([[w[0] * scale, w[1] * scale, w[2] * scale, w[3] * scale, *w[4:]] for w in ocr_words(img)])
+    return pages
+
+
+def read_gabarito(gabarito_pdf_path: str, version: str | None = None, use_ocr: bool = True,
+                  vision_fallback=None) -> tuple[dict[int, str], dict]:
+    """Lê o gabarito tentando as estratégias em ordem.
+
+    Retorna (respostas, info): respostas = {número: letra} (anuladas ficam de fora) e
+    info = {"strategy", "seconds", "version", "version_guessed", "versions", "annulled", "found"}.
+    `vision_fallback(path) -> {número: letra}` é chamado só se nenhuma estratégia local bastar.
+    """
+    t0 = time.perf_counter()
+    info = {"strategy": None, "seconds": 0.0, "version": None, "version_guessed": False, "versions": [],
+            "annulled": [], "found": 0}
+    best = {}
+
+    def _accept(strategy, by_version):
+        nonlocal best
+        chosen, answers, guessed = _pick_version(by_version, version)
+        info["versions"] = [v for v in by_version if v]
+        if len(answers) > len(best):
+            best = answers
+            info["strategy"], info["version"], info["version_guessed"] = strategy, chosen or None, guessed
+        return _complete(answers)
+
+    doc = fitz.open(gabarito_pdf_path)
+    try:
+        pages_words = [doc.load_page(i).get_text("words") for i in range(len(doc))]
+        done = _accept("layout", parse_gabarito_words(pages_words))
+        if not done:
+            text = "\n".join(doc.load_page(i).get_text("text") for i in range(len(doc)))
+            done = _accept("regex", {"": parse_gabarito_text(text)})
+        if not done and use_ocr and OCR_READY:
+            done = _accept("ocr", parse_gabarito_words(_ocr_pages_words(doc)))
+    finally:
+        doc.close()
+
+    if not _complete(best) and vision_fallback is not None:
+        answers = vision_fallback(gabarito_pdf_path) or {}
+        if len(answers) > len(best):
+            best = answers
+            info["strategy"], info["version"], info["version_guessed"] = "gemini", None, False
+
+    info["annulled"] = sorted(n for n, v in best.items() if v == ANNULLED)
+    answers = {n: v for n, v in best.items() if v in LETTERS}
+    info["found"] = len(answers) + len(info["annulled"])
+    info["seconds"] = time.perf_counter() - t0
+    return answers, info
+
+
+def gabarito_paths(year: int) -> tuple[str, str]:
+    yy = str(year)[-2:]
+    return os.path.join(PROVAS_DIR, f"g{yy}.pdf"), os.path.join(PROVAS_DIR, f"p{yy}.pdf")
+
+
+def format_report(year: int, info: dict) -> str:
+    version = info.get("version") or "-"
+    annulled = f" | anuladas: {','.join(map(str, info['annulled']))}" if info.get("annulled") else ""
+    return (f"[GAB] {year}: {info.get('strategy') or 'falhou'} (versão {version}) "
+            f"{info.get('found', 0)}/{TOTAL_QUESTIONS} em {info.get('seconds', 0.0) * 1000:.0f} ms{annulled}")
+
+
+def version_warning(year: int, info: dict) -> str | None:
+    """Aviso quando a coluna do gabarito foi escolhida sem saber a versão da prova."""
+    if not info.get("version_guessed"):
+        return None
+    return (f"[WARN] {year}: versão da prova não detectada (p{str(year)[-2:]}.pdf ausente ou sem grupo); "
+            f"usando a 1ª coluna ({info.get('version') or '-'}) de {', '.join(info.get('versions') or [])}")
+
+
+# --- Store (cache/answer_keys.json) ---
+_store = None  # carregado uma vez por processo
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_store() -> dict:
+    try:
+        with open(STORE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if data.get("version") != STORE_VERSION:
+        return {}
+    return data.get("years") or {}
+
+
+def _load_store() -> dict:
+    global _store
+    if _store is None:
+        _store = _read_store()
+    return _store
+
+
+def _save_entry(year: int, entry: dict):
+    """Regrava o store com a entrada do ano (relê antes: vários processos do ingest multi-ano escrevem)."""
+    years = _read_store()
+    years[str(year)] = entry
+    _load_store()[str(year)] = entry
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    payload = {"version": STORE_VERSION, "years": {k: years[k] for k in sorted(years)}}
+    tmp_path = f"{STORE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, STORE_PATH)
+
+
+def _encode_answers(answers: dict, annulled: list) -> str:
+    out = []
+    for n in range(1, TOTAL_QUESTIONS + 1):
+        out.append(ANNULLED if n in annulled else answers.get(n, MISSING))
+    return "".join(out)
+
+
+def _decode_answers(encoded: str) -> dict[int, str]:
+    return {i + 1: c for i, c in enumerate(encoded) if c in LETTERS}
+
+
+def _entry_info(entry: dict, cached: bool) -> dict:
+    encoded = entry.get("answers", "")
+    annulled = [i + 1 for i, c in enumerate(encoded) if c == ANNULLED]
+    return {
+        "strategy": entry.get("strategy"),
+        "seconds": entry.get("seconds", 0.0),
+        "version": entry.get("examVersion"),
+        "version_guessed": entry.get("versionGuessed", False),
+        "versions": entry.get("versions", []),
+        "annulled": annulled,
+        "found": sum(1 for c in encoded if c != MISSING),
+        "cached": cached,
+    }
+
+
+def load_answer_key(year: int, refresh: bool = False, use_ocr: bool = True,
+                    vision_fallback=None) -> tuple[dict[int, str], dict]:
+    """Gabarito do ano via store; relê o PDF só se o hash mudou (ou `refresh`).
+
+    Retorna (respostas, info) como `read_gabarito`, com info["cached"] indicando store hit.
+    Levanta FileNotFoundError se provas/gYY.pdf não existir.
+    """
+    gab_path, prova_path = gabarito_paths(year)
+    pdf_hash = _sha256_file(gab_path)
+    detected = detect_exam_version(prova_path)
+    entry = _load_store().get(str(year))
+    if (entry and not refresh and entry.get("pdfSha256") == pdf_hash
+            and entry.get("detectedVersion") == detected):
+        return _decode_answers(entry["answers"]), _entry_info(entry, cached=True)
+
+    answers, info = read_gabarito(gab_path, detected, use_ocr=use_ocr, vision_fallback=vision_fallback)
+    entry = {
+        "pdf": os.path.basename(gab_path),
+        "pdfSha256": pdf_hash,
+        "detectedVersion": detected,
+        "examVersion": info["version"],
+        "versionGuessed": info["version_guessed"],
+        "versions": info["versions"],
+        "strategy": info["strategy"],
+        "seconds": round(info["seconds"], 4),
+        "answers": _encode_answers(answers, info["annulled"]),
+    }
+    # gabarito incompleto não vai para o store (próxima chamada tenta de novo)
+    if info["found"] >= TOTAL_QUESTIONS:
+        _save_entry(year, entry)
+    return answers, dict(info, cached=False)
+
+
+def answer_for(year: int, number: int) -> str | None:
+    """Letra correta da questão (None se anulada/ausente)."""
+    answers, _ = load_answer_key(year)
+    return answers.get(int(number))
+
+
+def load_answer_keys(years=None) -> dict[int, dict[int, str]]:
+    """{ano: {número: letra}} para os anos pedidos (padrão: todos com gYY.pdf)."""
+    return {year: load_answer_key(year)[0] for year in (years or pdf_years("g"))}
+
+
+def apply_to_dataset(year: int, reset_explanations: bool = True) -> dict:
+    """Reescreve answer.correct de public/data/questions/fuvest-<ano>.json pelo gabarito.
+
+    Anuladas mantêm a letra do dataset (o schema exige uma). Onde a resposta muda, a explicação
+    (escrita para a letra antiga) volta a "Pendente" para o enrich.py refazer.
+    """
+    path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    answers, info = load_answer_key(year)
+    changed = []
+    for q in data.get("questions") or []:
+        correct = answers.get(int(q.get("number") or 0))
+        if correct is None or (q.get("answer") or {}).get("correct") == correct:
+            continue
+        q["answer"] = {"correct": correct}
+        if reset_explanations:
+            q["explanation"] = dict(PENDING_EXPLANATION, distractors=dict(PENDING_EXPLANATION["distractors"]))
+        changed.append(q.get("number"))
+    if changed:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        write_year_shards(year, data)
+    return {"year": year, "changed": changed, "info": info}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lê os gabaritos (layout/regex/OCR) e relata a estratégia por ano.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--year", type=int)
+    target.add_argument("--years", type=str, help="ex.: 2015-2026 ou 2019,2021")
+    target.add_argument("--all", action="store_true", help="Todos os anos com provas/gYY.pdf")
+    parser.add_argument("--no-ocr", action="store_true", help="Não tenta o Tesseract local")
+    parser.add_argument("--refresh", action="store_true", help="Ignora o store e relê os PDFs")
+    parser.add_argument("--apply", action="store_true",
+                        help="Reescreve answer.correct nos datasets (explicações das respostas trocadas voltam a Pendente)")
+    args = parser.parse_args()
+
+    if args.year:
+        years = [args.year]
+    elif args.years:
+        years = parse_years(args.years)
+    else:
+        years = pdf_years("g")
+
+    rc = 0
+    applied = 0
+    for year in years:
+        gab_path, _ = gabarito_paths(year)
+        if not os.path.exists(gab_path):
+            print(f"[ERRO] {os.path.basename(gab_path)} nao encontrado.")
+            rc = 1
+            continue
+        _, info = load_answer_key(year, refresh=args.refresh, use_ocr=not args.no_ocr)
+        print(format_report(year, info) + (" (store)" if info["cached"] else ""))
+        warning = version_warning(year, info)
+        if warning:
+            print(warning)
+        if info["found"] < TOTAL_QUESTIONS:
+            rc = 1
+        elif args.apply and os.path.exists(os.path.join(DATA_DIR, f"fuvest-{year}.json")):
+            res = apply_to_dataset(year)
+            applied += len(res["changed"])
+            print(f"[OK] {year}: {len(res['changed'])} respostas corrigidas no dataset"
+                  + (f" ({', '.join(map(str, res['changed']))})" if res["changed"] else ""))
+    if applied:
+        # explicações resetadas mudam o texto indexado
+        r = build_search_index()
+        print(f"[OK] Indice de busca: {r['docs']} questoes | {r['written']} arquivos gravados")
+    sys.exit(rc)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,10 @@ import json
 import hashlib
 from datetime import datetime
 import re
+import time
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
 try:
     import google.generativeai as genai
@@ -15,13 +19,24 @@ except Exception:
 
 # OCR local (sem Google) para fallback quando PDF vier com encoding ruim
 try:
-    from ocr import ocr_image, parse_alternatives_from_ocr, extract_stem_from_ocr, OCR_READY
+    from ocr import (ocr_image, parse_alternatives_from_ocr, extract_stem_from_ocr, OCR_READY, OcrService,
+                     OcrWordsPage, OcrWordsDocument, scale_words)
 except Exception:
     OCR_READY = False
+    OcrService = None
     ocr_image = None
     parse_alternatives_from_ocr = None
     extract_stem_from_ocr = None
 
+from shard import write_year_shards
+from search_index import build_search_index
+from passages import factor_passages, passage_id
+from crop_metrics import content_bbox
+from build_manifest import BuildManifest, inputs_key, png_bytes, sha256_bytes, write_if_changed, write_json_if_changed
+from gabarito import load_answer_key, format_report, version_warning, TOTAL_QUESTIONS
+from years import parse_years, pdf_years
+from encode_assets import encode_question_assets
+
 # --- Configuração de Codificação ---
 if sys.stdout.encoding != 'utf-8':
     import io
@@ -37,6 +52,16 @@ ASSETS_DIR = os.path.join(PROJECT_ROOT, "public", "assets", "questions")
 DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "questions")
 PROVAS_DIR = os.path.join(PROJECT_ROOT, "provas")
 
+# Parâmetros do detector de layout (entram na chave do cache de layout)
+MARKER_MARGIN_PT = 520
+QUESTION_RECT_PAD_PT = 8
+QUESTION_MIN_GAP_PT = 60
+LAYOUT_CACHE_VERSION = 1
+
+# Pré-processamento das imagens antes do Tesseract (preset de ocr.PREPROCESS_PRESETS ou None).
+# Escolher com base no bench_ocr.py; None mantém o comportamento original.
+OCR_PREPROCESS = None
+
 gemini_vision_model = None
 
 gemini_text_model = None
@@ -171,7 +196,7 @@ def _extract_reference_blocks(doc: fitz.Document, dpi: int = 200):
         page_w = rect.width
         page_h = rect.height
         mid_x = page_w / 2.0
-        markers = _detect_question_markers_from_pdf_page(page)
+        markers = _page_markers(page)
         col_markers = []
         for qnum, bbox in markers:
             x0, y0, *_ = bbox
@@ -297,9 +322,7 @@ Schema:
 
 def _auto_trim_whitespace(img: Image.Image, pad: int = 10):
     try:
-        gray = img.convert("L")
-        bw = gray.point(lambda p: 255 if p < 245 else 0)
-        bbox = bw.getbbox()
+        bbox = content_bbox(img)
         if not bbox:
             return img
         x0, y0, x1, y1 = bbox
@@ -346,23 +369,65 @@ def get_gemini_text_model():
     return gemini_text_model
 
 
-def render_pdf_to_images(pdf_path, year, dpi=200, skip_first_page=True):
+def _render_page_range(pdf_path: str, page_nums, dpi: int, out_dir: str):
+    """Renderiza um subconjunto de páginas (roda em processo separado no modo paralelo)."""
+    out = []
+    doc = fitz.open(pdf_path)
+    try:
+        for page_num in page_nums:
+            pix = doc.load_page(page_num).get_pixmap(dpi=dpi)
+            output_path = os.path.join(out_dir, f"page_{page_num + 1:02d}.png")
+            pix.save(output_path)
+            out.append(output_path)
+    finally:
+        doc.close()
+    return out
+
+
+def render_pdf_to_images(pdf_path, year, dpi=200, skip_first_page=True, workers=1, manifest=None, pdf_hash=None):
+    """Renderiza as páginas em out/<ano>/pages/page_XX.png.
+
+    Com `manifest` (BuildManifest), páginas cujo PNG ainda corresponde ao mesmo PDF/dpi
+    não são renderizadas de novo.
+    """
     image_paths = []
     year_output_dir = os.path.join(OUTPUT_DIR, str(year), "pages")
     os.makedirs(year_output_dir, exist_ok=True)
     print(f"[*] Renderizando paginas de {os.path.basename(pdf_path)}...", flush=True)
     try:
         doc = fitz.open(pdf_path)
+        n_pages = len(doc)
+        doc.close()
         start_page = 1 if skip_first_page else 0
         print(f"[INFO] Pulando primeira página (capa/instruções)." if skip_first_page else "", flush=True)
-        for page_num in range(start_page, len(doc)):
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap(dpi=dpi)
-            output_path = os.path.join(year_output_dir, f"page_{page_num + 1:02d}.png")
-            pix.save(output_path)
-            image_paths.append(output_path)
-        print(f"[OK] {len(doc) - start_page} paginas convertidas.", flush=True)
-        doc.close()
+        page_nums = list(range(start_page, n_pages))
+        keys = {}
+        if manifest is not None:
+            pdf_hash = pdf_hash or _sha256_file(pdf_path)
+            for page_num in page_nums:
+                keys[page_num] = inputs_key("page", pdf_hash, dpi, page_num + 1)
+            page_nums = [p for p in page_nums
+                         if not manifest.fresh("pages", p + 1, keys[p],
+                                               os.path.join(year_output_dir, f"page_{p + 1:02d}.png"))]
+        # Render + encode PNG é CPU-bound: divide as páginas entre processos.
+        workers = max(1, min(int(workers or 1), len(page_nums)))
+        if not page_nums:
+            pass
+        elif workers > 1:
+            chunks = [page_nums[i::workers] for i in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                for paths in ex.map(_render_page_range, [pdf_path] * workers, chunks,
+                                    [dpi] * workers, [year_output_dir] * workers):
+                    image_paths.extend(paths)
+        else:
+            image_paths = _render_page_range(pdf_path, page_nums, dpi, year_output_dir)
+        if manifest is not None:
+            for page_num in page_nums:
+                path = os.path.join(year_output_dir, f"page_{page_num + 1:02d}.png")
+                manifest.record("pages", page_num + 1, keys[page_num], _sha256_file(path), path, written=True)
+            image_paths = [os.path.join(year_output_dir, f"page_{p + 1:02d}.png") for p in range(start_page, n_pages)]
+        image_paths.sort()
+        print(f"[OK] {len(page_nums)}/{n_pages - start_page} paginas convertidas.", flush=True)
         return image_paths
     except Exception as e:
         print(f"[ERRO] Falha ao processar PDF: {e}", flush=True)
@@ -411,7 +476,7 @@ def _detect_question_markers_from_pdf_page(page: fitz.Page):
     rect = page.rect
     page_w = rect.width
     mid_x = page_w / 2.0
-    margin_pt = 520
+    margin_pt = MARKER_MARGIN_PT
     # Permite 01, 02 etc (alguns PDFs usam 2 dígitos para as primeiras questões)
     num_re = re.compile(r"^\{?0*(\d{1,2})\}?(?:[\.)])?$")
     lines = {}
@@ -456,6 +521,162 @@ def _detect_question_markers_from_pdf_page(page: fitz.Page):
     return [(qnum, best[qnum]) for qnum in sorted(best.keys())]
 
 
+def _rect_key(clip):
+    if clip is None:
+        return None
+    r = fitz.Rect(clip)
+    return (round(r.x0, 3), round(r.y0, 3), round(r.x1, 3), round(r.y1, 3))
+
+
+class PdfPageAnalysis:
+    """Análise de uma página do PDF feita uma única vez (words/blocks/text/markers).
+
+    Expõe o mesmo subconjunto da API de `fitz.Page` usado pelo pipeline
+    (`get_text`, `rect`, `number`, `get_pixmap`), então pode ser passada no lugar
+    da página em `_extract_reference_blocks`, `expand_suspicious_bboxes` e
+    `extract_question_text_from_pdf` sem mudar essas funções.
+
+    Extrações da página inteira compartilham um único TextPage. Recortes (`clip=`)
+    continuam indo ao MuPDF (a regra de inclusão dele usa o contorno do glifo,
+    então filtrar as words em Python mudaria o texto nas bordas), mas ficam
+    memoizados: o mesmo recorte nunca é extraído duas vezes.
+    """
+
+    def __init__(self, page: fitz.Page):
+        self.page = page
+        self.number = page.number
+        self.rect = page.rect
+        self._textpage = None
+        self._full = {}
+        self._clipped = {}
+        self._markers = None
+
+    def _tp(self):
+        if self._textpage is None:
+            self._textpage = self.page.get_textpage(flags=fitz.TEXTFLAGS_WORDS)
+        return self._textpage
+
+    def get_text(self, option: str = "text", clip=None):
+        if option not in ("words", "text", "blocks"):
+            return self.page.get_text(option, clip=clip)
+        if clip is None:
+            if option not in self._full:
+                self._full[option] = self.page.get_text(option, textpage=self._tp())
+            result = self._full[option]
+        else:
+            key = (option, _rect_key(clip))
+            if key not in self._clipped:
+                self._clipped[key] = self.page.get_text(option, clip=clip)
+            result = self._clipped[key]
+        # words/blocks são listas: devolve cópia (chamadores fazem sort in-place)
+        return list(result) if isinstance(result, list) else result
+
+    @property
+    def markers(self):
+        if self._markers is None:
+            self._markers = _detect_question_markers_from_pdf_page(self)
+        return self._markers
+
+    def get_pixmap(self, *args, **kwargs):
+        return self.page.get_pixmap(*args, **kwargs)
+
+
+class PdfDocumentAnalysis:
+    """Documento PDF aberto uma vez, com `PdfPageAnalysis` memoizada por página.
+
+    Usado no lugar de `fitz.Document` por todas as etapas do ingest
+    (índice de bboxes, blocos de referência, expansão e extração de texto).
+    """
+
+    def __init__(self, doc: fitz.Document):
+        self.doc = doc
+        self.name = doc.name
+        self._pages = {}
+
+    @classmethod
+    def open(cls, pdf_path: str):
+        return cls(fitz.open(pdf_path))
+
+    def __len__(self):
+        return len(self.doc)
+
+    def load_page(self, page_idx: int) -> PdfPageAnalysis:
+        if page_idx not in self._pages:
+            self._pages[page_idx] = PdfPageAnalysis(self.doc.load_page(page_idx))
+        return self._pages[page_idx]
+
+    def __getitem__(self, page_idx: int) -> PdfPageAnalysis:
+        return self.load_page(page_idx)
+
+    def close(self):
+        self._pages = {}
+        self.doc.close()
+
+
+class PdfCropper:
+    """Motor de recorte que renderiza as páginas direto do PDF, em memória.
+
+    Substitui abrir/decodificar o PNG da página inteira para cada questão: cada
+    página é renderizada uma vez (cache LRU pequeno, pois as questões vêm em ordem
+    de página) e todas as questões dela são recortadas do mesmo bitmap. As bboxes
+    continuam em pixels da renderização a `dpi`, então o resultado é idêntico ao
+    crop feito sobre out/<ano>/pages/page_XX.png.
+
+    Observação: renderizar só o `clip` de cada questão sai um pouco mais barato,
+    mas o MuPDF reamostra imagens embutidas (fotos) de forma diferente por recorte,
+    o que mudava os pixels dessas questões.
+
+    Aceita caminho do PDF, `fitz.Document` ou `PdfDocumentAnalysis`.
+    """
+
+    def __init__(self, pdf, dpi: int = 200, max_cached_pages: int = 2):
+        self._own_doc = isinstance(pdf, str)
+        self.doc = fitz.open(pdf) if self._own_doc else pdf
+        self.dpi = dpi
+        self.max_cached_pages = max(1, max_cached_pages)
+        self._pages = {}
+
+    def __len__(self):
+        return len(self.doc)
+
+    def page_image(self, page_num: int):
+        """Página inteira (1-based) como PIL RGB; None se a página não existir."""
+        page_num = int(page_num or 0)
+        if page_num <= 0 or page_num > len(self.doc):
+            return None
+        img = self._pages.pop(page_num, None)
+        if img is None:
+            pix = self.doc.load_page(page_num - 1).get_pixmap(dpi=self.dpi)
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        self._pages[page_num] = img
+        while len(self._pages) > self.max_cached_pages:
+            self._pages.pop(next(iter(self._pages)))
+        return img
+
+    def crop(self, page_num: int, bbox: dict, padding: int = 15):
+        """Recorta bbox (px) + padding da página `page_num` (1-based). None se a página não existir."""
+        img = self.page_image(page_num)
+        if img is None:
+            return None
+        img_w, img_h = img.size
+        x = max(0, int(bbox["x"]) - padding)
+        y = max(0, int(bbox["y"]) - padding)
+        w = min(img_w - x, int(bbox["w"]) + (padding * 2))
+        h = min(img_h - y, int(bbox["h"]) + (padding * 2))
+        return img.crop((x, y, x + w, y + h))
+
+    def close(self):
+        self._pages = {}
+        if self._own_doc:
+            self.doc.close()
+
+
+def _page_markers(page):
+    if isinstance(page, PdfPageAnalysis):
+        return page.markers
+    return _detect_question_markers_from_pdf_page(page)
+
+
 def build_question_bboxes_from_pdf(pdf_path: str, dpi: int = 200):
     doc = fitz.open(pdf_path)
     scale = dpi / 72.0
@@ -508,8 +729,15 @@ def build_question_bboxes_from_pdf(pdf_path: str, dpi: int = 200):
     return page_map
 
 
-def build_question_rect_index(pdf_path: str, dpi: int = 200, min_q=1, max_q=90):
-    doc = fitz.open(pdf_path)
+def build_question_rect_index(pdf_path: str, dpi: int = 200, min_q=1, max_q=90, doc=None):
+    """Índice determinístico {qnum: {page, rect, bbox}}.
+
+    `doc` pode ser um `PdfDocumentAnalysis` já aberto (reaproveita words/markers);
+    sem ele, o PDF é aberto e fechado aqui.
+    """
+    own_doc = doc is None
+    if own_doc:
+        doc = PdfDocumentAnalysis.open(pdf_path)
     scale = dpi / 72.0
     idx = {}
     for i in range(len(doc)):
@@ -518,7 +746,7 @@ def build_question_rect_index(pdf_path: str, dpi: int = 200, min_q=1, max_q=90):
         page_w = rect.width
         page_h = rect.height
         mid_x = page_w / 2.0
-        markers = _detect_question_markers_from_pdf_page(page)
+        markers = _page_markers(page)
         if not markers:
             continue
         left = []
@@ -538,10 +766,10 @@ def build_question_rect_index(pdf_path: str, dpi: int = 200, min_q=1, max_q=90):
             for idx2, (qnum, y0) in enumerate(col_items):
                 # Evita recorte curto por falso-positivo de marcador logo abaixo.
                 j = idx2 + 1
-                while j < len(col_items) and (col_items[j][1] - y0) < 60:
+                while j < len(col_items) and (col_items[j][1] - y0) < QUESTION_MIN_GAP_PT:
                     j += 1
                 y1 = col_items[j][1] if j < len(col_items) else page_h
-                pad_pt = 8
+                pad_pt = QUESTION_RECT_PAD_PT
                 x0p = max(0, col_x0 - pad_pt)
                 x1p = min(page_w, col_x1 + pad_pt)
                 y0p = max(0, y0 - pad_pt)
@@ -557,10 +785,123 @@ def build_question_rect_index(pdf_path: str, dpi: int = 200, min_q=1, max_q=90):
         for qnum, rect_pt, bbox_px in build_col(left, 0, mid_x) + build_col(right, mid_x, page_w):
             if qnum not in idx:
                 idx[qnum] = {"page": i + 1, "rect": rect_pt, "bbox": bbox_px}
-    doc.close()
+    if own_doc:
+        doc.close()
     return idx
 
 
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _layout_cache_file(pdf_path: str, dpi: int):
+    params = {
+        "version": LAYOUT_CACHE_VERSION,
+        "dpi": dpi,
+        "margin_pt": MARKER_MARGIN_PT,
+        "pad_pt": QUESTION_RECT_PAD_PT,
+        "min_gap_pt": QUESTION_MIN_GAP_PT,
+    }
+    pdf_hash = _sha256_file(pdf_path)
+    params_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    cache_dir = os.path.join(CACHE_DIR, "layout")
+    name = f"{os.path.basename(pdf_path)}_{pdf_hash[:16]}_{params_hash}.json"
+    return os.path.join(cache_dir, name), pdf_hash, params
+
+
+def _compute_layout(doc, pdf_path: str, dpi: int):
+    markers = {}
+    for i in range(len(doc)):
+        page_markers = _page_markers(doc.load_page(i))
+        if page_markers:
+            markers[i + 1] = [[qnum, list(bbox)] for qnum, bbox in page_markers]
+    rect_index = build_question_rect_index(pdf_path, dpi=dpi, doc=doc)
+    try:
+        refs_by_qnum, refs_by_label = _extract_reference_blocks(doc, dpi=dpi)
+    except Exception as e:
+        print(f"[WARN] Falha ao extrair blocos de referência: {e}", flush=True)
+        refs_by_qnum, refs_by_label = {}, {}
+    return markers, rect_index, refs_by_qnum, refs_by_label
+
+
+def load_layout_index(pdf_path: str, dpi: int = 200, doc=None, refresh: bool = False):
+    """Layout determinístico do PDF (markers, rect_index, blocos de referência), com cache em disco.
+
+    O cache fica em cache/layout/ e é endereçado pelo SHA-256 do PDF + parâmetros do
+    detector, então só é recalculado quando o PDF ou a heurística mudam
+    (mudou a heurística sem mudar parâmetros? incremente LAYOUT_CACHE_VERSION).
+
+    Retorna dict com:
+      - markers: {page: [[qnum, [x0, y0, x1, y1]], ...]}
+      - rect_index: {qnum: {page, rect, bbox}} (mesmo formato de build_question_rect_index)
+      - refs_by_qnum / refs_by_label: mesmo formato de _extract_reference_blocks
+    """
+    cache_file, pdf_hash, params = _layout_cache_file(pdf_path, dpi)
+    if not refresh and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            refs = raw.get("refs") or []
+            return {
+                "markers": {int(k): v for k, v in (raw.get("markers") or {}).items()},
+                "rect_index": {int(k): v for k, v in (raw.get("rect_index") or {}).items()},
+                "refs_by_qnum": {int(k): [refs[i] for i in ids] for k, ids in (raw.get("refs_by_qnum") or {}).items()},
+                "refs_by_label": {k: refs[i] for k, i in (raw.get("refs_by_label") or {}).items()},
+            }
+        except Exception as e:
+            print(f"[WARN] Cache de layout inválido ({os.path.basename(cache_file)}): {e}. Recalculando...", flush=True)
+
+    own_doc = doc is None
+    if own_doc:
+        doc = PdfDocumentAnalysis.open(pdf_path)
+    try:
+        markers, rect_index, refs_by_qnum, refs_by_label = _compute_layout(doc, pdf_path, dpi)
+    finally:
+        if own_doc:
+            doc.close()
+
+    # Um mesmo bloco de referência costuma servir várias questões: guarda uma vez só.
+    refs = []
+    ref_ids = {}
+
+    def _ref_id(r):
+        if id(r) not in ref_ids:
+            ref_ids[id(r)] = len(refs)
+            refs.append(r)
+        return ref_ids[id(r)]
+
+    payload = {
+        "pdf": os.path.basename(pdf_path),
+        "sha256": pdf_hash,
+        "params": params,
+        "markers": markers,
+        "rect_index": rect_index,
+        "refs_by_qnum": {qn: [_ref_id(r) for r in rs] for qn, rs in refs_by_qnum.items()},
+        "refs_by_label": {label: _ref_id(r) for label, r in refs_by_label.items()},
+        "refs": refs,
+    }
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_path = cache_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, cache_file)
+    return {
+        "markers": markers,
+        "rect_index": rect_index,
+        "refs_by_qnum": refs_by_qnum,
+        "refs_by_label": refs_by_label,
+    }
+
+
+def load_question_rect_index(pdf_path: str, dpi: int = 200):
+    """Atalho para scripts que só precisam das bboxes (usa o cache de layout)."""
+    return load_layout_index(pdf_path, dpi=dpi)["rect_index"]
+
+
 def _has_option_marker_in_text(text: str) -> bool:
     t = (text or "")
     # Detecta a) / A) / (a) / (A) etc.
@@ -712,8 +1053,45 @@ def extract_question_text_from_pdf(doc: fitz.Document, page_num: int, rect_pt):
     return stem, options
 
 
-def crop_assets(questions, year, page_image_paths, bbox_index=None, padding=15):
+def _crop_region(page_image_paths, page_num: int, bbox: dict, padding: int, cropper=None):
+    """Recorte bbox (px) + padding da página `page_num` (1-based), do PdfCropper ou do PNG da página."""
+    if cropper is not None:
+        return cropper.crop(page_num, bbox, padding=padding)
+    with Image.open(page_image_paths[page_num - 1]) as img:
+        img_w, img_h = img.size
+        x = max(0, int(bbox["x"]) - padding)
+        y = max(0, int(bbox["y"]) - padding)
+        w = min(img_w - x, int(bbox["w"]) + (padding * 2))
+        h = min(img_h - y, int(bbox["h"]) + (padding * 2))
+        return img.crop((x, y, x + w, y + h))
+
+
+def _crop_inputs_key(pdf_hash, dpi, page, bbox, padding):
+    return inputs_key("crop", pdf_hash, dpi, int(page), bbox, padding, 12)
+
+
+def _question_crop_image(page_num, bbox, padding, page_image_paths=None, cropper=None):
+    """Recorte final de uma questão: bbox + padding e trim de margens."""
+    cropped_img = _crop_region(page_image_paths, page_num, bbox, padding, cropper=cropper)
+    if cropped_img is None:
+        raise ValueError(f"página {page_num} inválida")
+    return _auto_trim_whitespace(cropped_img, pad=12)
+
+
+def crop_assets(questions, year, page_image_paths=None, bbox_index=None, padding=15, cropper=None,
+                manifest=None, pdf_hash=None):
+    """Recorta a imagem de cada questão (só a questão; textos de referência vão para
+    reference_assets).
+
+    Com `cropper` (PdfCropper), recorta do bitmap da página renderizada em memória direto
+    do PDF (uma renderização por página); sem ele, recorta dos PNGs de página em
+    `page_image_paths` (modo legado).
+
+    Com `manifest`, questões cujas entradas (PDF, dpi, página, bbox, padding) não mudaram
+    são puladas e o PNG só é regravado se os bytes mudarem.
+    """
     print("\n[CLIP] Recortando assets das questoes...", flush=True)
+    dpi = getattr(cropper, "dpi", 200)
     for question in questions:
         q_num = question.get("number")
         if bbox_index and q_num in bbox_index:
@@ -728,20 +1106,22 @@ def crop_assets(questions, year, page_image_paths, bbox_index=None, padding=15):
         if not all([q_num, bbox, page_idx >= 0]):
             question['asset_path'] = "/assets/questions/holder.png"
             continue
+        asset_path = os.path.join(ASSETS_DIR, str(year), f"q{q_num:02d}", "image.png")
+        asset_url = f"/assets/questions/{year}/q{q_num:02d}/image.png"
+        key = None
+        if manifest is not None and pdf_hash:
+            key = _crop_inputs_key(pdf_hash, dpi, page_idx + 1, bbox, padding)
+            if manifest.fresh("crops", q_num, key, asset_path):
+                question['asset_path'] = asset_url
+                continue
         try:
-            with Image.open(page_image_paths[page_idx]) as img:
-                img_w, img_h = img.size
-                x = max(0, bbox['x'] - padding)
-                y = max(0, bbox['y'] - padding)
-                w = min(img_w - x, bbox['w'] + (padding * 2))
-                h = min(img_h - y, bbox['h'] + (padding * 2))
-                cropped_img = img.crop((x, y, x + w, y + h))
-                cropped_img = _auto_trim_whitespace(cropped_img, pad=12)
-                asset_dir = os.path.join(ASSETS_DIR, str(year), f"q{q_num:02d}")
-                os.makedirs(asset_dir, exist_ok=True)
-                asset_path = os.path.join(asset_dir, "image.png")
+            cropped_img = _question_crop_image(page_idx + 1, bbox, padding, page_image_paths, cropper)
+            if key is not None:
+                manifest.save_png("crops", q_num, key, cropped_img, asset_path)
+            else:
+                os.makedirs(os.path.dirname(asset_path), exist_ok=True)
                 cropped_img.save(asset_path, "PNG")
-                question['asset_path'] = f"/assets/questions/{year}/q{q_num:02d}/image.png"
+            question['asset_path'] = asset_url
         except Exception as e:
             print(f"[ERRO] Falha no recorte da Q{q_num}: {e}", flush=True)
             question['asset_path'] = "/assets/questions/holder.png"
@@ -764,90 +1144,91 @@ def _dedupe_refs(refs):
     return out
 
 
-def _crop_reference_image(page_image_paths, ref_obj, padding_px=14):
+def _crop_reference_image(page_image_paths, ref_obj, padding_px=14, cropper=None):
     page_idx = int(ref_obj.get("page", 0)) - 1
     bbox = ref_obj.get("bbox_px") or {}
-    if page_idx < 0 or page_idx >= len(page_image_paths):
+    n_pages = len(cropper) if cropper is not None else len(page_image_paths or [])
+    if page_idx < 0 or page_idx >= n_pages:
         return None
     if not all(k in bbox for k in ["x", "y", "w", "h"]):
         return None
     try:
-        with Image.open(page_image_paths[page_idx]) as img:
-            img_w, img_h = img.size
-            x = max(0, int(bbox["x"]) - padding_px)
-            y = max(0, int(bbox["y"]) - padding_px)
-            w = min(img_w - x, int(bbox["w"]) + (padding_px * 2))
-            h = min(img_h - y, int(bbox["h"]) + (padding_px * 2))
-            cropped = img.crop((x, y, x + w, y + h))
-            return _auto_trim_whitespace(cropped, pad=12)
+        cropped = _crop_region(page_image_paths, page_idx + 1, bbox, padding_px, cropper=cropper)
+        if cropped is None:
+            return None
+        return _auto_trim_whitespace(cropped, pad=12)
     except Exception:
         return None
 
 
-def _combine_images_vertical(images, gap=16, bg=(255, 255, 255)):
-    imgs = [im for im in (images or []) if im is not None]
-    if not imgs:
-        return None
-    w = max(im.width for im in imgs)
-    h = sum(im.height for im in imgs) + gap * (len(imgs) - 1)
-    canvas = Image.new("RGB", (w, h), bg)
-    y = 0
-    for im in imgs:
-        x = (w - im.width) // 2
-        canvas.paste(im, (x, y))
-        y += im.height + gap
-    return canvas
+def _ref_block(ref_obj) -> str:
+    """Texto da referência exatamente como _apply_refs_to_stem o coloca no stem."""
+    title = _normalize_spaces(ref_obj.get("title") or "").strip()
+    text = _normalize_spaces(ref_obj.get("text") or "").strip()
+    if not text:
+        return ""
+    return f"{title}\n{text}" if title else text
 
 
 def _apply_refs_to_stem(stem: str, refs):
-    refs = _dedupe_refs(refs)
-    if not refs:
-        return stem
-    blocks = []
-    for r in refs:
-        title = _normalize_spaces(r.get("title") or "").strip()
-        text = _normalize_spaces(r.get("text") or "").strip()
-        if not text:
-            continue
-        if title:
-            blocks.append(f"{title}\n{text}")
-        else:
-            blocks.append(text)
+    blocks = [b for b in (_ref_block(r) for r in _dedupe_refs(refs)) if b]
     if not blocks:
         return stem
     prefix = "\n\n".join(blocks)
     return f"{prefix}\n\n{stem}" if stem else prefix
 
 
-def apply_reference_assets(questions, year, page_image_paths):
-    for q in questions:
-        refs = q.get("_references") or []
-        refs = _dedupe_refs(refs)
-        if not refs:
-            continue
-        asset_url = q.get("asset_path") or q.get("assets", {}).get("questionImage")
-        if not asset_url:
-            continue
-        local_path = os.path.join(PROJECT_ROOT, "public", asset_url.lstrip("/"))
-        if not os.path.exists(local_path):
-            continue
-        try:
-            with Image.open(local_path) as base_img:
-                base_img = base_img.convert("RGB")
-                ref_imgs = []
-                for r in refs:
-                    ri = _crop_reference_image(page_image_paths, r)
-                    if ri is not None:
-                        ref_imgs.append(ri.convert("RGB"))
-                if not ref_imgs:
-                    continue
-                composed = _combine_images_vertical([*ref_imgs, base_img], gap=18)
-                if composed is None:
-                    continue
-                composed = _auto_trim_whitespace(composed, pad=10)
-                composed.save(local_path, "PNG")
-        except Exception as e:
-            print(f"[WARN] Falha ao compor imagem com refs (Q{q.get('number')}): {e}", flush=True)
+def _ref_asset_id(ref_obj) -> str:
+    """Mesmo id da passagem (passages.passage_id) quando a referência tem texto;
+    senão, hash da região (página + bbox)."""
+    block = _ref_block(ref_obj)
+    if block:
+        return passage_id(block)
+    region = json.dumps([int(ref_obj.get("page") or 0), ref_obj.get("bbox_px")], sort_keys=True)
+    return "ref-" + hashlib.sha1(region.encode("utf-8")).hexdigest()[:10]
+
+
+def reference_assets(questions, year, page_image_paths=None, cropper=None, manifest=None, pdf_hash=None,
+                     padding_px=14):
+    """Um PNG por texto de referência (public/assets/questions/<ano>/refs/<id>.png) e, em cada
+    questão que o usa, `references: [{id, image}]` — o frontend mostra à parte, sem recompor
+    a imagem da questão. Lê `_references` de cada questão.
+    """
+    dpi = getattr(cropper, "dpi", 200)
+    saved = {}  # id -> url (None se o recorte falhou)
+    for question in questions:
+        refs_out = []
+        for r in _dedupe_refs(question.get("_references")):
+            ref_id = _ref_asset_id(r)
+            if ref_id not in saved:
+                path = os.path.join(ASSETS_DIR, str(year), "refs", f"{ref_id}.png")
+                url = f"/assets/questions/{year}/refs/{ref_id}.png"
+                key = None
+                if manifest is not None and pdf_hash:
+                    key = inputs_key("ref", pdf_hash, dpi, int(r.get("page") or 0), r.get("bbox_px"), padding_px, 12)
+                    if manifest.fresh("refs", ref_id, key, path):
+                        saved[ref_id] = url
+                        refs_out.append({"id": ref_id, "image": url})
+                        continue
+                img = _crop_reference_image(page_image_paths, r, padding_px=padding_px, cropper=cropper)
+                if img is None:
+                    print(f"[WARN] Falha no recorte da referencia {ref_id} (Q{question.get('number')}).", flush=True)
+                    saved[ref_id] = None
+                elif key is not None:
+                    manifest.save_png("refs", ref_id, key, img, path)
+                    saved[ref_id] = url
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    img.save(path, "PNG")
+                    saved[ref_id] = url
+            if saved[ref_id]:
+                refs_out.append({"id": ref_id, "image": saved[ref_id]})
+        if refs_out:
+            question["references"] = refs_out
+        else:
+            question.pop("references", None)
+    n_ok = sum(1 for u in saved.values() if u)
+    print(f"[CLIP] {n_ok} textos de referencia ({len(saved) - n_ok} falhas).", flush=True)
     return questions
 
 
@@ -869,34 +1250,32 @@ def run_vision_pipeline(pdf_path, year, page_images):
                 opt["text"] = _sanitize_option_text(opt.get("text", ""))
             all_questions.append(q)
     print(f"\n[CLIP] Recortando assets baseados na IA...")
-    questions_with_assets = crop_assets(all_questions, year, page_images, bbox_index=None)
+    cropper = PdfCropper(pdf_path, dpi=200)
+    try:
+        questions_with_assets = crop_assets(all_questions, year, bbox_index=None, cropper=cropper)
+    finally:
+        cropper.close()
     return questions_with_assets
 
 
-def extract_gabarito(gabarito_pdf_path):
+def extract_gabarito(year: int):
+    """Gabarito {número: letra} da versão da prova, via store compartilhado (gabarito.py).
+
+    Retorna (respostas, info) — info traz estratégia, versão, anuladas e tempo.
+    """
     print(f"\n[GAB] Lendo gabarito...", flush=True)
-    gabarito = {}
-    doc = fitz.open(gabarito_pdf_path)
-    text = "\n".join([page.get_text("text") for page in doc])
-    doc.close()
-    patterns = [
-        r'(\d{1,2})\s*[-–—]\s*([ABCDE])',
-        r'(\d{1,2})\s*[\)\.]\s*([ABCDE])',
-        r'(\d{1,2})\s+([ABCDE])',
-    ]
-    matches = []
-    for pat in patterns:
-        matches.extend(re.findall(pat, text))
-    for num_str, letter in matches:
-        n = int(num_str)
-        if 1 <= n <= 90:
-            gabarito[n] = letter
-    if len(gabarito) < 90 and genai is not None:
-        gabarito = extract_gabarito_via_gemini(gabarito_pdf_path)
-    if len(gabarito) < 90:
-        missing = [i for i in range(1, 91) if i not in gabarito]
-        raise RuntimeError(f"Gabarito incompleto ({len(gabarito)}/90). Faltando: {missing[:20]}...")
-    return gabarito
+    gabarito, info = load_answer_key(
+        year,
+        vision_fallback=extract_gabarito_via_gemini if genai is not None else None,
+    )
+    print(format_report(year, info) + (" (store)" if info["cached"] else ""), flush=True)
+    warning = version_warning(year, info)
+    if warning:
+        print(warning, flush=True)
+    if info["found"] < TOTAL_QUESTIONS:
+        missing = [i for i in range(1, TOTAL_QUESTIONS + 1) if i not in gabarito and i not in info["annulled"]]
+        raise RuntimeError(f"Gabarito incompleto ({info['found']}/{TOTAL_QUESTIONS}). Faltando: {missing[:20]}...")
+    return gabarito, info
 
 
 def extract_gabarito_via_gemini(gabarito_pdf_path: str):
@@ -942,40 +1321,99 @@ Regras:
     return answers
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--year", type=int, required=True)
-    parser.add_argument("--recrop-only", action="store_true", help="Regera apenas imagens/recortes usando bboxes do PDF e JSON existente (sem IA).")
-    args = parser.parse_args()
+def _merge_ocr_text(stem, options, ocr_doc, page_num, rect_pt, ocr_txt):
+    """Combina o texto do PDF com o do OCR de uma questão.
+
+    Layout (linhas/recuo das alternativas, mesmo parser do texto do PDF) primeiro,
+    regex sobre o texto corrido como fallback; só troca se o OCR for melhor.
+    """
+    l_stem, l_opts = extract_question_text_from_pdf(ocr_doc, page_num, rect_pt)
+    o_stem = extract_stem_from_ocr(ocr_txt)
+    o_opts = parse_alternatives_from_ocr(ocr_txt)
+
+    # Atualiza stem se vier melhor do OCR
+    for cand in (l_stem, o_stem):
+        if cand and len(cand) >= 20 and not _is_garbled_text(cand):
+            stem = _normalize_spaces(cand)
+            break
 
-    pdf_path = os.path.join(PROVAS_DIR, f"p{str(args.year)[-2:]}.pdf")
+    # Atualiza alternativas se o OCR encontrar algo textual (>= 3 opções)
+    old_ph = sum(1 for o in (options or []) if _is_placeholder_text(o.get("text", "")))
+    candidates = []
+    if l_opts:
+        candidates.append(l_opts)
+    if o_opts:
+        candidates.append([{"key": k, "text": _sanitize_option_text(o_opts.get(k, ""))} for k in ["A","B","C","D","E"]])
+    for new_options in candidates:
+        new_ph = sum(1 for o in new_options if _is_placeholder_text(o.get("text", "")))
+        if new_ph < old_ph:
+            options, old_ph = new_options, new_ph
+    return stem, options
 
-    if args.recrop_only:
-        recrop_only(pdf_path, args.year, dpi=200)
-        return
+
+def _text_inputs_key(pdf_hash: str, info: dict, use_ocr: bool) -> str:
+    return inputs_key("text", pdf_hash, info["page"], info["rect"], use_ocr, OCR_PREPROCESS)
+
+
+def _question_refs(qnum, stem, refs_by_qnum, refs_by_label):
+    """Textos de referência da questão: os do layout + o "TEXTO <romano>" citado no enunciado."""
+    refs = list(refs_by_qnum.get(qnum, []) or [])
+    m = re.search(r"\bTEXTO\s+([IVX]{1,5})\b", (stem or "").upper())
+    if m and m.group(1) in refs_by_label:
+        refs.append(refs_by_label[m.group(1)])
+    return refs
+
+
+def ingest_year(year: int, refresh_layout: bool = False, page_workers: int = 1, full: bool = False) -> dict:
+    """Pipeline completo de um ano (render, layout, texto/OCR, recortes, gabarito, JSON).
+
+    Incremental via cache/<ano>/build_manifest.json: páginas, textos e recortes cujas
+    entradas não mudaram são reaproveitados (PNGs intactos mantêm o mtime).
+    `full=True` ignora o manifesto e refaz tudo.
+
+    Retorna um resumo com contagens para o relatório consolidado do modo multi-ano.
+    """
+    pdf_path = os.path.join(PROVAS_DIR, f"p{str(year)[-2:]}.pdf")
+    pdf_hash = _sha256_file(pdf_path)
+    manifest = BuildManifest(year)
+    if full:
+        manifest.entries = {}
 
     # Para padronização e evitar offsets: NUNCA pular capa aqui.
     # (as páginas completas são usadas pelo botão "Ver Página" e pelo recorte)
-    page_images = render_pdf_to_images(pdf_path, args.year, skip_first_page=False)
-    if not page_images: sys.exit(1)
+    page_images = render_pdf_to_images(pdf_path, year, skip_first_page=False, workers=page_workers,
+                                       manifest=manifest, pdf_hash=pdf_hash)
+    if not page_images:
+        raise RuntimeError(f"Nenhuma página renderizada para {year}.")
 
     print("\n[*] Gerando índice determinístico (page/rect/bbox) via PyMuPDF...", flush=True)
-    rect_index = build_question_rect_index(pdf_path, dpi=200)
-    doc = fitz.open(pdf_path)
+    # Uma única análise por página (words/blocks/markers) compartilhada por todas as etapas.
+    doc = PdfDocumentAnalysis.open(pdf_path)
+    layout = load_layout_index(pdf_path, dpi=200, doc=doc, refresh=refresh_layout)
+    rect_index = layout["rect_index"]
+    # Recortes renderizados direto do PDF (não depende de decodificar out/<ano>/pages/*.png)
+    cropper = PdfCropper(doc, dpi=200)
     # Correção incremental de recortes curtos (foco no 2021)
-    rect_index = expand_suspicious_bboxes(doc, rect_index, dpi=200, year=args.year)
-    try:
-        refs_by_qnum, refs_by_label = _extract_reference_blocks(doc, dpi=200)
-    except Exception as e:
-        print(f"[WARN] Falha ao extrair blocos de referência: {e}", flush=True)
-        refs_by_qnum, refs_by_label = {}, {}
+    rect_index = expand_suspicious_bboxes(doc, rect_index, dpi=200, year=year)
+    refs_by_qnum, refs_by_label = layout["refs_by_qnum"], layout["refs_by_label"]
 
     all_questions = []
     garbled_count = 0
     ocr_used = 0
+    use_ocr = bool(OCR_READY and OcrService and parse_alternatives_from_ocr and extract_stem_from_ocr)
 
+    # 1ª passada: texto do PDF e quais questões precisam de OCR
+    # (texto de questão com página/rect inalterados vem do manifesto)
+    extracted = []
+    reused_text = {}
     for qnum in sorted(rect_index.keys()):
         info = rect_index[qnum]
+        text_key = _text_inputs_key(pdf_hash, info, use_ocr)
+        if manifest.fresh("text", qnum, text_key):
+            entry = manifest.get("text", qnum)
+            reused_text[qnum] = entry
+            extracted.append((qnum, info, entry["stem"], entry["options"], False, bool(entry.get("garbled"))))
+            continue
         stem, options = extract_question_text_from_pdf(doc, info["page"], info["rect"])
 
         if stem is None or options is None:
@@ -985,60 +1423,90 @@ def main():
         # OCR local: fallback quando PDF vier com encoding ruim OU quando as alternativas do PDF
         # não forem detectadas (ex.: 2021 com muitos placeholders em options).
         options_placeholder_count = sum(1 for o in (options or []) if _is_placeholder_text(o.get("text", "")))
-        need_ocr = _is_garbled_text(stem) or (OCR_READY and args.year == 2021 and options_placeholder_count >= 3)
-
-        if need_ocr:
-            if _is_garbled_text(stem):
-                garbled_count += 1
-            if OCR_READY and ocr_image and parse_alternatives_from_ocr and extract_stem_from_ocr:
+        need_ocr = _is_garbled_text(stem) or (OCR_READY and year == 2021 and options_placeholder_count >= 3)
+        extracted.append((qnum, info, stem, options, need_ocr, bool(need_ocr and _is_garbled_text(stem))))
+
+    # OCR: idioma resolvido uma vez, cache em cache/ocr/, Tesseract em paralelo, saída em
+    # palavras com caixa (como page.get_text("words")).
+    # Página com 2+ questões a reconhecer -> OCR da página inteira uma vez e as palavras são
+    # distribuídas pelas rects do rect_index; questão sozinha na página -> OCR só do recorte.
+    ocr_results = {}
+    ocr_qnums = [e[0] for e in extracted if e[4]]
+    if use_ocr and ocr_qnums:
+        per_page = {}
+        for qnum in ocr_qnums:
+            per_page.setdefault(rect_index[qnum]["page"], []).append(qnum)
+        t_ocr = time.time()
+        with OcrService(lang="por", workers=page_workers, mode="words", preprocess=OCR_PREPROCESS) as ocr_service:
+            for page_num, qnums in sorted(per_page.items()):
                 try:
-                    page_idx = int(info["page"]) - 1
-                    if 0 <= page_idx < len(page_images):
-                        with Image.open(page_images[page_idx]) as img:
-                            bbox = info["bbox"]
-                            pad = 15
-                            x = max(0, bbox['x'] - pad)
-                            y = max(0, bbox['y'] - pad)
-                            w = min(img.width - x, bbox['w'] + (pad * 2))
-                            h = min(img.height - y, bbox['h'] + (pad * 2))
-                            cropped = img.crop((x, y, x + w, y + h))
-                            cropped = _auto_trim_whitespace(cropped, pad=12)
-                            ocr_txt = ocr_image(cropped, lang="por")
-                            if ocr_txt:
-                                o_stem = extract_stem_from_ocr(ocr_txt)
-                                o_opts = parse_alternatives_from_ocr(ocr_txt)
-
-                                # Atualiza stem se vier melhor do OCR
-                                if o_stem and len(o_stem) >= 20 and not _is_garbled_text(o_stem):
-                                    stem = _normalize_spaces(o_stem)
-
-                                # Atualiza alternativas se o OCR encontrar algo textual (>= 3 opções)
-                                if o_opts:
-                                    new_options = [{"key": k, "text": _sanitize_option_text(o_opts.get(k, ""))} for k in ["A","B","C","D","E"]]
-                                    new_ph = sum(1 for o in new_options if _is_placeholder_text(o.get("text", "")))
-                                    old_ph = sum(1 for o in (options or []) if _is_placeholder_text(o.get("text", "")))
-                                    if new_ph < old_ph:
-                                        options = new_options
-                                ocr_used += 1
+                    if len(qnums) >= 2:
+                        ocr_service.submit(("page", page_num), cropper.page_image(page_num))
+                        continue
+                    info = rect_index[qnums[0]]
+                    cropped = cropper.crop(info["page"], info["bbox"], padding=15)
+                    if cropped is not None:
+                        cropped = _auto_trim_whitespace(cropped, pad=12)
+                        ocr_service.submit(("q", qnums[0]), cropped)
                 except Exception as e:
-                    print(f"[OCR] Falha OCR local Q{qnum}: {e}", flush=True)
-
-            # Se ainda estiver ruim, usa placeholder
-            if _is_garbled_text(stem):
-                stem = "(Veja a imagem da questão)"
-                options = [{"key": k, "text": "(Veja a imagem da questão)"} for k in ["A", "B", "C", "D", "E"]]
-
-        for opt in options:
-            if not (opt.get("text") or "").strip():
-                opt["text"] = "(Veja a imagem da questão)"
-
-        refs = []
-        refs.extend(refs_by_qnum.get(qnum, []) or [])
-        m = re.search(r"\bTEXTO\s+([IVX]{1,5})\b", (stem or "").upper())
-        if m:
-            label = m.group(1)
-            if label in refs_by_label:
-                refs.append(refs_by_label[label])
+                    print(f"[OCR] Falha OCR local p{page_num} {qnums}: {e}", flush=True)
+            ocr_results = ocr_service.results()
+        n_pages = sum(1 for k in ocr_results if k[0] == "page")
+        print(f"[OCR] {len(ocr_qnums)} questoes | {n_pages} paginas inteiras + {len(ocr_results) - n_pages} recortes | "
+              f"cache {ocr_service.cache_hits} | Tesseract {ocr_service.ocr_calls} | {time.time() - t_ocr:.1f}s", flush=True)
+
+    ocr_pages = {}  # page_num -> OcrWordsDocument com as palavras da página em pontos
+
+    def _ocr_view(qnum, info):
+        """(documento, page_num, rect) para rodar extract_question_text_from_pdf sobre o OCR."""
+        page_num = info["page"]
+        if ("page", page_num) in ocr_results:
+            if page_num not in ocr_pages:
+                words = scale_words(ocr_results[("page", page_num)], 72.0 / 200)
+                ocr_pages[page_num] = OcrWordsDocument({page_num - 1: OcrWordsPage(words, doc.load_page(page_num - 1).rect)})
+            return ocr_pages[page_num], page_num, info["rect"]
+        words = ocr_results.get(("q", qnum))
+        if not words:
+            return None
+        # o recorte é renderizado a 200 dpi: pixels -> pontos, origem no próprio recorte
+        ocr_page = OcrWordsPage(scale_words(words, 72.0 / 200))
+        return OcrWordsDocument({0: ocr_page}), 1, ocr_page.rect
+
+    # 2ª passada: aplica OCR, placeholders e referências
+    for qnum, info, stem, options, need_ocr, garbled in extracted:
+        garbled_count += int(garbled)
+        if qnum in reused_text:
+            ocr_used += int(reused_text[qnum].get("ocr", False))
+        else:
+            q_ocr = False
+            if need_ocr:
+                view = _ocr_view(qnum, info) if ocr_results else None
+                if view:
+                    try:
+                        ocr_doc, ocr_page_num, ocr_rect = view
+                        ocr_txt = ocr_doc.load_page(ocr_page_num - 1).get_text("text", clip=fitz.Rect(*ocr_rect))
+                        if ocr_txt:
+                            stem, options = _merge_ocr_text(stem, options, ocr_doc, ocr_page_num, ocr_rect, ocr_txt)
+                            q_ocr = True
+                    except Exception as e:
+                        print(f"[OCR] Falha OCR local Q{qnum}: {e}", flush=True)
+
+                # Se ainda estiver ruim, usa placeholder
+                if _is_garbled_text(stem):
+                    stem = "(Veja a imagem da questão)"
+                    options = [{"key": k, "text": "(Veja a imagem da questão)"} for k in ["A", "B", "C", "D", "E"]]
+
+            for opt in options:
+                if not (opt.get("text") or "").strip():
+                    opt["text"] = "(Veja a imagem da questão)"
+            ocr_used += int(q_ocr)
+            text_hash = hashlib.sha256(json.dumps([stem, options], ensure_ascii=False).encode("utf-8")).hexdigest()
+            manifest.record("text", qnum, _text_inputs_key(pdf_hash, info, use_ocr), text_hash,
+                            stem=stem, options=options, ocr=q_ocr, garbled=garbled)
+        # cópia: o texto do manifesto não pode ser alterado pelos passos seguintes
+        options = [dict(o) for o in options]
+
+        refs = _question_refs(qnum, stem, refs_by_qnum, refs_by_label)
         if refs:
             stem = _apply_refs_to_stem(stem, refs)
 
@@ -1051,15 +1519,22 @@ def main():
             "_references": refs,
         })
 
-    doc.close()
     print(f"\n[CHECK] Garbled stems: {garbled_count}/90 | OCR used: {ocr_used}/90", flush=True)
-    questions_with_assets = crop_assets(all_questions, args.year, page_images, bbox_index=rect_index)
-    questions_with_assets = apply_reference_assets(questions_with_assets, args.year, page_images)
+    # recortes das questões e, à parte, um asset por texto de referência (pulando os inalterados)
+    questions_with_assets = crop_assets(all_questions, year, bbox_index=rect_index, cropper=cropper,
+                                        manifest=manifest, pdf_hash=pdf_hash)
+    questions_with_assets = reference_assets(questions_with_assets, year, cropper=cropper,
+                                             manifest=manifest, pdf_hash=pdf_hash)
+    doc.close()
+    manifest.save()
+    print(f"[BUILD] {manifest.summary()}", flush=True)
 
-    gabarito_path = os.path.join(PROVAS_DIR, f"g{str(args.year)[-2:]}.pdf")
-    gabarito = extract_gabarito(gabarito_path) if os.path.exists(gabarito_path) else {}
+    gabarito_path = os.path.join(PROVAS_DIR, f"g{str(year)[-2:]}.pdf")
+    gabarito, gab_info = extract_gabarito(year) if os.path.exists(gabarito_path) else ({}, {})
     prev_by_id = {}
-    prev_path = os.path.join(DATA_DIR, f"fuvest-{args.year}.json")
+    prev_assets = None
+    prev = None
+    prev_path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
     if os.path.exists(prev_path):
         try:
             with open(prev_path, "r", encoding="utf-8") as f:
@@ -1068,6 +1543,7 @@ def main():
                 pid = pq.get("id")
                 if pid:
                     prev_by_id[pid] = pq
+            prev_assets = prev.get("assets")
         except Exception:
             prev_by_id = {}
     final_questions = []
@@ -1075,11 +1551,15 @@ def main():
         num = q.get('number')
         if not num: continue
         correct = gabarito.get(num)
+        if correct is None and num in gab_info.get("annulled", []):
+            # questão anulada: o schema exige uma letra; mantém a do dataset anterior
+            correct = ((prev_by_id.get(f"fuvest-{year}-q{num:02d}") or {}).get("answer") or {}).get("correct")
+            print(f"[WARN] Questao {num} anulada no gabarito; mantendo resposta anterior ({correct}).")
         if correct not in ["A", "B", "C", "D", "E"]:
-            raise RuntimeError(f"Sem gabarito para questão {num} ({args.year}).")
+            raise RuntimeError(f"Sem gabarito para questão {num} ({year}).")
         q['answer'] = {"correct": correct}
-        q['id'] = f"fuvest-{args.year}-q{num:02d}"
-        q['year'] = args.year
+        q['id'] = f"fuvest-{year}-q{num:02d}"
+        q['year'] = year
         q['explanation'] = {
             "theory": "Pendente",
             "steps": [],
@@ -1097,9 +1577,9 @@ def main():
             q.pop("_references", None)
         q['assets'] = {"questionImage": q.pop('asset_path', None)}
         final_questions.append(q)
-    output_json_path = os.path.join(DATA_DIR, f"fuvest-{args.year}.json")
+    output_json_path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
     final_data = {
-        "year": args.year,
+        "year": year,
         "source": {
             "provaPdf": os.path.basename(pdf_path),
             "gabaritoPdf": os.path.basename(gabarito_path)
@@ -1107,9 +1587,297 @@ def main():
         "generatedAt": datetime.now().isoformat(),
         "questions": final_questions
     }
-    with open(output_json_path, 'w', encoding='utf-8') as f:
-        json.dump(final_data, f, ensure_ascii=False, indent=2)
-    print(f"\n[DONE] Processo concluido para {args.year}!")
+    if prev_assets:
+        # variantes das páginas (encode_assets.py) não dependem do ingest
+        final_data["assets"] = prev_assets
+    # textos de referência saem do stem e ficam uma vez só em final_data["passages"]
+    factor_passages({year: final_data})
+    variants = encode_question_assets(final_questions, workers=page_workers)
+    print(f"[OK] Variantes PNG/WebP/AVIF de {variants['images']} recortes.")
+    # nada mudou além do carimbo: mantém o generatedAt anterior e não regrava JSON/índice
+    if prev and _without_timestamp(prev) == _without_timestamp(final_data):
+        final_data["generatedAt"] = prev.get("generatedAt")
+    if not write_if_changed(output_json_path, json.dumps(final_data, ensure_ascii=False, indent=2).encode("utf-8")):
+        print(f"[OK] {os.path.basename(output_json_path)} sem alteracoes.")
+    shards = write_year_shards(year, final_data)
+    print(f"[OK] Indice + shards do frontend: {shards['written']} arquivos atualizados.")
+    print(f"\n[DONE] Processo concluido para {year}!")
+    return {
+        "year": year,
+        "questions": len(final_questions),
+        "garbled": garbled_count,
+        "ocr_used": ocr_used,
+        "gabarito": gab_info.get("strategy"),
+        "gabarito_ms": round(gab_info.get("seconds", 0.0) * 1000),
+        "output": output_json_path,
+    }
+
+
+def _without_timestamp(data: dict) -> dict:
+    return {k: v for k, v in data.items() if k != "generatedAt"}
+
+
+def _recrop_page_job(pdf_path: str, dpi: int, items):
+    """Worker do recrop: recorta as questões de uma página.
+
+    items: [(q_num, page, bbox, padding, asset_path)]. Grava o PNG só se mudou e
+    devolve [(q_num, sha256 do PNG, gravou?, erro)].
+    """
+    out = []
+    cropper = PdfCropper(pdf_path, dpi=dpi)
+    try:
+        for q_num, page, bbox, padding, asset_path in items:
+            try:
+                img = _question_crop_image(page, bbox, padding, cropper=cropper)
+                data = png_bytes(img)
+                out.append((q_num, sha256_bytes(data), write_if_changed(asset_path, data), None))
+            except Exception as e:
+                out.append((q_num, None, False, str(e)))
+    finally:
+        cropper.close()
+    return out
+
+
+def recrop_only(pdf_path: str, year: int, dpi: int = 200, padding: int = 15, workers: int = 1,
+                full: bool = False, variants: bool = True) -> dict:
+    """Caminho rápido: refaz só os recortes a partir do public/data/questions/fuvest-<ano>.json.
+
+    Usa o cache de layout (bboxes/refs), renderiza direto do PDF apenas as páginas com
+    recortes desatualizados (sem out/<ano>/pages), recorta uma página por job em paralelo
+    e atualiza as variantes e os recortes dos textos de referência. Enunciados, alternativas,
+    explicações e gabarito não são tocados — do JSON do ano só mudam as variantes dos recortes
+    alterados e `references`. Mudou o padding? Todos os recortes mudam de
+    chave no manifesto e são refeitos; `full=True` refaz tudo mesmo sem mudança.
+
+    `variants=False` pula o encode (AVIF custa segundos por recorte): bom para testar
+    paddings; as variantes antigas ficam mais velhas que o PNG e o
+    `encode_assets.py --year <ano> --no-pages` refaz só elas depois.
+    """
+    t0 = time.perf_counter()
+    data_path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
+    if not os.path.exists(pdf_path):
+        print(f"[ERRO] {year}: {os.path.basename(pdf_path)} nao encontrado.", flush=True)
+        return {"year": year, "ok": False}
+    if not os.path.exists(data_path):
+        print(f"[ERRO] {year}: {data_path} nao existe; rode o ingest completo primeiro.", flush=True)
+        return {"year": year, "ok": False}
+    with open(data_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    questions = data.get("questions") or []
+
+    print(f"\n[CLIP] Recrop {year} (padding {padding}px)...", flush=True)
+    pdf_hash = _sha256_file(pdf_path)
+    manifest = BuildManifest(year)
+    if full:
+        manifest.entries.pop("crops", None)
+    doc = PdfDocumentAnalysis.open(pdf_path)
+    try:
+        layout = load_layout_index(pdf_path, dpi=dpi, doc=doc)
+        # mesmas bboxes do ingest (senão as chaves do manifesto não batem)
+        rect_index = expand_suspicious_bboxes(doc, layout["rect_index"], dpi=dpi, year=year)
+    finally:
+        doc.close()
+
+    by_page = {}
+    keys = {}
+    for q in questions:
+        q_num = q.get("number")
+        info = rect_index.get(q_num)
+        if not info:
+            print(f"[WARN] Q{q_num}: fora do índice de layout; recorte mantido.", flush=True)
+            continue
+        # refs pelo enunciado original (o do JSON vem sem os textos de referência)
+        text_entry = manifest.get("text", q_num) or {}
+        q["_references"] = _question_refs(q_num, text_entry.get("stem") or q.get("stem"),
+                                          layout["refs_by_qnum"], layout["refs_by_label"])
+        asset_path = os.path.join(ASSETS_DIR, str(year), f"q{q_num:02d}", "image.png")
+        keys[q_num] = _crop_inputs_key(pdf_hash, dpi, info["page"], info["bbox"], padding)
+        if manifest.fresh("crops", q_num, keys[q_num], asset_path):
+            continue
+        by_page.setdefault(info["page"], []).append((q_num, info["page"], info["bbox"], padding, asset_path))
+
+    results = []
+    workers = max(1, min(int(workers or 1), len(by_page)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futures = [ex.submit(_recrop_page_job, pdf_path, dpi, items) for _, items in sorted(by_page.items())]
+            for fut in as_completed(futures):
+                results.extend(fut.result())
+    else:
+        for _, items in sorted(by_page.items()):
+            results.extend(_recrop_page_job(pdf_path, dpi, items))
+
+    errors = 0
+    changed = set()
+    for q_num, digest, written, error in results:
+        if error:
+            errors += 1
+            print(f"[ERRO] Falha no recorte da Q{q_num}: {error}", flush=True)
+            continue
+        asset_path = os.path.join(ASSETS_DIR, str(year), f"q{q_num:02d}", "image.png")
+        manifest.record("crops", q_num, keys[q_num], digest, asset_path, written=written)
+        if written:
+            changed.add(q_num)
+
+    # textos de referência: um recorte por texto (os inalterados são pulados pelo manifesto)
+    prev_refs = {q.get("number"): q.get("references") for q in questions}
+    cropper = PdfCropper(pdf_path, dpi=dpi)
+    try:
+        reference_assets([q for q in questions if "_references" in q], year, cropper=cropper,
+                         manifest=manifest, pdf_hash=pdf_hash)
+    finally:
+        cropper.close()
+    refs_changed = False
+    for q in questions:
+        q.pop("_references", None)
+        refs_changed |= q.get("references") != prev_refs.get(q.get("number"))
+    manifest.save()
+
+    # variantes só dos recortes que mudaram; o JSON/shards só são regravados se algo mudou
+    if variants:
+        encoded = encode_question_assets([q for q in questions if q.get("number") in changed], workers=workers)["images"]
+    else:
+        encoded = 0
+        if changed:
+            print(f"[WARN] {year}: variantes de {len(changed)} recortes desatualizadas "
+                  f"(rode encode_assets.py --year {year} --no-pages).", flush=True)
+    if changed or refs_changed:
+        # tmp + os.replace: interrompido no meio não deixa o dataset truncado
+        write_json_if_changed(data_path, data, ensure_ascii=False, indent=2)
+        write_year_shards(year, data)
+    elapsed = time.perf_counter() - t0
+    print(f"[OK] {year}: {len(results) - errors} recortes refeitos em {len(by_page)} paginas "
+          f"({len(changed)} alterados, {encoded} com variantes novas) | "
+          f"{manifest.summary()} | {elapsed:.1f}s", flush=True)
+    return {"year": year, "ok": not errors, "pages": len(by_page), "recropped": len(results) - errors,
+            "changed": len(changed), "errors": errors, "seconds": round(elapsed, 1)}
+
+
+def _ingest_year_logged(year: int, refresh_layout: bool, page_workers: int, full: bool = False) -> dict:
+    """Worker do modo multi-ano: roda ingest_year com stdout/stderr em out/<ano>/ingest.log."""
+    log_dir = os.path.join(OUTPUT_DIR, str(year))
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, "ingest.log")
+    t0 = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8", buffering=1) as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            summary = ingest_year(year, refresh_layout=refresh_layout, page_workers=page_workers, full=full)
+            summary["ok"] = True
+        except Exception as e:
+            traceback.print_exc()
+            summary = {"year": year, "ok": False, "error": str(e)}
+    summary["seconds"] = round(time.perf_counter() - t0, 1)
+    summary["log"] = log_path
+    return summary
+
+
+def _print_summary(summaries: list[dict], elapsed: float):
+    print(f"\n{'=' * 60}")
+    print("RESUMO DO INGEST")
+    print(f"{'=' * 60}")
+    for s in sorted(summaries, key=lambda s: s["year"]):
+        if s.get("ok"):
+            print(f"[OK] {s['year']}: {s['questions']}/90 questoes | garbled {s['garbled']} | "
+                  f"OCR {s['ocr_used']} | gabarito {s.get('gabarito') or '-'} ({s.get('gabarito_ms', 0)} ms) | "
+                  f"{s['seconds']}s")
+        else:
+            print(f"[FALHOU] {s['year']}: {s.get('error')} ({s.get('seconds', 0)}s)")
+        if s.get("log"):
+            print(f"         log: {s['log']}")
+    ok = sum(1 for s in summaries if s.get("ok"))
+    print(f"\n[*] {ok}/{len(summaries)} anos concluidos em {elapsed:.1f}s")
+
+
+def _update_search_index():
+    """Reindexa a busca estática (todos os anos) depois que algum fuvest-YYYY.json mudou."""
+    try:
+        r = build_search_index()
+        print(f"[OK] Indice de busca: {r['docs']} questoes | {r['terms']} termos | {r['shards']} shards "
+              f"({r['written']} gravados)", flush=True)
+    except Exception as e:
+        print(f"[WARN] Falha ao atualizar o indice de busca: {e}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--year", type=int)
+    target.add_argument("--years", type=str, help="Vários anos em paralelo, ex.: 2015-2026 ou 2019,2021")
+    target.add_argument("--all", action="store_true", help="Todos os anos com provas/pYY.pdf")
+    parser.add_argument("--workers", type=int, default=0, help="Processos em paralelo (0 = nº de CPUs)")
+    parser.add_argument("--recrop-only", action="store_true", help="Regera apenas imagens/recortes usando bboxes do PDF e JSON existente (sem IA).")
+    parser.add_argument("--padding", type=int, default=15, help="Margem (px) em volta da bbox no --recrop-only (padrão 15).")
+    parser.add_argument("--no-variants", action="store_true",
+                        help="No --recrop-only, não gera as variantes PNG/WebP/AVIF (depois: encode_assets.py --no-pages).")
+    parser.add_argument("--refresh-layout", action="store_true", help="Ignora o cache de layout (cache/layout) e recalcula markers/bboxes.")
+    parser.add_argument("--full", action="store_true", help="Ignora o manifesto de build (cache/<ano>/build_manifest.json) e refaz páginas, textos e recortes.")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers if args.workers > 0 else cpus
+
+    if args.year:
+        pdf_path = os.path.join(PROVAS_DIR, f"p{str(args.year)[-2:]}.pdf")
+        if not os.path.exists(pdf_path):
+            print(f"[ERRO] {args.year}: {os.path.basename(pdf_path)} nao encontrado.", flush=True)
+            sys.exit(1)
+        if args.recrop_only:
+            res = recrop_only(pdf_path, args.year, dpi=200, padding=args.padding, workers=workers, full=args.full,
+                              variants=not args.no_variants)
+            if not res.get("ok"):
+                sys.exit(1)
+            return
+        try:
+            ingest_year(args.year, refresh_layout=args.refresh_layout, page_workers=workers, full=args.full)
+        except RuntimeError as e:
+            print(f"[ERRO] {e}", flush=True)
+            sys.exit(1)
+        _update_search_index()
+        return
+
+    years = pdf_years("p") if args.all else parse_years(args.years)
+    missing = [y for y in years if not os.path.exists(os.path.join(PROVAS_DIR, f"p{str(y)[-2:]}.pdf"))]
+    for y in missing:
+        print(f"[WARN] {y}: provas/p{str(y)[-2:]}.pdf nao encontrado. Pulando.")
+    years = [y for y in years if y not in missing]
+    if not years:
+        print("[ERRO] Nenhum ano para processar.")
+        sys.exit(1)
+
+    if args.recrop_only:
+        # o paralelismo fica dentro de cada ano (uma página por job)
+        results = [recrop_only(os.path.join(PROVAS_DIR, f"p{str(y)[-2:]}.pdf"), y, dpi=200,
+                               padding=args.padding, workers=workers, full=args.full,
+                               variants=not args.no_variants) for y in years]
+        failed = [r["year"] for r in results if not r.get("ok")]
+        if failed:
+            print(f"[ERRO] Recrop com falhas: {', '.join(map(str, failed))}")
+            sys.exit(1)
+        return
+
+    # Anos em paralelo; as CPUs que sobrarem vão para o render de páginas dentro de cada ano.
+    year_workers = max(1, min(workers, len(years)))
+    page_workers = max(1, workers // year_workers)
+    print(f"[*] Ingest de {len(years)} anos ({years[0]}..{years[-1]}) com {year_workers} processos "
+          f"(render/OCR: {page_workers} por ano)...", flush=True)
+    t0 = time.perf_counter()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=year_workers) as ex:
+        futures = {ex.submit(_ingest_year_logged, y, args.refresh_layout, page_workers, args.full): y for y in years}
+        for fut in as_completed(futures):
+            y = futures[fut]
+            try:
+                s = fut.result()
+            except Exception as e:
+                s = {"year": y, "ok": False, "error": str(e)}
+            status = "OK" if s.get("ok") else "FALHOU"
+            print(f"[{status}] {y} ({s.get('seconds', 0)}s)", flush=True)
+            summaries.append(s)
+    _print_summary(summaries, time.perf_counter() - t0)
+    _update_search_index()
+    if not all(s.get("ok") for s in summaries):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -6,10 +6,18 @@ Usa Tesseract (pytesseract).
 Objetivo:
 - suportar alternativas A-E e a-e (muito comum nas provas)
 - preferir OCR em português, mas permitir "por+eng" quando disponível
+- pré-processamento opcional (cinza, binarização, deskew, DPI, bordas) — ver
+  PREPROCESS_PRESETS e bench_ocr.py para o custo/benefício de cada preset
 """
 import os
 import re
-from PIL import Image
+import json
+import math
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageFilter
 
 # Tenta importar pytesseract; se falhar, define flag
 try:
@@ -56,6 +64,11 @@ def _try_set_tessdata_prefix(tesseract_cmd: str | None):
     except Exception:
         return
 
+# Cache de OCR: chave = hash dos pixels + idioma + config (mesmo recorte -> mesmo texto)
+OCR_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "ocr")
+OCR_CACHE_VERSION = 1
+
+
 def init_ocr():
     """Inicializa o OCR. Retorna True se disponível."""
     global OCR_AVAILABLE
@@ -70,6 +83,7 @@ def init_ocr():
     return False
 
 
+@lru_cache(maxsize=None)
 def best_ocr_lang(preferred: str = "por") -> str:
     """Retorna o melhor idioma disponível no Tesseract.
 
@@ -77,6 +91,8 @@ def best_ocr_lang(preferred: str = "por") -> str:
     1) por+eng (quando ambos estiverem instalados)
     2) por
     3) eng
+
+    Memoizado: `get_languages` abre um subprocesso, então resolvemos uma vez por processo.
     """
     if not OCR_AVAILABLE:
         return "eng"
@@ -94,13 +110,315 @@ def best_ocr_lang(preferred: str = "por") -> str:
         pass
     return "eng"
 
-def ocr_image(image_path_or_pil, lang="por"):
+def _as_rgb(image_path_or_pil) -> Image.Image:
+    if isinstance(image_path_or_pil, str):
+        img = Image.open(image_path_or_pil)
+    else:
+        img = image_path_or_pil
+    # Converte para RGB se necessário
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+# --- Pré-processamento ---
+# Cada etapa é opcional; os presets abaixo são os comparados pelo bench_ocr.py.
+#   grayscale      : converte para cinza (Tesseract binariza internamente de qualquer jeito)
+#   remove_border  : corta moldura/sombra escura encostada nas bordas e a margem branca
+#   target_dpi     : reamostra de `src_dpi` para `target_dpi` (Tesseract rende melhor ~300 dpi)
+#   deskew         : corrige inclinação (até ±max_skew graus) por perfil de projeção
+#   threshold      : None | "otsu" | "adaptive" (média local, bom para scans com fundo irregular)
+PREPROCESS_PRESETS = {
+    "none": {},
+    "gray": {"grayscale": True},
+    "binarize": {"grayscale": True, "remove_border": True, "threshold": "adaptive"},
+    "full": {"grayscale": True, "remove_border": True, "target_dpi": 300, "deskew": True, "threshold": "adaptive"},
+    "fast": {"grayscale": True, "remove_border": True, "target_dpi": 150, "threshold": "otsu"},
+}
+DEFAULT_SRC_DPI = 200
+
+
+def _preprocess_options(preprocess) -> dict:
+    if not preprocess:
+        return {}
+    if isinstance(preprocess, str):
+        if preprocess not in PREPROCESS_PRESETS:
+            raise ValueError(f"Preset de pré-processamento desconhecido: {preprocess}")
+        return dict(PREPROCESS_PRESETS[preprocess])
+    return dict(preprocess)
+
+
+def _otsu_level(gray: np.ndarray) -> int:
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256)
+    w0 = np.cumsum(hist)
+    w1 = total - w0
+    m0 = np.cumsum(hist * levels)
+    mt = m0[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mt * w0 / total - m0) ** 2 / (w0 * w1)
+    between = np.nan_to_num(between)
+    return int(np.argmax(between))
+
+
+def _estimate_skew(gray: Image.Image, max_skew: float = 3.0, step: float = 0.25) -> float:
+    """Ângulo (graus) que deixa as linhas de texto mais "horizontais" (maior variância das somas por linha)."""
+    small = gray.copy()
+    small.thumbnail((800, 800))
+    ink = np.asarray(small) < _otsu_level(np.asarray(small))
+    if ink.sum() < 50:
+        return 0.0
+    mask = Image.fromarray((ink * 255).astype(np.uint8))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_skew, max_skew + step / 2, step):
+        rows = np.asarray(mask.rotate(float(angle), resample=Image.NEAREST, expand=False)).sum(axis=1, dtype=np.float64)
+        score = float(np.var(rows))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess_image(img: Image.Image, preprocess=None, src_dpi: int = DEFAULT_SRC_DPI):
+    """Aplica o pré-processamento configurado.
+
+    Retorna (imagem, transform) onde `transform` leva coordenadas da imagem processada de
+    volta para a original: {"scale", "offset": (x, y), "angle", "center": (cx, cy)}.
+    """
+    opts = _preprocess_options(preprocess)
+    transform = {"scale": 1.0, "offset": (0.0, 0.0), "angle": 0.0, "center": (0.0, 0.0)}
+    if not opts:
+        return img, transform
+
+    out = img.convert("L") if opts.get("grayscale") or opts.get("threshold") or opts.get("deskew") else img
+
+    if opts.get("remove_border"):
+        gray = np.asarray(out.convert("L"))
+        dark = gray < 96
+        h, w = gray.shape
+        top, bottom, left, right = 0, h, 0, w
+        # moldura/sombra: linhas/colunas da borda quase todas escuras
+        while top < bottom - 1 and dark[top, left:right].mean() > 0.5:
+            top += 1
+        while bottom - 1 > top and dark[bottom - 1, left:right].mean() > 0.5:
+            bottom -= 1
+        while left < right - 1 and dark[top:bottom, left].mean() > 0.5:
+            left += 1
+        while right - 1 > left and dark[top:bottom, right - 1].mean() > 0.5:
+            right -= 1
+        # margem branca: recorta no conteúdo com folga
+        ink = gray[top:bottom, left:right] < 200
+        ys, xs = np.nonzero(ink)
+        if len(xs):
+            pad = 10
+            x0, x1 = max(0, xs.min() - pad), min(right - left, xs.max() + pad + 1)
+            y0, y1 = max(0, ys.min() - pad), min(bottom - top, ys.max() + pad + 1)
+            left, right, top, bottom = left + x0, left + x1, top + y0, top + y1
+        if (left, top, right, bottom) != (0, 0, w, h):
+            out = out.crop((left, top, right, bottom))
+            transform["offset"] = (float(left), float(top))
+
+    target_dpi = opts.get("target_dpi")
+    if target_dpi and src_dpi and target_dpi != src_dpi:
+        factor = float(target_dpi) / float(src_dpi)
+        new_size = (max(1, round(out.width * factor)), max(1, round(out.height * factor)))
+        out = out.resize(new_size, Image.LANCZOS if factor < 1 else Image.BICUBIC)
+        transform["scale"] = 1.0 / factor
+
+    if opts.get("deskew"):
+        angle = _estimate_skew(out, float(opts.get("max_skew", 3.0)))
+        if abs(angle) >= 0.1:
+            transform["angle"] = angle
+            transform["center"] = (out.width / 2.0, out.height / 2.0)
+            out = out.rotate(angle, resample=Image.BICUBIC, expand=False, fillcolor=255)
+
+    threshold = opts.get("threshold")
+    if threshold == "otsu":
+        level = _otsu_level(np.asarray(out))
+        out = out.point(lambda v: 255 if v > level else 0)
+    elif threshold == "adaptive":
+        # pixel vira tinta se for bem mais escuro que a média da vizinhança
+        block = int(opts.get("block", 31))
+        c = int(opts.get("c", 15))
+        arr = np.asarray(out, dtype=np.int16)
+        mean = np.asarray(out.filter(ImageFilter.BoxBlur(block // 2)), dtype=np.int16)
+        out = Image.fromarray(np.where(arr < mean - c, 0, 255).astype(np.uint8))
+
+    return out, transform
+
+
+def _unmap_words(words: list, transform: dict) -> list:
+    """Leva as caixas das palavras da imagem pré-processada para a imagem original."""
+    angle = transform.get("angle") or 0.0
+    scale = transform.get("scale") or 1.0
+    ox, oy = transform.get("offset") or (0.0, 0.0)
+    if not angle and scale == 1.0 and not ox and not oy:
+        return words
+    cx, cy = transform.get("center") or (0.0, 0.0)
+    # PIL.rotate(angle) gira no sentido anti-horário; desfazemos girando os centros de volta
+    rad = math.radians(angle)
+    cos_a, sin_a = math.cos(rad), math.sin(rad)
+    out = []
+    for w in words:
+        x0, y0, x1, y1 = w[0], w[1], w[2], w[3]
+        if angle:
+            mx, my = (x0 + x1) / 2.0 - cx, (y0 + y1) / 2.0 - cy
+            nx = cx + mx * cos_a - my * sin_a
+            ny = cy + mx * sin_a + my * cos_a
+            hw, hh = (x1 - x0) / 2.0, (y1 - y0) / 2.0
+            x0, x1, y0, y1 = nx - hw, nx + hw, ny - hh, ny + hh
+        out.append([x0 * scale + ox, y0 * scale + oy, x1 * scale + ox, y1 * scale + oy, *w[4:]])
+    return out
+
+
+def _cache_key(img: Image.Image, lang: str, config: str, mode: str = "text", preprocess=None) -> str:
+    h = hashlib.sha256()
+    pre = json.dumps(_preprocess_options(preprocess), sort_keys=True)
+    h.update(f"v{OCR_CACHE_VERSION}|{mode}|{lang}|{config}|{pre}|{img.mode}|{img.size}".encode("utf-8"))
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def _cache_get(key: str, field: str = "text"):
+    try:
+        with open(_cache_path(key), "r", encoding="utf-8") as f:
+            return json.load(f).get(field)
+    except Exception:
+        return None
+
+
+def _cache_put(key: str, value, field: str = "text"):
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({field: value}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _tesseract_text(img: Image.Image, lang: str, config: str = "", preprocess=None) -> str:
+    """Chamada crua ao Tesseract (roda no processo atual ou num worker do pool)."""
+    img, _ = preprocess_image(img, preprocess)
+    text = pytesseract.image_to_string(img, lang=lang, config=config)
+    return (text or "").strip()
+
+
+def _tesseract_words(img: Image.Image, lang: str, config: str = "", preprocess=None) -> list:
+    """Palavras com caixa (em pixels) e confiança: [x0, y0, x1, y1, texto, bloco, linha, palavra, conf].
+
+    Mesmo formato de `page.get_text("words")` do PyMuPDF + a confiança no fim.
+    A numeração de linha é por bloco (como no MuPDF), juntando par/linha do Tesseract.
+    """
+    img, transform = preprocess_image(img, preprocess)
+    data = pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    words = []
+    line_ids = {}
+    for i in range(len(data.get("text", []))):
+        text = (data["text"][i] or "").strip()
+        try:
+            conf = float(data["conf"][i])
+        except Exception:
+            conf = -1.0
+        if not text or conf < 0:
+            continue
+        block = int(data["block_num"][i])
+        line_key = (block, int(data["par_num"][i]), int(data["line_num"][i]))
+        if line_key not in line_ids:
+            line_ids[line_key] = sum(1 for k in line_ids if k[0] == block)
+        x0, y0 = int(data["left"][i]), int(data["top"][i])
+        words.append([x0, y0, x0 + int(data["width"][i]), y0 + int(data["height"][i]),
+                      text, block, line_ids[line_key], int(data["word_num"][i]), conf])
+    # coordenadas sempre na imagem recebida (mesmo com recorte/escala/deskew)
+    return _unmap_words(words, transform)
+
+
+def scale_words(words: list, scale: float = 1.0, offset=(0.0, 0.0)) -> list[tuple]:
+    """Converte palavras de pixels para outro sistema (ex.: pontos do PDF: scale=72/dpi, offset=origem do recorte)."""
+    ox, oy = offset
+    return [
+        (w[0] * scale + ox, w[1] * scale + oy, w[2] * scale + ox, w[3] * scale + oy, *w[4:])
+        for w in words or []
+    ]
+
+
+def words_to_text(words: list) -> str:
+    """Reconstrói o texto (linhas por \\n, blocos por linha em branco) a partir das palavras do OCR."""
+    out = []
+    last_block = last_line = None
+    for w in sorted(words or [], key=lambda w: (w[5], w[6], w[7])):
+        block, line = w[5], w[6]
+        if last_block is None:
+            out.append(w[4])
+        elif block != last_block:
+            out.append("\n\n" + w[4])
+        elif line != last_line:
+            out.append("\n" + w[4])
+        else:
+            out.append(" " + w[4])
+        last_block, last_line = block, line
+    return "".join(out).strip()
+
+
+class OcrWordsPage:
+    """Página "de mentira" com as palavras do OCR, compatível com o que o ingest usa do PyMuPDF.
+
+    `get_text("words", clip=rect)` devolve as palavras cujo centro cai no clip, no mesmo
+    formato do fitz — assim `extract_question_text_from_pdf` (linhas/recuo das alternativas)
+    roda sem mudanças sobre páginas escaneadas ou com encoding quebrado.
+    """
+
+    def __init__(self, words: list, rect=None):
+        self.words = [tuple(w) for w in words or []]
+        if rect is None and self.words:
+            rect = (min(w[0] for w in self.words), min(w[1] for w in self.words),
+                    max(w[2] for w in self.words), max(w[3] for w in self.words))
+        self.rect = tuple(rect) if rect is not None else (0.0, 0.0, 0.0, 0.0)
+
+    def _clip(self, clip) -> list[tuple]:
+        if clip is None:
+            return list(self.words)
+        x0, y0, x1, y1 = (clip.x0, clip.y0, clip.x1, clip.y1) if hasattr(clip, "x0") else tuple(clip)
+        return [w for w in self.words
+                if x0 <= (w[0] + w[2]) / 2 <= x1 and y0 <= (w[1] + w[3]) / 2 <= y1]
+
+    def get_text(self, option: str = "text", clip=None):
+        words = self._clip(clip)
+        if option == "words":
+            return words
+        if option == "text":
+            return words_to_text(words)
+        raise ValueError(f"OcrWordsPage não suporta get_text({option!r})")
+
+
+class OcrWordsDocument:
+    """Coleção de OcrWordsPage indexada como um fitz.Document (`load_page(idx)`, 0-based)."""
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+
+    def load_page(self, idx: int) -> OcrWordsPage:
+        return self.pages[idx]
+
+    def __len__(self):
+        return (max(self.pages) + 1) if self.pages else 0
+
+
+def ocr_image(image_path_or_pil, lang="por", config="", use_cache=True, preprocess=None):
     """
     Extrai texto de uma imagem usando OCR local.
     
     Args:
         image_path_or_pil: Caminho para imagem ou objeto PIL.Image
         lang: Idioma do Tesseract (por = português)
+        config: Parâmetros extras do Tesseract (ex.: "--psm 6")
+        use_cache: Reaproveita resultados em cache/ocr/ (chave = pixels + idioma + config)
+        preprocess: Nome de PREPROCESS_PRESETS ou dict de etapas (ver preprocess_image)
     
     Returns:
         Texto extraído ou string vazia se falhar.
@@ -109,24 +427,133 @@ def ocr_image(image_path_or_pil, lang="por"):
         return ""
     
     try:
-        if isinstance(image_path_or_pil, str):
-            img = Image.open(image_path_or_pil)
-        else:
-            img = image_path_or_pil
-        
-        # Converte para RGB se necessário
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        img = _as_rgb(image_path_or_pil)
         
         # Alguns ambientes não têm o idioma 'por' instalado.
         # Nesse caso, usamos automaticamente o melhor idioma disponível.
         lang = best_ocr_lang(lang)
-        text = pytesseract.image_to_string(img, lang=lang)
-        return (text or "").strip()
+        key = _cache_key(img, lang, config, preprocess=preprocess) if use_cache else None
+        if key:
+            cached = _cache_get(key)
+            if cached is not None:
+                return cached
+        text = _tesseract_text(img, lang, config, preprocess)
+        if key:
+            _cache_put(key, text)
+        return text
     except Exception as e:
         print(f"[OCR] Erro: {e}")
         return ""
 
+
+def ocr_words(image_path_or_pil, lang="por", config="", use_cache=True, preprocess=None) -> list:
+    """
+    OCR com palavras e coordenadas (pixels da imagem), no formato de `page.get_text("words")`
+    + confiança: [x0, y0, x1, y1, texto, bloco, linha, palavra, conf].
+
+    Use `scale_words` para levar ao sistema do PDF e `OcrWordsPage` para rodar o parser
+    de layout do ingest sobre o resultado.
+    """
+    if not OCR_AVAILABLE:
+        return []
+
+    try:
+        img = _as_rgb(image_path_or_pil)
+        lang = best_ocr_lang(lang)
+        key = _cache_key(img, lang, config, mode="words", preprocess=preprocess) if use_cache else None
+        if key:
+            cached = _cache_get(key, "words")
+            if cached is not None:
+                return cached
+        words = _tesseract_words(img, lang, config, preprocess)
+        if key:
+            _cache_put(key, words, "words")
+        return words
+    except Exception as e:
+        print(f"[OCR] Erro: {e}")
+        return []
+
+
+class OcrService:
+    """Fila de OCR para muitos recortes: idioma resolvido uma vez, cache e pool de processos.
+
+    Uso:
+        with OcrService(lang="por", workers=4) as svc:
+            for qnum, img in ...:
+                svc.submit(qnum, img)     # cache hit resolve na hora; miss vai para o pool
+            textos = svc.results()        # {qnum: texto}
+
+    Com `mode="words"` o resultado de cada chave é a lista de palavras de `ocr_words`.
+
+    O Tesseract é um subprocesso por imagem; com `workers > 1` várias imagens são
+    processadas ao mesmo tempo enquanto o chamador continua extraindo o PDF.
+    """
+
+    def __init__(self, lang: str = "por", workers: int = 1, config: str = "", use_cache: bool = True,
+                 mode: str = "text", preprocess=None):
+        if mode not in ("text", "words"):
+            raise ValueError(f"Modo de OCR desconhecido: {mode}")
+        self.lang = best_ocr_lang(lang)
+        self.config = config
+        self.mode = mode
+        self.preprocess = _preprocess_options(preprocess)
+        self._fn = _tesseract_words if mode == "words" else _tesseract_text
+        self.workers = max(1, int(workers or 1))
+        self.use_cache = use_cache
+        self._pool = None
+        self._pending = {}  # key_do_chamador -> (future, cache_key)
+        self._done = {}
+        self.cache_hits = 0
+        self.ocr_calls = 0
+
+    def submit(self, key, image_path_or_pil):
+        if not OCR_AVAILABLE:
+            self._done[key] = [] if self.mode == "words" else ""
+            return
+        img = _as_rgb(image_path_or_pil)
+        cache_key = _cache_key(img, self.lang, self.config, self.mode, self.preprocess) if self.use_cache else None
+        if cache_key:
+            cached = _cache_get(cache_key, self.mode)
+            if cached is not None:
+                self.cache_hits += 1
+                self._done[key] = cached
+                return
+        self.ocr_calls += 1
+        if self.workers <= 1:
+            self._done[key] = self._finish(cache_key, lambda: self._fn(img, self.lang, self.config, self.preprocess))
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._pending[key] = (self._pool.submit(self._fn, img, self.lang, self.config, self.preprocess), cache_key)
+
+    def _finish(self, cache_key, get_result):
+        try:
+            result = get_result()
+        except Exception as e:
+            print(f"[OCR] Erro: {e}")
+            return [] if self.mode == "words" else ""
+        if cache_key:
+            _cache_put(cache_key, result, self.mode)
+        return result
+
+    def results(self) -> dict:
+        for key, (fut, cache_key) in list(self._pending.items()):
+            self._done[key] = self._finish(cache_key, fut.result)
+        self._pending.clear()
+        return dict(self._done)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
 def parse_alternatives_from_ocr(text):
     """
     Tenta extrair alternativas A-E do texto OCR.
@@ -0,0 +1,337 @@
+"""
+Textos de referência ("TEXTO PARA AS QUESTÕES …") guardados uma vez só + detecção de
+quase-duplicatas (MinHash/LSH) entre todos os anos.
+
+O ingest prefixava o texto de referência no `stem` de cada questão que o usa
+(_apply_refs_to_stem: "título\\ntexto\\n\\nenunciado"), então a mesma passagem
+aparecia 2–5 vezes por ano. Aqui o `stem` fica só com o enunciado e a passagem vai
+para o nível do ano:
+
+  data["passages"] = {"psg-<sha1[:10]>": {"title": ..., "text": ...}, ...}
+  question["passageIds"] = ["psg-…", ...]        (na ordem em que apareciam no stem)
+
+O id é o hash do texto normalizado (qa_gate._norm), então a mesma passagem tem o
+mesmo id em qualquer ano. Passagens quase iguais (OCR/recorte diferente, Jaccard de
+shingles >= PASSAGE_THRESHOLD) são fundidas na versão mais frequente (depois a mais
+longa). O `enrich.py` recebe as passagens à parte e manda cada uma uma vez por lote.
+
+Também lista questões quase duplicadas entre anos (enunciado + alternativas,
+Jaccard >= QUESTION_THRESHOLD) em out/duplicates.json.
+
+Uso:
+  python tools/questions/passages.py --all --dry-run    # só relatório
+  python tools/questions/passages.py --all              # reescreve os fuvest-YYYY.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+from qa_gate import _norm  # noqa: E402
+from years import dataset_years, parse_years  # noqa: E402
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "questions")
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, "tools", "questions", "out")
+
+NUM_PERM = 128
+LSH_BANDS = 32          # 32 bandas x 4 linhas: candidato a partir de ~0.4 de similaridade
+SHINGLE_SIZE = 3
+MINHASH_SEED = 20240601
+PASSAGE_THRESHOLD = 0.9
+QUESTION_THRESHOLD = 0.8
+
+_PRIME = 4294967311  # primo > 2^32 (hash universal (a*x + b) mod p)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+# ---------------------------------------------------------------------------
+# MinHash / LSH
+# ---------------------------------------------------------------------------
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set[str]:
+    """Shingles de k palavras do texto normalizado (texto curto -> as próprias palavras)."""
+    words = _WORD_RE.findall(_norm(text))
+    if len(words) < k:
+        return set(words)
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """Assinaturas MinHash (NUM_PERM permutações) vetorizadas com NumPy."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = MINHASH_SEED):
+        rng = np.random.default_rng(seed)
+        # a, x < 2^32: a*x + b cabe em uint64
+        self.a = rng.integers(1, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, items: set[str]) -> np.ndarray:
+        if not items:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        x = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in items),
+            dtype=np.uint64, count=len(items),
+        )
+        return ((self.a[:, None] * x[None, :] + self.b[:, None]) % _PRIME).min(axis=1)
+
+
+def lsh_candidates(signatures: list[np.ndarray], bands: int = LSH_BANDS) -> set[tuple[int, int]]:
+    """Pares (i, j), i < j, que caem no mesmo balde em pelo menos uma banda."""
+    if not signatures:
+        return set()
+    rows = len(signatures[0]) // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        for i, sig in enumerate(signatures):
+            buckets.setdefault(sig[band * rows:(band + 1) * rows].tobytes(), []).append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def similar_pairs(texts: list[str], threshold: float, hasher: MinHasher | None = None):
+    """[(i, j, jaccard)] dos textos com similaridade >= threshold (LSH + conferência exata)."""
+    hasher = hasher or MinHasher()
+    sets = [shingles(t) for t in texts]
+    sigs = [hasher.signature(s) for s in sets]
+    out = []
+    for i, j in sorted(lsh_candidates(sigs)):
+        sim = jaccard(sets[i], sets[j])
+        if sim >= threshold:
+            out.append((i, j, sim))
+    return out
+
+
+def _clusters(n: int, pairs) -> list[int]:
+    """Union-find: raiz do grupo de cada índice."""
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j, *_ in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    return [find(i) for i in range(n)]
+
+
+# ---------------------------------------------------------------------------
+# Passagens
+# ---------------------------------------------------------------------------
+
+def passage_id(block: str) -> str:
+    return "psg-" + hashlib.sha1(_norm(block).encode("utf-8")).hexdigest()[:10]
+
+
+def split_stem(stem: str) -> tuple[list[str], str]:
+    """("título\\ntexto" de cada referência, enunciado) de um stem montado por _apply_refs_to_stem."""
+    parts = (stem or "").split("\n\n")
+    if len(parts) < 2:
+        return [], stem or ""
+    return parts[:-1], parts[-1]
+
+
+def block_to_passage(block: str) -> dict:
+    title, sep, text = block.partition("\n")
+    return {"title": title, "text": text} if sep else {"title": "", "text": block}
+
+
+def passage_block(passage: dict) -> str:
+    """Inverso de block_to_passage (o bloco exatamente como ia no stem)."""
+    title = passage.get("title") or ""
+    return f"{title}\n{passage.get('text') or ''}" if title else (passage.get("text") or "")
+
+
+def full_stem(question: dict, passages: dict | None) -> str:
+    """Stem no formato antigo (passagens + enunciado): chave de cache estável do enrich."""
+    blocks = [passage_block(passages[pid]) for pid in question.get("passageIds") or [] if pid in (passages or {})]
+    return "\n\n".join([*blocks, question.get("stem") or ""])
+
+
+def _question_blocks(q: dict, passages: dict) -> tuple[list[str], str]:
+    blocks, stem = split_stem(q.get("stem"))
+    known = [passage_block(passages[pid]) for pid in q.get("passageIds") or [] if pid in passages]
+    return known + blocks, stem
+
+
+def factor_passages(datasets: dict[int, dict], threshold: float = PASSAGE_THRESHOLD) -> dict:
+    """Move as passagens dos stems para data["passages"] (in-place) em todos os anos dados.
+
+    Idempotente: dataset já fatorado é remontado a partir de passageIds e refatorado
+    (o que também funde passagens que só agora se mostraram quase iguais).
+    Retorna {blocks, unique, merged, clusters: [{id, questions, variants}]}.
+    """
+    per_question = []  # (data, q, blocks, stem)
+    for year in sorted(datasets):
+        data = datasets[year]
+        known = data.get("passages") or {}
+        for q in data.get("questions") or []:
+            blocks, stem = _question_blocks(q, known)
+            per_question.append((data, q, blocks, stem))
+
+    uniques = []
+    counts = {}
+    for _, _, blocks, _ in per_question:
+        for b in blocks:
+            if b not in counts:
+                uniques.append(b)
+            counts[b] = counts.get(b, 0) + 1
+
+    roots = _clusters(len(uniques), similar_pairs(uniques, threshold))
+    members = {}
+    for i, r in enumerate(roots):
+        members.setdefault(r, []).append(i)
+    canonical = {}
+    for idxs in members.values():
+        # mais frequente, depois a mais longa, depois a primeira vista
+        best = max(idxs, key=lambda i: (counts[uniques[i]], len(uniques[i]), -i))
+        for i in idxs:
+            canonical[uniques[i]] = uniques[best]
+
+    users = {}
+    for data, q, blocks, stem in per_question:
+        ids = []
+        for b in blocks:
+            pid = passage_id(canonical[b])
+            if pid not in ids:
+                ids.append(pid)
+            users.setdefault(pid, []).append(q.get("id"))
+        q["stem"] = stem
+        if ids:
+            q["passageIds"] = ids
+        else:
+            q.pop("passageIds", None)
+
+    by_id = {passage_id(c): c for c in canonical.values()}
+    for year in sorted(datasets):
+        data = datasets[year]
+        used = []
+        for q in data.get("questions") or []:
+            for pid in q.get("passageIds") or []:
+                if pid not in used:
+                    used.append(pid)
+        if used:
+            data["passages"] = {pid: block_to_passage(by_id[pid]) for pid in used}
+        else:
+            data.pop("passages", None)
+
+    clusters = []
+    for idxs in members.values():
+        pid = passage_id(canonical[uniques[idxs[0]]])
+        clusters.append({"id": pid, "questions": sorted(set(users.get(pid, []))), "variants": len(idxs)})
+    clusters.sort(key=lambda c: (-len(c["questions"]), c["id"]))
+    return {
+        "blocks": sum(counts.values()),
+        "unique": len(uniques),
+        "passages": len(members),
+        "merged": len(uniques) - len(members),
+        "clusters": clusters,
+    }
+
+
+def near_duplicate_questions(datasets: dict[int, dict], threshold: float = QUESTION_THRESHOLD) -> list[dict]:
+    """Pares de questões (enunciado + alternativas) com Jaccard >= threshold, em qualquer ano."""
+    questions = []
+    for year in sorted(datasets):
+        for q in datasets[year].get("questions") or []:
+            text = " ".join([q.get("stem") or "", *[o.get("text") or "" for o in q.get("options") or []]])
+            if len(shingles(text)) >= 8:  # placeholder/curto demais gera falso positivo
+                questions.append((q.get("id"), text))
+    pairs = similar_pairs([t for _, t in questions], threshold)
+    out = [{"a": questions[i][0], "b": questions[j][0], "similarity": round(sim, 3)} for i, j, sim in pairs]
+    return sorted(out, key=lambda p: (-p["similarity"], p["a"], p["b"]))
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def _dumps(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Guarda cada texto de referência uma vez e acha quase-duplicatas.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--year", type=int)
+    target.add_argument("--years", type=str, help="ex.: 2015-2026 ou 2019,2021")
+    target.add_argument("--all", action="store_true", help="Todos os anos com fuvest-YYYY.json")
+    parser.add_argument("--threshold", type=float, default=PASSAGE_THRESHOLD, help="Similaridade para fundir passagens")
+    parser.add_argument("--question-threshold", type=float, default=QUESTION_THRESHOLD,
+                        help="Similaridade para listar questões quase duplicadas")
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o relatório, sem gravar os datasets")
+    args = parser.parse_args()
+
+    years = [args.year] if args.year else (parse_years(args.years) if args.years else dataset_years())
+    datasets, before = {}, {}
+    for year in years:
+        path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
+        if not os.path.exists(path):
+            print(f"[WARN] fuvest-{year}.json nao encontrado. Pulando.")
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            datasets[year] = json.load(f)
+        before[year] = len(_dumps(datasets[year]).encode("utf-8"))
+    if not datasets:
+        print("[ERRO] Nenhum dataset para processar.")
+        sys.exit(1)
+
+    report = factor_passages(datasets, threshold=args.threshold)
+    dups = near_duplicate_questions(datasets, threshold=args.question_threshold)
+    print(f"[*] {report['blocks']} copias de passagens -> {report['passages']} passagens "
+          f"({report['unique'] - report['passages']} quase-duplicatas fundidas)")
+    for c in report["clusters"]:
+        if c["variants"] > 1 or len({q[7:11] for q in c["questions"]}) > 1:
+            print(f"    {c['id']}: {len(c['questions'])} questoes, {c['variants']} variantes ({', '.join(c['questions'])})")
+    print(f"[*] {len(dups)} pares de questoes quase duplicadas (>= {args.question_threshold})")
+    for p in dups[:20]:
+        print(f"    {p['a']} ~ {p['b']}  {p['similarity']:.2f}")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(os.path.join(OUTPUT_DIR, "duplicates.json"), "w", encoding="utf-8") as f:
+        json.dump({"passages": report["clusters"], "questions": dups}, f, ensure_ascii=False, indent=2)
+
+    total_before = sum(before.values())
+    total_after = sum(len(_dumps(d).encode("utf-8")) for d in datasets.values())
+    print(f"[*] Datasets: {total_before / 1024:,.1f} KB -> {total_after / 1024:,.1f} KB")
+    if args.dry_run:
+        print("[*] --dry-run: nada gravado.")
+        return
+
+    from shard import write_year_shards
+    from search_index import build_search_index
+    for year, data in datasets.items():
+        path = os.path.join(DATA_DIR, f"fuvest-{year}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(_dumps(data))
+        os.replace(tmp_path, path)
+        write_year_shards(year, data)
+    build_search_index()
+    print(f"[OK] {len(datasets)} datasets atualizados (+ shards e indice de busca).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Publicação do dataset: JSON minificado + irmãos pré-comprimidos (.br / .gz).
+
+O pipeline grava `public/data/questions/` com indent=2 (legível e com diff bom no git).
+Para servir, este passo copia cada .json para o destino minificado e gera
+`arquivo.json.br` e `arquivo.json.gz` ao lado — o host estático entrega o
+pré-comprimido direto. No fim imprime o tamanho por ano (bruto / min / gz / br).
+
+Rodar depois do `vite build` (que recria o dist/):
+  npm run build
+  python tools/questions/publish.py                  # public/... -> dist/data/questions
+
+O destino nunca pode ser a origem (nem ficar dentro dela): os JSONs legíveis do pipeline
+seriam sobrescritos pelos minificados.
+
+Se o store endereçado por conteúdo já foi gerado (asset_store.py -> dist/assets/c/manifest.json),
+as URLs de imagem dos JSONs publicados são trocadas pelas URLs com hash (cache imutável).
+
+Brotli é opcional (pip install brotli); sem ele só o .gz é gerado.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+from asset_store import STORE_DIR, load_url_map
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "questions")
+DIST_DATA_DIR = os.path.join(PROJECT_ROOT, "dist", "data", "questions")
+
+
+def rewrite_urls(obj, url_map: dict):
+    """Troca (recursivamente) strings que são URLs conhecidas pelo equivalente do store."""
+    if isinstance(obj, str):
+        return url_map.get(obj, obj)
+    if isinstance(obj, list):
+        return [rewrite_urls(v, url_map) for v in obj]
+    if isinstance(obj, dict):
+        return {k: rewrite_urls(v, url_map) for k, v in obj.items()}
+    return obj
+
+
+def minify_json(raw: bytes, url_map: dict | None = None) -> bytes:
+    obj = json.loads(raw)
+    if url_map:
+        obj = rewrite_urls(obj, url_map)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _write_bytes(path: str, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_bytes(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def publish_file(src_path: str, dest_path: str, url_map: dict | None = None) -> dict:
+    """Minifica um JSON e gera .gz/.br. Pula a compressão se nada mudou."""
+    raw = _read_bytes(src_path)
+    minified = minify_json(raw, url_map)
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    unchanged = _read_bytes(dest_path) == minified
+    if not unchanged:
+        _write_bytes(dest_path, minified)
+
+    gz_path = dest_path + ".gz"
+    if unchanged and os.path.exists(gz_path):
+        gz = _read_bytes(gz_path)
+    else:
+        # mtime=0: saída determinística (mesmo conteúdo -> mesmo .gz)
+        gz = gzip.compress(minified, compresslevel=9, mtime=0)
+        _write_bytes(gz_path, gz)
+
+    br = None
+    if brotli is not None:
+        br_path = dest_path + ".br"
+        if unchanged and os.path.exists(br_path):
+            br = _read_bytes(br_path)
+        else:
+            br = brotli.compress(minified, quality=11, mode=brotli.MODE_TEXT)
+            _write_bytes(br_path, br)
+
+    return {
+        "raw": len(raw),
+        "min": len(minified),
+        "gz": len(gz),
+        "br": len(br) if br is not None else 0,
+        "written": not unchanged,
+    }
+
+
+def _group_of(rel_path: str) -> str:
+    m = re.match(r"fuvest-(\d{4})", rel_path)
+    return m.group(1) if m else "outros"
+
+
+def publish(src_dir: str, dest_dir: str, url_map: dict | None = None) -> dict:
+    """Publica todos os .json de `src_dir` (recursivo: inclui índice e shards). Retorna totais por ano."""
+    totals = {}
+    for root, _dirs, files in os.walk(src_dir):
+        for name in sorted(files):
+            if not name.endswith(".json"):
+                continue
+            src_path = os.path.join(root, name)
+            rel = os.path.relpath(src_path, src_dir)
+            r = publish_file(src_path, os.path.join(dest_dir, rel), url_map)
+            t = totals.setdefault(_group_of(rel), {"files": 0, "raw": 0, "min": 0, "gz": 0, "br": 0, "written": 0})
+            t["files"] += 1
+            t["written"] += int(r["written"])
+            for k in ("raw", "min", "gz", "br"):
+                t[k] += r[k]
+    return totals
+
+
+def _kb(n: int) -> str:
+    return f"{n / 1024:,.1f}"
+
+
+def print_report(totals: dict):
+    print(f"{'ano':>6} {'arqs':>5} {'bruto KB':>10} {'min KB':>9} {'gz KB':>8} {'br KB':>8} {'menor/bruto':>12}")
+    grand = {"files": 0, "raw": 0, "min": 0, "gz": 0, "br": 0}
+    for group in sorted(totals):
+        t = totals[group]
+        best = t["br"] or t["gz"]
+        print(f"{group:>6} {t['files']:>5} {_kb(t['raw']):>10} {_kb(t['min']):>9} {_kb(t['gz']):>8} "
+              f"{_kb(t['br']) if t['br'] else '-':>8} {best / t['raw'] * 100 if t['raw'] else 0:>11.1f}%")
+        for k in grand:
+            grand[k] += t[k]
+    best = grand["br"] or grand["gz"]
+    print(f"{'total':>6} {grand['files']:>5} {_kb(grand['raw']):>10} {_kb(grand['min']):>9} {_kb(grand['gz']):>8} "
+          f"{_kb(grand['br']) if grand['br'] else '-':>8} {best / grand['raw'] * 100 if grand['raw'] else 0:>11.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minifica o dataset e gera irmãos .br/.gz para o host estático.")
+    parser.add_argument("--src", default=DATA_DIR, help="Diretório de origem (padrão: public/data/questions)")
+    parser.add_argument("--dest", default=DIST_DATA_DIR, help="Diretório de destino (padrão: dist/data/questions)")
+    parser.add_argument("--asset-store", default=STORE_DIR,
+                        help="Store do asset_store.py cujas URLs com hash entram nos JSONs (padrão: dist/assets/c)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.src):
+        print(f"[ERRO] Diretorio de origem nao encontrado: {args.src}")
+        sys.exit(1)
+    src = os.path.realpath(args.src)
+    dest = os.path.realpath(args.dest)
+    if dest == src or dest.startswith(src + os.sep):
+        print(f"[ERRO] Destino {args.dest} esta dentro da origem {args.src}; publique em outro diretorio (ex.: dist/data/questions).")
+        sys.exit(1)
+    if brotli is None:
+        print("[WARN] Modulo 'brotli' nao instalado; gerando apenas .gz (pip install brotli).")
+
+    url_map = load_url_map(args.asset_store)
+    if url_map:
+        print(f"[*] {len(url_map)} URLs de imagem trocadas pelas do store ({args.asset_store}).")
+    totals = publish(args.src, args.dest, url_map)
+    written = sum(t["written"] for t in totals.values())
+    print(f"[OK] {sum(t['files'] for t in totals.values())} arquivos publicados em {args.dest} ({written} atualizados)")
+    print_report(totals)
+
+
+if __name__ == "__main__":
+    main()
@@ -102,7 +102,8 @@ def check_year(year):
     # 6. Paginas
     pages_dir = os.path.join(PAGES_DIR, str(year))
     if os.path.exists(pages_dir):
-        page_files = [f for f in os.listdir(pages_dir) if f.endswith('.png')]
+        # só page_XX.png (ignora as variantes page_XX-<largura>w.* do encode_assets)
+        page_files = [f for f in os.listdir(pages_dir) if re.fullmatch(r"page_\d+\.png", f)]
         results["checks"]["page_count"] = len(page_files)
     else:
         results["checks"]["page_count"] = 0
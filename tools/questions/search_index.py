@@ -0,0 +1,317 @@
+"""
+Índice invertido de busca (enunciado, alternativas e explicação) de todos os anos.
+
+Gerado a partir dos `fuvest-YYYY.json` e gravado como arquivos estáticos ao lado dos
+datasets, para o frontend buscar sem baixar os ~6MB de questões:
+
+  public/data/questions/search/meta.json       -> docs ([ano, número] por doc id) e o
+                                                   mapa prefixo -> shard
+  public/data/questions/search/t-<prefixo>.json -> {termo: postings} dos termos do prefixo
+
+Termos: texto normalizado com qa_gate._norm (minúsculo, sem acento), tokens [a-z0-9]
+com 2+ caracteres, sem stopwords e sem placeholders ("Veja a imagem da questão").
+
+Postings compactas: lista de inteiros `(delta_doc << 3) | campos`, com os doc ids em
+ordem crescente (delta em relação ao anterior) e `campos` um bitmask
+1 = enunciado, 2 = alternativas, 4 = explicação.
+
+Shards por prefixo adaptativo: começa pela 1ª letra e divide (até 3 letras) quando o
+shard passa de SHARD_TARGET_BYTES; o cliente usa o maior prefixo do `meta.json` que
+casa com o termo, então uma consulta baixa só o meta + 1 shard por termo.
+
+O índice é versionado (public/data/questions/search/): o deploy é estático, sem Python,
+então depois de editar um dataset à mão é preciso regerá-lo e commitar junto.
+ingest.py e enrich.py já o regeneram no fim.
+
+Uso:
+  python tools/questions/search_index.py                 # (re)gera o índice
+  python tools/questions/search_index.py --query "revolução francesa"
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from qa_gate import _norm, _is_placeholder  # noqa: E402
+from build_manifest import write_json_if_changed  # noqa: E402
+from years import dataset_years, parse_years  # noqa: E402
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "questions")
+SEARCH_DIR = os.path.join(DATA_DIR, "search")
+
+INDEX_VERSION = 1
+SHARD_TARGET_BYTES = 48 * 1024
+MAX_PREFIX_LEN = 3
+COMPACT_JSON = {"ensure_ascii": False, "sort_keys": True, "separators": (",", ":")}
+
+FIELD_STEM = 1
+FIELD_OPTIONS = 2
+FIELD_EXPLANATION = 4
+FIELD_WEIGHTS = {FIELD_STEM: 3.0, FIELD_OPTIONS: 2.0, FIELD_EXPLANATION: 1.0}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Palavras vazias (já sem acento, como saem do _norm).
+STOPWORDS = frozenset("""
+a o e as os um uma uns umas de da do das dos em na no nas nos por pela pelo pelas pelos
+para pra com sem sob sobre entre ate ao aos que se ou mas como mais menos muito muita
+muitos muitas ja nao sim seu sua seus suas ele ela eles elas isso isto esse essa esses
+essas este esta estes estas aquele aquela aqueles aquelas lhe lhes me te nos vos foi
+ser sao era eram sera tem ter ha quando onde qual quais cujo cuja tambem so pois
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Tokens normalizados (sem acento) com 2+ caracteres e sem stopwords."""
+    return [t for t in TOKEN_RE.findall(_norm(text)) if len(t) >= 2 and t not in STOPWORDS]
+
+
+def _field_texts(q: dict, passages: dict | None = None):
+    """(bit do campo, texto) de cada trecho pesquisável da questão (placeholders de fora).
+
+    Textos de referência (passageIds) contam como parte do enunciado.
+    """
+    for pid in q.get("passageIds") or []:
+        p = (passages or {}).get(pid) or {}
+        yield FIELD_STEM, f"{p.get('title') or ''} {p.get('text') or ''}"
+    yield FIELD_STEM, q.get("stem") or ""
+    for opt in q.get("options") or []:
+        yield FIELD_OPTIONS, opt.get("text") or ""
+    exp = q.get("explanation") or {}
+    theory = exp.get("theory") or ""
+    if theory.strip() != "Pendente":
+        yield FIELD_EXPLANATION, theory
+    for step in exp.get("steps") or []:
+        yield FIELD_EXPLANATION, step if isinstance(step, str) else json.dumps(step, ensure_ascii=False)
+    for text in (exp.get("distractors") or {}).values():
+        yield FIELD_EXPLANATION, text or ""
+    yield FIELD_EXPLANATION, exp.get("finalSummary") or ""
+
+
+def _load_docs(years: list[int]) -> tuple[list[dict], dict]:
+    """(questões de todos os anos em ordem de ano/número, textos de referência por id)."""
+    docs = []
+    passages = {}
+    for year in years:
+        with open(os.path.join(DATA_DIR, f"fuvest-{year}.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        passages.update(data.get("passages") or {})
+        for q in sorted(data.get("questions") or [], key=lambda q: q.get("number") or 0):
+            docs.append(q)
+    return docs, passages
+
+
+def encode_postings(doc_masks: list[tuple[int, int]]) -> list[int]:
+    """[(doc, campos), ...] em ordem de doc -> [(delta << 3) | campos, ...]."""
+    out = []
+    prev = 0
+    for doc, mask in doc_masks:
+        out.append(((doc - prev) << 3) | mask)
+        prev = doc
+    return out
+
+
+def decode_postings(postings: list[int]) -> list[tuple[int, int]]:
+    out = []
+    doc = 0
+    for v in postings:
+        doc += v >> 3
+        out.append((doc, v & 7))
+    return out
+
+
+def build_postings(docs: list[dict], passages: dict | None = None) -> dict[str, list[int]]:
+    """{termo: postings} (postings já codificadas)."""
+    masks = {}  # termo -> {doc: campos}
+    for doc_id, q in enumerate(docs):
+        for field, text in _field_texts(q, passages):
+            if _is_placeholder(text):
+                continue
+            for term in tokenize(text):
+                per_doc = masks.setdefault(term, {})
+                per_doc[doc_id] = per_doc.get(doc_id, 0) | field
+    return {term: encode_postings(sorted(per_doc.items())) for term, per_doc in masks.items()}
+
+
+def _size(terms: dict) -> int:
+    return len(json.dumps(terms, separators=(",", ":")))
+
+
+def shard_terms(postings: dict[str, list[int]], prefix: str = "") -> dict[str, dict]:
+    """Divide {termo: postings} em {prefixo: {termo: postings}} (prefixo adaptativo)."""
+    groups = {}
+    for term, plist in postings.items():
+        if len(term) <= len(prefix):
+            # termo igual ao próprio prefixo (ex.: "ab" ao dividir "ab") fica no shard do prefixo
+            groups.setdefault(prefix, {})[term] = plist
+        else:
+            groups.setdefault(term[:len(prefix) + 1], {})[term] = plist
+    out = {}
+    for p, terms in groups.items():
+        if p != prefix and len(p) < MAX_PREFIX_LEN and _size(terms) > SHARD_TARGET_BYTES:
+            out.update(shard_terms(terms, p))
+        else:
+            out.setdefault(p, {}).update(terms)
+    return out
+
+
+def shard_file_name(prefix: str) -> str:
+    return f"t-{prefix}.json"
+
+
+def build_search_index(years: list[int] | None = None, out_dir: str = SEARCH_DIR) -> dict:
+    """Gera meta.json + shards em `out_dir`. Retorna contagens para o relatório."""
+    years = years or dataset_years()
+    docs, passages = _load_docs(years)
+    postings = build_postings(docs, passages)
+    shards = shard_terms(postings)
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = 0
+    keep = {"meta.json"}
+    for prefix, terms in shards.items():
+        name = shard_file_name(prefix)
+        keep.add(name)
+        if write_json_if_changed(os.path.join(out_dir, name), {"prefix": prefix, "terms": terms}, **COMPACT_JSON):
+            written += 1
+
+    removed = 0
+    for name in os.listdir(out_dir):
+        if name.endswith(".json") and name not in keep:
+            os.remove(os.path.join(out_dir, name))
+            removed += 1
+
+    meta = {
+        "version": INDEX_VERSION,
+        "fields": {"stem": FIELD_STEM, "options": FIELD_OPTIONS, "explanation": FIELD_EXPLANATION},
+        "docs": [[q.get("year"), q.get("number")] for q in docs],
+        "shards": {prefix: shard_file_name(prefix) for prefix in sorted(shards)},
+    }
+    if write_json_if_changed(os.path.join(out_dir, "meta.json"), meta, **COMPACT_JSON):
+        written += 1
+
+    sizes = [_size(t) for t in shards.values()]
+    return {
+        "years": years,
+        "docs": len(docs),
+        "terms": len(postings),
+        "shards": len(shards),
+        "max_shard_kb": max(sizes) / 1024 if sizes else 0.0,
+        "total_kb": sum(sizes) / 1024,
+        "written": written,
+        "removed": removed,
+    }
+
+
+class SearchIndex:
+    """Cliente de leitura (mesma lógica do src/hooks/useQuestionSearch.js), com cache de shards."""
+
+    def __init__(self, index_dir: str = SEARCH_DIR):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self._shards = {}
+
+    def _shard(self, prefix: str) -> dict:
+        if prefix not in self._shards:
+            with open(os.path.join(self.index_dir, self.meta["shards"][prefix]), "r", encoding="utf-8") as f:
+                self._shards[prefix] = json.load(f)["terms"]
+        return self._shards[prefix]
+
+    def _shard_for(self, term: str) -> str | None:
+        for n in range(min(len(term), MAX_PREFIX_LEN), 0, -1):
+            if term[:n] in self.meta["shards"]:
+                return term[:n]
+        return None
+
+    def _postings(self, term: str, prefix_match: bool) -> dict[int, int]:
+        """{doc: campos} do termo (ou de todos os termos que começam com ele)."""
+        out = {}
+        if prefix_match:
+            prefixes = [p for p in self.meta["shards"] if p.startswith(term) or term.startswith(p)]
+        else:
+            p = self._shard_for(term)
+            prefixes = [p] if p else []
+        for p in prefixes:
+            terms = self._shard(p)
+            matches = [t for t in terms if t.startswith(term)] if prefix_match else [term]
+            for t in matches:
+                for doc, mask in decode_postings(terms.get(t) or []):
+                    out[doc] = out.get(doc, 0) | mask
+        return out
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        """Todos os termos precisam aparecer (o último também casa como prefixo, se tiver 3+ letras)."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        n_docs = len(self.meta["docs"])
+        scores = None
+        for i, term in enumerate(terms):
+            prefix_match = i == len(terms) - 1 and len(term) >= 3
+            per_doc = self._postings(term, prefix_match)
+            idf = math.log(1 + n_docs / (1 + len(per_doc)))
+            term_scores = {
+                doc: idf * sum(w for bit, w in FIELD_WEIGHTS.items() if mask & bit)
+                for doc, mask in per_doc.items()
+            }
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc: s + term_scores[doc] for doc, s in scores.items() if doc in term_scores}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+        out = []
+        for doc, score in ranked:
+            year, number = self.meta["docs"][doc]
+            out.append({"id": f"fuvest-{year}-q{number:02d}", "year": year, "number": number,
+                        "score": round(score, 3)})
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera (ou consulta) o índice de busca estático das questões.")
+    parser.add_argument("--years", type=str, default="", help="ex.: 2015-2026 ou 2019,2021 (padrão: todos os fuvest-YYYY.json)")
+    parser.add_argument("--query", type=str, default="", help="Só consulta o índice já gerado e mostra os resultados")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.query:
+        if not os.path.exists(os.path.join(SEARCH_DIR, "meta.json")):
+            print("[ERRO] Indice nao encontrado; rode sem --query para gera-lo.")
+            sys.exit(1)
+        t0 = time.perf_counter()
+        index = SearchIndex()
+        results = index.search(args.query, limit=args.limit)
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"[*] {len(results)} resultados em {ms:.1f} ms ({len(index._shards)} shards lidos)")
+        for r in results:
+            print(f"  {r['id']}  score {r['score']}")
+        return
+
+    years = parse_years(args.years) or None
+    if years:
+        available = set(dataset_years())
+        for y in years:
+            if y not in available:
+                print(f"[WARN] {y}: fuvest-{y}.json nao encontrado. Pulando.")
+        years = [y for y in years if y in available]
+        if not years:
+            print("[ERRO] Nenhum ano para indexar.")
+            sys.exit(1)
+    t0 = time.perf_counter()
+    r = build_search_index(years)
+    print(f"[OK] Indice de busca: {r['docs']} questoes ({r['years'][0]}..{r['years'][-1]}) | {r['terms']} termos | "
+          f"{r['shards']} shards (maior {r['max_shard_kb']:.1f} KB, total {r['total_kb']:.0f} KB) | "
+          f"{r['written']} gravados, {r['removed']} removidos | {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Store fragmentado do dataset para o frontend.
+
+O `fuvest-YYYY.json` monolítico (430–700KB, quase tudo texto de `explanation`)
+continua sendo o arquivo de trabalho do pipeline. A partir dele geramos:
+
+  public/data/questions/fuvest-YYYY/index.json      -> lista enxuta (id, number, page,
+                                                        answer, assets, references, tags)
+                                                        + textos de referência do ano
+                                                        (passages)
+  public/data/questions/fuvest-YYYY/<id>.json       -> questão completa (shard)
+
+O `Questoes.jsx` baixa só o índice e busca o shard da questão exibida sob demanda
+(com fallback para o monolítico quando o índice não existe).
+
+Os shards são versionados junto com o monolítico: o deploy é estático (só `vite build`,
+sem Python), então quem editar um fuvest-YYYY.json à mão roda este script e commita o
+diretório fuvest-YYYY/ junto. ingest.py, enrich.py e encode_assets.py já o regeneram.
+
+Uso:
+  python tools/questions/shard.py --year 2019
+  python tools/questions/shard.py --all
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from build_manifest import write_json_if_changed
+from years import dataset_years, parse_years
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "questions")
+
+# Campos que vão para o índice (o suficiente para navegar, mostrar a imagem e corrigir).
+INDEX_FIELDS = ("id", "number", "page", "answer", "assets", "references", "tags")
+
+
+def slim_question(q: dict) -> dict:
+    return {k: q[k] for k in INDEX_FIELDS if k in q}
+
+
+def shard_dir(year: int) -> str:
+    return os.path.join(DATA_DIR, f"fuvest-{year}")
+
+
+def write_year_shards(year: int, data: dict | None = None) -> dict:
+    """Gera índice + shards de um ano a partir do JSON monolítico (ou de `data`)."""
+    if data is None:
+        with open(os.path.join(DATA_DIR, f"fuvest-{year}.json"), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+    out_dir = shard_dir(year)
+    os.makedirs(out_dir, exist_ok=True)
+
+    questions = sorted(data.get('questions', []), key=lambda q: q.get('number') or 0)
+    written = 0
+    keep = {"index.json"}
+    for q in questions:
+        q_id = q.get('id') or f"fuvest-{year}-q{int(q.get('number') or 0):02d}"
+        name = f"{q_id}.json"
+        keep.add(name)
+        if write_json_if_changed(os.path.join(out_dir, name), q, ensure_ascii=False, indent=2):
+            written += 1
+
+    # shards de questões que não existem mais
+    removed = 0
+    for name in os.listdir(out_dir):
+        if name.endswith(".json") and name not in keep:
+            os.remove(os.path.join(out_dir, name))
+            removed += 1
+
+    index = {
+        "year": data.get('year', year),
+        "source": data.get('source'),
+        "generatedAt": data.get('generatedAt'),
+        "questions": [slim_question(q) for q in questions],
+    }
+    if data.get('assets'):
+        index["assets"] = data['assets']
+    if data.get('passages'):
+        index["passages"] = data['passages']
+    if write_json_if_changed(os.path.join(out_dir, "index.json"), index, ensure_ascii=False, indent=2):
+        written += 1
+
+    return {"year": year, "questions": len(questions), "written": written, "removed": removed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera índice enxuto + shards por questão para o frontend.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--year", type=int)
+    target.add_argument("--years", type=str, help="ex.: 2015-2026 ou 2019,2021")
+    target.add_argument("--all", action="store_true", help="Todos os anos com fuvest-YYYY.json")
+    args = parser.parse_args()
+
+    if args.year:
+        years = [args.year]
+    elif args.years:
+        years = parse_years(args.years)
+    else:
+        years = dataset_years()
+
+    rc = 0
+    for year in years:
+        try:
+            r = write_year_shards(year)
+        except FileNotFoundError:
+            print(f"[ERRO] fuvest-{year}.json nao encontrado.")
+            rc = 1
+            continue
+        print(f"[OK] {year}: {r['questions']} questoes | {r['written']} arquivos gravados | {r['removed']} removidos")
+    sys.exit(rc)
+
+
+if __name__ == "__main__":
+    main()
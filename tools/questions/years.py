@@ -0,0 +1,48 @@
+"""
+Seleção de anos compartilhada pelos CLIs do pipeline (--year / --years / --all).
+
+  parse_years("2015-2017,2020")  -> [2015, 2016, 2017, 2020]
+  dataset_years()                -> anos com public/data/questions/fuvest-YYYY.json
+  pdf_years("p") / pdf_years("g")-> anos com provas/pYY.pdf / provas/gYY.pdf
+"""
+
+import os
+import re
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "questions")
+PROVAS_DIR = os.path.join(PROJECT_ROOT, "provas")
+
+
+def parse_years(spec: str) -> list[int]:
+    """Aceita "2015-2026", "2019,2021" ou combinações ("2015-2017,2020")."""
+    years = set()
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            years.update(range(int(a), int(b) + 1))
+        else:
+            years.add(int(part))
+    return sorted(years)
+
+
+def dataset_years(data_dir=DATA_DIR) -> list[int]:
+    years = []
+    for name in os.listdir(data_dir):
+        m = re.fullmatch(r"fuvest-(\d{4})\.json", name)
+        if m:
+            years.append(int(m.group(1)))
+    return sorted(years)
+
+
+def pdf_years(prefix: str = "p", provas_dir=PROVAS_DIR) -> list[int]:
+    """Anos com provas/<prefix>YY.pdf ("p" = prova, "g" = gabarito)."""
+    years = []
+    for name in os.listdir(provas_dir):
+        m = re.fullmatch(rf"{re.escape(prefix)}(\d{{2}})\.pdf", name)
+        if m:
+            years.append(2000 + int(m.group(1)))
+    return sorted(years)